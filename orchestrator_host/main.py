@@ -198,8 +198,8 @@ def main() -> None:
     # --- Inicializa os agentes ---
     client, deployment = build_azure_client()
 
-    planner  = Planner(azure_client=client, deployment=deployment)
     router   = Router()
+    planner  = Planner(azure_client=client, deployment=deployment, router=router)
     verifier = Verifier(azure_client=client, deployment=deployment)
 
     print(f"{AGENT_ORCHESTRATOR} Sistema inicializado — 9 agentes:")
@@ -271,18 +271,28 @@ def main() -> None:
             clinic_label = CLINIC_LABELS.get(clinic, f"[Agente: {clinic}]")
 
             # Injeta dados do paciente em etapas de agendamento automaticamente
-            if action in ("book_appointment", "reschedule_appointment", "cancel_appointment"):
+            if action in ("book_appointment", "reschedule_appointment",
+                          "cancel_appointment", "hold_slot", "list_my_appointments",
+                          "list_appointment_history"):
                 step.setdefault("parameters", {})
                 step["parameters"]["patient_name"] = patient_info["name"]
                 step["parameters"]["cpf"] = patient_info["cpf"]
+            elif action == "book_appointments_bulk":
+                for item in step.setdefault("parameters", {}).get("appointments", []):
+                    item.setdefault("patient_name", patient_info["name"])
+                    item.setdefault("cpf", patient_info["cpf"])
 
             print(f"{AGENT_ROUTER} Despachando '{action}' → {clinic_label}")
 
-            # ==============================================================
-            # AGENTE 3: AGENTE DE CLÍNICA — Servidor MCP Específico do Domínio
-            # ==============================================================
-            response = router.dispatch(step)
+        # ==============================================================
+        # AGENTE 3: AGENTE DE CLÍNICA — Servidor MCP Específico do Domínio
+        # ==============================================================
+        # Um lote JSON-RPC por clínica: uma ida e volta, mesmo com várias etapas.
+        responses = router.dispatch_batch(steps)
 
+        for step, response in zip(steps, responses):
+            clinic = step.get("clinic", "?")
+            clinic_label = CLINIC_LABELS.get(clinic, f"[Agente: {clinic}]")
             if response.error:
                 print(f"{clinic_label} Erro: {response.error['message']}")
                 aggregated_results.append({"step": step, "error": response.error})
@@ -11,6 +11,13 @@ Referência:
     nível em sub-tarefas antes de delegá-las, impedindo que qualquer
     agente individual tenha uma visão global dos dados do paciente
     (Preservação de Privacidade).
+
+Catálogo de ferramentas: com um ``Router``, a lista de clínicas e
+ferramentas do prompt é montada do ``tools/list`` de cada clínica
+(``Router.catalogue``, em cache por ``CLINIC_CAPABILITY_TTL``) — nomes,
+parâmetros dos esquemas e descrições vêm dos próprios servidores. Sem
+Router, ou com nenhuma clínica respondendo, vale o catálogo fixo de
+``prompts/planner_tools.txt``.
 """
 
 from __future__ import annotations
@@ -21,22 +28,95 @@ from typing import Any
 
 from openai import AzureOpenAI
 
+from orchestrator_host.router import Router
+
 # ---------------------------------------------------------------------------
 # Prompts de sistema — carregados de arquivos externos em prompts/ para legibilidade.
+# O marcador TOOLS_PLACEHOLDER recebe o catálogo de ferramentas.
 # ---------------------------------------------------------------------------
 _prompts_dir = Path(__file__).resolve().parents[1] / "prompts"
 
-PLANNER_SYSTEM_PROMPT = (_prompts_dir / "planner.txt").read_text(encoding="utf-8")
+TOOLS_PLACEHOLDER = "{ferramentas}"
 
-PLANNER_COT_SYSTEM_PROMPT = (_prompts_dir / "planner_cot.txt").read_text(encoding="utf-8")
+_PLANNER_TEMPLATE = (_prompts_dir / "planner.txt").read_text(encoding="utf-8")
 
+_PLANNER_COT_TEMPLATE = (_prompts_dir / "planner_cot.txt").read_text(encoding="utf-8")
+
+STATIC_TOOL_CATALOGUE = (_prompts_dir / "planner_tools.txt").read_text(encoding="utf-8")
+
+PLANNER_SYSTEM_PROMPT = _PLANNER_TEMPLATE.replace(TOOLS_PLACEHOLDER, STATIC_TOOL_CATALOGUE)
+
+PLANNER_COT_SYSTEM_PROMPT = _PLANNER_COT_TEMPLATE.replace(TOOLS_PLACEHOLDER, STATIC_TOOL_CATALOGUE)
+
+# Preenchidos pelo Orchestrator a partir do paciente identificado (main.py).
+INJECTED_PARAMETERS = frozenset({"cpf"})
+
+# Sincronização entre sistemas, não atende pedidos do usuário.
+HIDDEN_TOOLS = frozenset({"changes_since"})
 
-class Planner:
-    """Decompõe uma consulta do usuário em um grafo de etapas executável usando Azure OpenAI."""
 
-    def __init__(self, azure_client: AzureOpenAI, deployment: str) -> None:
+def tool_catalogue(capabilities: dict[str, dict[str, Any]]) -> str:
+    """
+    Catálogo de clínicas e ferramentas para o prompt, a partir dos
+    resultados de ``tools/list`` por clínica (``Router.catalogue``).
+
+    Ferramentas comuns a todas as clínicas são descritas uma vez só.
+    """
+    names: dict[str, list[str]] = {}
+    tools: dict[str, dict[str, Any]] = {}
+    for clinic_id, caps in capabilities.items():
+        names[clinic_id] = [t["name"] for t in caps.get("tools", [])
+                            if t["name"] not in HIDDEN_TOOLS]
+        for tool in caps.get("tools", []):
+            tools.setdefault(tool["name"], tool)
+    shared = len({tuple(n) for n in names.values()}) == 1
+
+    lines = ['Clínicas disponíveis (use o id exato como "clinic"):']
+    for clinic_id, caps in capabilities.items():
+        clinic = caps.get("clinic", {})
+        label = clinic.get("label") or clinic.get("specialty", "")
+        lines.append(f"  - {clinic_id}  →  {label} ({clinic.get('name', clinic_id)})")
+        if not shared:
+            lines.append("      Ferramentas: " + ", ".join(f'"{n}"' for n in names[clinic_id]))
+
+    lines.append("")
+    lines.append("Ferramentas" + (" (as mesmas em todas as clínicas)" if shared else "")
+                 + ' — use o nome EXATO como "action"; parâmetros entre parênteses, '
+                 'todos opcionais salvo indicação:')
+    any_required = False
+    for name in dict.fromkeys(n for ns in names.values() for n in ns):
+        schema = tools[name].get("inputSchema", {})
+        required = set(schema.get("required", [])) - INJECTED_PARAMETERS
+        any_required = any_required or bool(required)
+        params = ", ".join(p + ("*" if p in required else "")
+                           for p in schema.get("properties", {})
+                           if p not in INJECTED_PARAMETERS)
+        lines.append(f"  - {name}({params}) — {tools[name].get('description', '')}")
+    lines.append(("  (* obrigatório) " if any_required else "  ")
+                 + "O CPF do paciente atual é preenchido automaticamente.")
+    return "\n".join(lines) + "\n"
+
+
+class Planner:
+    """
+    Decompõe uma consulta do usuário em um grafo de etapas executável
+    usando Azure OpenAI; com ``router``, o catálogo de ferramentas do
+    prompt vem das próprias clínicas.
+    """
+
+    def __init__(self, azure_client: AzureOpenAI, deployment: str,
+                 router: Router | None = None) -> None:
         self.client = azure_client
         self.deployment = deployment
+        self.router = router
+
+    def system_prompt(self, cot: bool = False) -> str:
+        """Prompt de sistema com o catálogo atual (ou o fixo, sem clínicas)."""
+        capabilities = self.router.catalogue() if self.router is not None else {}
+        if not capabilities:
+            return PLANNER_COT_SYSTEM_PROMPT if cot else PLANNER_SYSTEM_PROMPT
+        template = _PLANNER_COT_TEMPLATE if cot else _PLANNER_TEMPLATE
+        return template.replace(TOOLS_PLACEHOLDER, tool_catalogue(capabilities))
 
     def decompose(
         self,
@@ -57,7 +137,7 @@ class Planner:
             [{"step_id": 1, "clinic": "clinic_a", "action": "...", "parameters": {...}}]
         """
         messages: list[dict[str, str]] = [
-            {"role": "system", "content": PLANNER_SYSTEM_PROMPT},
+            {"role": "system", "content": self.system_prompt()},
         ]
         if conversation_history:
             messages.extend(conversation_history)
@@ -98,7 +178,7 @@ class Planner:
             model=self.deployment,
             temperature=0.0,
             messages=[
-                {"role": "system", "content": PLANNER_COT_SYSTEM_PROMPT},
+                {"role": "system", "content": self.system_prompt(cot=True)},
                 {"role": "user", "content": user_query},
             ],
         )
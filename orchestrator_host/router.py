@@ -13,16 +13,73 @@ Notas de arquitetura:
     Preservação de Privacidade — cada requisição é direcionada a uma única
     clínica. Nenhum dado de paciente entre clínicas transita pelo Router
     em um único payload.
+
+    Lotes — ``dispatch_batch`` junta as etapas de uma mesma clínica num
+    único lote JSON-RPC 2.0 (uma ida e volta por clínica, e não por etapa).
+    O servidor preserva a ordem das mutações do lote; só etapas de
+    clínicas diferentes deixam de seguir a ordem do plano entre si.
+
+    Streaming — ``dispatch_stream`` pede a resposta em NDJSON e devolve um
+    ``MCPStream`` que entrega os itens da listagem conforme chegam, sem
+    guardar a resposta inteira em memória.
+
+    Cache condicional — as leituras que a clínica devolve com ``etag``
+    ficam num cache LRU (por clínica, ação e parâmetros). Ao repetir a
+    leitura, o Router manda ``if_none_match``; se a clínica responde
+    ``not_modified``, a resposta em cache volta ao chamador com o id novo,
+    sem a listagem trafegar de novo. As respostas em cache são
+    compartilhadas: não devem ser alteradas por quem as recebe. O ``etag``
+    fica só no cache: o resultado entregue ao chamador (e ao LLM) não o
+    traz, a menos que o próprio chamador tenha mandado ``if_none_match``.
+
+    Capacidades — ``capabilities`` busca o ``tools/list`` de uma clínica
+    (ferramentas, esquemas e especialidade) e o guarda por
+    ``capability_ttl`` segundos (``CLINIC_CAPABILITY_TTL``, padrão 300);
+    ``catalogue`` junta as de todas as clínicas do registro, e é dele que
+    o Planejador monta o catálogo de ferramentas do prompt. A busca tem
+    timeout curto (``CLINIC_CAPABILITY_TIMEOUT``, padrão 2 s); clínica fora
+    do ar fica de fora do catálogo e a falha também é guardada, por
+    ``CLINIC_CAPABILITY_RETRY`` segundos (padrão 30, no máximo o TTL), para
+    que cada planejamento não espere o timeout de novo.
+
+    Codificação — o Router pede respostas comprimidas (gzip, ou zstd com
+    ``zstandard`` instalado) e, com ``encoding="msgpack"`` ou ``"cbor"``
+    (ou ``CLINIC_WIRE_ENCODING``), o corpo em binário; aceita JSON de
+    volta de clínicas que não o oferecem (ver ``shared/wire.py``).
 """
 
 from __future__ import annotations
 
+import json
+import os
+import threading
+import time
 import uuid
-from typing import Any
+from collections import OrderedDict
+from typing import Any, Iterable, Iterator, Optional
 
 import requests
+from urllib3.util.request import ACCEPT_ENCODING as _DECODABLE
+
+from shared import wire
+from shared.mcp_types import (
+    EnvelopeError,
+    MCPRequest,
+    MCPResponse,
+    parse_response,
+    request_to_dict,
+)
+
+
+# (clínica, ação, parâmetros em JSON canônico)
+_CacheKey = tuple[str, str, str]
+
+# Compressões que sabemos pedir: as do shared.wire que o urllib3 descomprime.
+_ACCEPT_ENCODING = ", ".join(c for c in wire.COMPRESSIONS if c in _DECODABLE)
 
-from shared.mcp_types import MCPRequest, MCPResponse
+# Segundos de espera pelo tools/list, e por quanto tempo uma falha é guardada.
+CAPABILITY_TIMEOUT = float(os.getenv("CLINIC_CAPABILITY_TIMEOUT", "2"))
+CAPABILITY_RETRY = float(os.getenv("CLINIC_CAPABILITY_RETRY", "30"))
 
 
 # ---------------------------------------------------------------------------
@@ -39,14 +96,97 @@ DEFAULT_REGISTRY: dict[str, str] = {
 }
 
 
+def gateway_registry(base_url: str, clinic_ids: Iterable[str] = DEFAULT_REGISTRY) -> dict[str, str]:
+    """
+    Registro para clínicas servidas num único processo
+    (``python -m shared.clinic_app --all``), em ``/clinics/{id}/mcp``.
+    """
+    base = base_url.rstrip("/")
+    return {clinic_id: f"{base}/clinics/{clinic_id}/mcp" for clinic_id in clinic_ids}
+
+
+class MCPStream:
+    """
+    Resposta em streaming (NDJSON) de uma etapa.
+
+    Iterar entrega os itens da listagem (``field``) conforme chegam; depois
+    de consumida, ``response`` traz o envelope final (``result`` com
+    ``count``, ou ``error``). Só pode ser iterada uma vez.
+    """
+
+    def __init__(self, http_response: Optional[requests.Response] = None,
+                 response: Optional[MCPResponse] = None, clinic_id: str = "") -> None:
+        self._http = http_response
+        self._clinic_id = clinic_id
+        self.field: Optional[str] = None
+        self.response = response
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        if self._http is None:
+            return
+        try:
+            for line in self._http.iter_lines(chunk_size=64 * 1024):
+                if not line:
+                    continue
+                obj = wire.loads_json(line)
+                if "jsonrpc" not in obj:
+                    yield obj
+                elif "stream" in obj:
+                    self.field = obj["stream"]
+                else:
+                    self.response = parse_response(obj)
+        except (requests.RequestException, EnvelopeError) as exc:
+            self.response = _network_error("stream", self._clinic_id, exc)
+        finally:
+            self._http.close()
+            self._http = None
+
+    def collect(self) -> MCPResponse:
+        """Consome o stream e monta a resposta completa, como ``dispatch``."""
+        items = list(self)
+        if self.response is None:
+            return MCPResponse(id="stream", error={
+                "code": -32603, "message": f"{self._clinic_id} encerrou o stream sem resposta"})
+        if self.field is not None and isinstance(self.response.result, dict):
+            self.response.result[self.field] = items
+        return self.response
+
+
 class Router:
     """
     Despacha etapas do grafo para o Agente de Clínica federado apropriado
     usando o protocolo MCP JSON-RPC sobre HTTP.
     """
 
-    def __init__(self, registry: dict[str, str] | None = None) -> None:
-        self.registry = registry or DEFAULT_REGISTRY
+    def __init__(self, registry: dict[str, str] | None = None, cache_size: int = 256,
+                 encoding: str | None = None, capability_ttl: float | None = None) -> None:
+        # CLINIC_GATEWAY_URL aponta para um processo que hospeda todas as clínicas.
+        gateway = os.getenv("CLINIC_GATEWAY_URL")
+        self.registry = registry or (
+            gateway_registry(gateway) if gateway else DEFAULT_REGISTRY)
+        encoding = (encoding or os.getenv("CLINIC_WIRE_ENCODING", "json")).lower()
+        media = wire.MEDIA_TYPES.get(encoding)
+        if media not in wire.ENCODINGS:
+            raise ValueError(
+                f"CLINIC_WIRE_ENCODING inválido ou não instalado: '{encoding}'. "
+                f"Disponíveis: {[n for n, m in wire.MEDIA_TYPES.items() if m in wire.ENCODINGS]}"
+            )
+        accept = media if media == wire.JSON else f"{media}, {wire.JSON};q=0.5"
+        self._headers = {"Content-Type": "application/json", "Accept": accept,
+                         "Accept-Encoding": _ACCEPT_ENCODING}
+        # Leituras com etag (ver docstring do módulo); 0 desliga o cache.
+        self._cache_size = cache_size
+        self._cache: OrderedDict[_CacheKey, MCPResponse] = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.cache_stats = {"hits": 0, "misses": 0}
+        # tools/list de cada clínica: (resultado, instante em que expira);
+        # resultado None é uma falha recente.
+        self.capability_ttl = float(
+            os.getenv("CLINIC_CAPABILITY_TTL", "300") if capability_ttl is None
+            else capability_ttl)
+        self._capabilities: dict[str, tuple[Optional[dict[str, Any]], float]] = {}
+        self._capability_lock = threading.Lock()
+        self.capability_stats = {"hits": 0, "fetches": 0}
 
     def dispatch(self, step: dict[str, Any]) -> MCPResponse:
         """
@@ -66,39 +206,225 @@ class Router:
         url = self.registry.get(clinic_id)
 
         if url is None:
-            return MCPResponse(
-                id="error",
-                error={
-                    "code": -32601,
-                    "message": f"Clínica '{clinic_id}' não encontrada no registro",
-                },
-            )
+            return _unknown_clinic(clinic_id)
+
+        key, cached = self._cached(clinic_id, step)
+        mcp_request = _to_request(step, cached)
+        try:
+            response = parse_response(self._post(url, request_to_dict(mcp_request)))
+        except (requests.RequestException, EnvelopeError) as exc:
+            return _network_error(mcp_request.id, clinic_id, exc)
+        return self._remember(key, cached, response)
+
+    def dispatch_stream(self, step: dict[str, Any]) -> MCPStream:
+        """
+        Como ``dispatch``, mas pede a resposta em NDJSON (listagens grandes).
 
-        # Constrói uma requisição MCP / JSON-RPC 2.0 padrão
-        mcp_request = MCPRequest(
-            id=str(uuid.uuid4()),
-            method="tools/call",
-            params={
-                "name": step.get("action", ""),
-                "arguments": step.get("parameters", {}),
-            },
-        )
+        Ferramentas sem modo streaming respondem o envelope comum: o
+        ``MCPStream`` não entrega itens e ``response`` traz a resposta.
+        """
+        clinic_id = step.get("clinic", "unknown")
+        url = self.registry.get(clinic_id)
+        if url is None:
+            return MCPStream(response=_unknown_clinic(clinic_id))
 
+        mcp_request = _to_request(step)
         try:
             http_response = requests.post(
                 url,
-                json=mcp_request.model_dump(),
-                headers={"Content-Type": "application/json"},
+                json=request_to_dict(mcp_request),
+                headers={**self._headers, "Accept": "application/x-ndjson"},
                 timeout=30,
+                stream=True,
             )
             http_response.raise_for_status()
-            return MCPResponse(**http_response.json())
+        except requests.RequestException as exc:
+            return MCPStream(response=_network_error(mcp_request.id, clinic_id, exc))
+        return MCPStream(http_response, clinic_id=clinic_id)
+
+    def dispatch_batch(self, steps: list[dict[str, Any]]) -> list[MCPResponse]:
+        """
+        Envia várias etapas com um lote JSON-RPC por clínica.
+
+        As etapas de cada clínica seguem no lote na ordem do plano, e o
+        servidor aplica as mutações nessa ordem.
 
+        Returns:
+            Um MCPResponse por etapa, na mesma ordem de ``steps``.
+        """
+        by_clinic: dict[str, list[int]] = {}
+        for i, step in enumerate(steps):
+            by_clinic.setdefault(step.get("clinic", "unknown"), []).append(i)
+
+        responses: dict[int, MCPResponse] = {}
+        for clinic_id, indices in by_clinic.items():
+            group = [steps[i] for i in indices]
+            responses.update(zip(indices, self._send_batch(clinic_id, group)))
+        return [responses[i] for i in range(len(steps))]
+
+    def _send_batch(self, clinic_id: str, steps: list[dict[str, Any]]) -> list[MCPResponse]:
+        url = self.registry.get(clinic_id)
+        if url is None:
+            return [_unknown_clinic(clinic_id) for _ in steps]
+        if len(steps) == 1:
+            return [self.dispatch(steps[0])]
+
+        lookups = [self._cached(clinic_id, step) for step in steps]
+        batch = [_to_request(step, cached) for step, (_, cached) in zip(steps, lookups)]
+        try:
+            body = self._post(url, [request_to_dict(r) for r in batch])
         except requests.RequestException as exc:
-            return MCPResponse(
-                id=mcp_request.id,
-                error={
-                    "code": -32000,
-                    "message": f"Erro de rede ao contactar {clinic_id}: {exc}",
-                },
+            return [_network_error(r.id, clinic_id, exc) for r in batch]
+
+        try:
+            # Erro do lote inteiro (ex.: lote inválido) vale para todas as etapas.
+            if isinstance(body, dict):
+                return [parse_response({**body, "id": r.id}) for r in batch]
+            # JSON-RPC não garante a ordem das respostas: casa pelo id.
+            by_id = {item.get("id"): parse_response(item) for item in body}
+        except (AttributeError, TypeError, EnvelopeError) as exc:
+            return [_network_error(r.id, clinic_id, exc) for r in batch]
+        return [
+            self._remember(key, cached, by_id[r.id]) if r.id in by_id
+            else MCPResponse(
+                id=r.id,
+                error={"code": -32603, "message": f"{clinic_id} não respondeu a esta etapa"},
             )
+            for r, (key, cached) in zip(batch, lookups)
+        ]
+
+    # ------------------------------------------------------------------
+    # Capacidades (tools/list)
+    # ------------------------------------------------------------------
+
+    def capabilities(self, clinic_id: str) -> Optional[dict[str, Any]]:
+        """
+        Resultado do ``tools/list`` da clínica (``clinic`` e ``tools``), do
+        cache enquanto não expira; None se a clínica não está no registro
+        ou não respondeu (a falha fica guardada por ``CAPABILITY_RETRY``).
+        """
+        url = self.registry.get(clinic_id)
+        if url is None:
+            return None
+        now = time.monotonic()
+        with self._capability_lock:
+            entry = self._capabilities.get(clinic_id)
+            if entry is not None and now < entry[1]:
+                self.capability_stats["hits"] += 1
+                return entry[0]
+
+        request = MCPRequest(id=str(uuid.uuid4()), method="tools/list")
+        try:
+            response = parse_response(self._post(url, request_to_dict(request),
+                                                 timeout=CAPABILITY_TIMEOUT))
+            result = response.result
+            if response.error is not None or not isinstance(result, dict) or "tools" not in result:
+                result = None
+        except (requests.RequestException, EnvelopeError):
+            result = None
+        with self._capability_lock:
+            if result is None:
+                retry = min(CAPABILITY_RETRY, self.capability_ttl)
+                self._capabilities[clinic_id] = (None, now + retry)
+            else:
+                self.capability_stats["fetches"] += 1
+                self._capabilities[clinic_id] = (result, now + self.capability_ttl)
+        return result
+
+    def catalogue(self) -> dict[str, dict[str, Any]]:
+        """Capacidades das clínicas do registro que responderam, por id."""
+        found = {clinic_id: self.capabilities(clinic_id) for clinic_id in self.registry}
+        return {clinic_id: caps for clinic_id, caps in found.items() if caps is not None}
+
+    # ------------------------------------------------------------------
+    # Cache condicional
+    # ------------------------------------------------------------------
+
+    def _cached(self, clinic_id: str, step: dict[str, Any]
+                ) -> tuple[Optional[_CacheKey], Optional[MCPResponse]]:
+        """Chave de cache da etapa e a resposta guardada para ela, se houver."""
+        parameters = step.get("parameters", {})
+        if "if_none_match" in parameters:
+            return None, None  # o chamador faz o próprio condicional: quer o etag
+        key = (clinic_id, step.get("action", ""),
+               json.dumps(parameters, sort_keys=True, default=str))
+        if not self._cache_size:
+            return key, None
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+            return key, cached
+
+    def _remember(self, key: Optional[_CacheKey], cached: Optional[MCPResponse],
+                  response: MCPResponse) -> MCPResponse:
+        """
+        Resolve ``not_modified`` pelo cache, guarda as respostas com etag e
+        devolve o resultado sem o ``etag``.
+        """
+        result = response.result
+        if key is None or not isinstance(result, dict) or "etag" not in result:
+            return response
+        if not self._cache_size:
+            return _without_etag(response)
+        with self._cache_lock:
+            if result.get("not_modified") and cached is not None:
+                if cached.result.get("etag") == result["etag"]:
+                    self.cache_stats["hits"] += 1
+                    return _without_etag(cached, response.id)
+                return _without_etag(response)
+            self.cache_stats["misses"] += 1
+            self._cache[key] = response
+            self._cache.move_to_end(key)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return _without_etag(response)
+
+    def _post(self, url: str, payload: Any, timeout: float = 30) -> Any:
+        http_response = requests.post(url, json=payload, headers=self._headers, timeout=timeout)
+        http_response.raise_for_status()
+        try:
+            return wire.decode(http_response.content, http_response.headers.get("Content-Type"))
+        except ValueError as exc:
+            raise requests.RequestException(f"resposta ilegível: {exc}") from exc
+
+
+def _to_request(step: dict[str, Any], cached: Optional[MCPResponse] = None) -> MCPRequest:
+    """
+    Requisição MCP / JSON-RPC 2.0 padrão para uma etapa do plano; com
+    ``cached``, condicional ao etag da resposta guardada.
+    """
+    arguments = step.get("parameters", {})
+    if cached is not None:
+        arguments = {**arguments, "if_none_match": cached.result["etag"]}
+    return MCPRequest(
+        id=str(uuid.uuid4()),
+        method="tools/call",
+        params={"name": step.get("action", ""), "arguments": arguments},
+    )
+
+
+def _without_etag(response: MCPResponse, request_id: Optional[str] = None) -> MCPResponse:
+    """Cópia rasa de ``response`` sem o ``etag`` (e com ``request_id``, se dado)."""
+    result = {k: v for k, v in response.result.items() if k != "etag"}
+    return response.model_copy(update={"id": request_id or response.id, "result": result})
+
+
+def _unknown_clinic(clinic_id: str) -> MCPResponse:
+    return MCPResponse(
+        id="error",
+        error={
+            "code": -32601,
+            "message": f"Clínica '{clinic_id}' não encontrada no registro",
+        },
+    )
+
+
+def _network_error(request_id: str, clinic_id: str, exc: Exception) -> MCPResponse:
+    return MCPResponse(
+        id=request_id,
+        error={
+            "code": -32000,
+            "message": f"Erro de rede ao contactar {clinic_id}: {exc}",
+        },
+    )
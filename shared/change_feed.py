@@ -0,0 +1,75 @@
+"""
+Feed de mudanças de horários
+============================
+Cada servidor de clínica numera as mutações de horários (agendar,
+cancelar, reagendar, agendar em lote, arquivar) com uma sequência
+monotônica e guarda as últimas em memória. ``changes_since`` devolve só
+os deltas posteriores a uma sequência, então um consumidor (ex.: um cache
+do orquestrador) se mantém sincronizado com custo proporcional ao número
+de mudanças, e não ao tamanho da agenda.
+
+Cada delta traz o estado absoluto do horário depois da mudança (nunca
+dados do paciente) e a ``version`` do horário. Mutações concorrentes de
+horários diferentes podem aparecer em qualquer ordem; para o mesmo
+horário, o consumidor aplica o delta só se a ``version`` for maior que a
+que ele já conhece — reaplicar um delta é inofensivo.
+
+A sequência vale para o processo atual: ``epoch`` muda quando o servidor
+reinicia, e um consumidor com epoch diferente ou sequência anterior ao
+que ainda está guardado recebe ``reset`` e deve listar de novo.
+"""
+
+from __future__ import annotations
+
+import secrets
+import threading
+from collections import deque
+from itertools import islice
+from typing import Any, Iterable, Mapping
+
+Change = dict[str, Any]
+
+
+class ChangeFeed:
+    """Últimas ``capacity`` mudanças de horários de uma clínica."""
+
+    def __init__(self, capacity: int = 10_000) -> None:
+        self.epoch = secrets.token_hex(8)
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._log: deque[Change] = deque(maxlen=capacity)
+
+    @property
+    def seq(self) -> int:
+        """Sequência da última mudança registrada (0 se nenhuma)."""
+        return self._seq
+
+    def record(self, op: str, slots: Iterable[Mapping[str, Any]]) -> int:
+        """Registra o estado atual de ``slots`` após ``op``; retorna a última sequência."""
+        with self._lock:
+            for s in slots:
+                self._seq += 1
+                self._log.append({
+                    "seq": self._seq, "op": op,
+                    "doctor": s["doctor"], "date": s["date"], "time": s["time"],
+                    "available": bool(s["available"]),
+                    "version": s.get("version", 0),
+                })
+            return self._seq
+
+    def since(self, seq: int, limit: int) -> tuple[list[Change], bool]:
+        """
+        Até ``limit`` mudanças com sequência maior que ``seq``, em ordem.
+
+        Retorna (mudanças, reset). ``reset`` é True quando ``seq`` já saiu
+        do buffer ou não pertence a este processo: o consumidor precisa
+        listar de novo a partir de ``self.seq``.
+        """
+        with self._lock:
+            pending = self._seq - seq
+            if pending < 0 or pending > len(self._log):
+                return [], True
+            # As mais recentes ficam no fim: percorre só as ``pending`` últimas.
+            newest_first = list(islice(reversed(self._log), pending))
+        newest_first.reverse()
+        return newest_first[:limit], False
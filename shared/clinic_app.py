@@ -0,0 +1,693 @@
+"""
+Fábrica de servidores MCP de clínica
+====================================
+Monta o servidor MCP de uma clínica a partir de uma entrada do arquivo de
+configuração (``clinic_agents/clinics.json`` ou ``CLINIC_CONFIG``):
+
+    {"id": "clinic_a", "name": "Clínica A", "specialty": "Cardiology",
+     "label": "Cardiologia", "port": 8001,
+     "db": "clinic_a/db.json", "patients": "clinic_a/patients.ndjson"}
+
+Caminhos relativos são resolvidos a partir da pasta do arquivo de
+configuração. A mesma fábrica serve dois modos:
+
+    uma clínica por processo — ``create_clinic_app``: endpoint ``/mcp``
+                               (é o que cada ``clinic_x/server.py`` usa);
+    várias clínicas por processo — ``create_multi_clinic_app``: endpoint
+                               ``/clinics/{id}/mcp`` para cada clínica.
+
+Execução direta:
+
+    python -m shared.clinic_app --all --port 8000      # todas num processo
+    python -m shared.clinic_app --clinic clinic_a      # só uma, na sua porta
+
+Os handlers fazem I/O de arquivo e tomam locks (``shared/db.py``), então
+os endpoints não os chamam no event loop: cada requisição roda num pool
+limitado de threads, compartilhado pelas clínicas do processo, com
+``CLINIC_HANDLER_THREADS`` threads (padrão 16; 0 executa no próprio event
+loop, o comportamento antigo, útil só para comparação).
+
+Lotes JSON-RPC 2.0: os endpoints também aceitam um array de requisições e
+devolvem o array de respostas, na mesma ordem. Leituras consecutivas
+(``READ_ONLY_TOOLS``) do lote rodam em paralelo; cada mutação espera as
+chamadas anteriores e roda sozinha, então o lote tem o mesmo efeito que
+as chamadas feitas uma a uma — o Router agrupa as etapas de uma clínica
+num só lote (uma ida e volta). Cada elemento é validado à parte: um
+elemento malformado recebe o erro -32600 na sua posição e os demais rodam.
+
+Streaming: com ``Accept: application/x-ndjson``, uma requisição única a
+``list_available_slots`` ou ``list_patients`` é respondida em NDJSON —
+uma linha de cabeçalho ``{"jsonrpc", "id", "stream": "<campo>"}``, um item
+por linha e, por fim, o envelope ``{"jsonrpc", "id", "result": {"count"}}``
+— produzido página a página, sem montar a lista inteira (no caso dos
+horários, sem ``limit``: vem a agenda inteira do filtro). As demais
+ferramentas, e os lotes, respondem o envelope de sempre.
+
+Codificação na rede: as respostas seguem ``Accept`` e ``Accept-Encoding``
+(ver ``shared/wire.py``) — JSON por padrão, MessagePack ou CBOR se
+instalados, e gzip/zstd acima de ``CLINIC_COMPRESS_MIN_BYTES``; o
+streaming também sai comprimido, página a página. Sem esses cabeçalhos,
+JSON sem compressão. As respostas são montadas pelo codec enxuto de
+``shared/mcp_types.py``, sem a serialização do ``response_model`` do
+FastAPI (que percorreria ``result`` inteiro).
+
+Pacientes: cada ``Clinic`` abre o seu NDJSON por ``shared/patient_store.py``
+(índice de offsets por ``patient_id`` + cache LRU, sem carregar os
+registros na partida); o índice de busca da ferramenta ``query``
+(``shared/patient_index.py``) só é montado na primeira busca e guarda
+apenas ids e termos — os registros encontrados são lidos pelo store.
+
+Leituras condicionais: as respostas de ``list_patients``, ``get_patient``,
+``query``, ``list_available_slots``, ``list_my_appointments`` e
+``list_appointment_history`` trazem ``result.etag``, um hash curto da
+versão dos dados lidos (arquivo de pacientes ou ``db.state_tag``) e dos
+argumentos. Quem manda o ``etag`` de volta no argumento ``if_none_match``
+recebe só ``{"not_modified": true, "etag"}`` enquanto nada mudou — o
+handler nem roda. O Router usa isso sozinho para as leituras que já tem
+em cache.
+
+Descoberta: ``tools/list`` devolve as ferramentas da clínica, cada uma com
+``inputSchema`` (JSON Schema derivado da assinatura do handler, ver
+``shared/tool_schema.py``), a descrição de ``TOOL_DESCRIPTIONS`` e
+``annotations.readOnlyHint``, mais ``clinic`` (id, nome e especialidade).
+A lista é montada uma vez na partida e guardada já codificada em JSON: a
+requisição só troca o ``id`` do envelope.
+
+Isolamento entre silos: cada ``Clinic`` abre apenas o seu arquivo de
+pacientes e liga os handlers de ``shared/db.py`` ao seu próprio banco de
+horários; a configuração recusa ids ou arquivos de dados repetidos, então
+nenhuma requisição de uma clínica alcança os dados de outra, mesmo
+compartilhando o processo.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import (
+    Annotated, Any, AsyncIterator, Callable, Iterable, Iterator, Optional, TypeVar, Union,
+)
+
+from fastapi import FastAPI, Header
+from pydantic import ValidationError
+from fastapi.responses import Response, StreamingResponse
+
+from shared import db, wire
+from shared.mcp_types import MCPRequest, MCPResponse, response_to_dict
+from shared.patient_index import PatientIndex
+from shared.patient_store import PatientStore
+from shared.tool_schema import describe_tool
+
+DEFAULT_CONFIG = Path(__file__).resolve().parents[1] / "clinic_agents" / "clinics.json"
+
+ToolHandler = Callable[..., dict[str, Any]]
+# Lotes chegam crus: cada elemento é validado em ``Clinic.handle``.
+MCPBody = Union[MCPRequest, list[dict[str, Any]]]
+MCPReply = Union[MCPResponse, list[MCPResponse]]
+T = TypeVar("T")
+
+HANDLER_THREADS = int(os.getenv("CLINIC_HANDLER_THREADS", "16"))
+
+NDJSON = "application/x-ndjson"
+STREAM_PAGE = 500
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# Ferramentas de agenda: handlers de shared/db.py, ligados ao banco e à
+# especialidade de cada clínica.
+SLOT_TOOLS: dict[str, Callable[..., dict[str, Any]]] = {
+    "list_available_slots": db.handle_list_available_slots,
+    "book_appointment": db.handle_book_appointment,
+    "book_appointments_bulk": db.handle_book_appointments_bulk,
+    "reschedule_appointment": db.handle_reschedule_appointment,
+    "cancel_appointment": db.handle_cancel_appointment,
+    "hold_slot": db.handle_hold_slot,
+    "release_hold": db.handle_release_hold,
+    "list_my_appointments": db.handle_list_my_appointments,
+    "list_appointment_history": db.handle_list_appointment_history,
+    "changes_since": db.handle_changes_since,
+}
+
+# Ferramentas que não alteram dados: podem rodar em paralelo dentro de um lote.
+READ_ONLY_TOOLS = frozenset({
+    "list_patients", "get_patient", "query",
+    "list_available_slots", "list_my_appointments", "list_appointment_history",
+    "changes_since",
+})
+
+# Descrições das ferramentas em tools/list — é o que o Planejador mostra ao
+# LLM; os parâmetros vêm do inputSchema.
+TOOL_DESCRIPTIONS: dict[str, str] = {
+    "list_patients": "Resumo dos pacientes da clínica (IDs e condições).",
+    "get_patient": "Registro completo de um paciente pelo patient_id.",
+    "query": "Busca em texto livre nos registros dos pacientes.",
+    "list_available_slots": (
+        "Horários livres. doctor filtra pelo nome do médico; date_from/date_to "
+        "(AAAA-MM-DD) e time_from/time_to (HH:MM) limitam o período — use date_from/"
+        "date_to sempre que o usuário mencionar um período (ex.: \"semana que vem\"); "
+        "limit e cursor (next_cursor da listagem anterior) paginam."
+    ),
+    "book_appointment": (
+        "Marca um horário (doctor, date AAAA-MM-DD, time HH:MM). expected_version: a "
+        "version do horário na listagem; se a resposta trouxer \"conflict\", o horário "
+        "mudou desde a listagem: ofereça outro horário sem listar a clínica inteira de "
+        "novo. Com hold_token (de hold_slot), o token sozinho já identifica médico, "
+        "data e hora."
+    ),
+    "book_appointments_bulk": (
+        "Marca vários horários de uma vez na mesma clínica (ex.: consultas para a "
+        "família); é tudo ou nada. appointments: lista de {doctor, date, time, "
+        "patient_name, expected_version}."
+    ),
+    "reschedule_appointment": (
+        "Move uma consulta marcada (doctor, original_date, original_time) para "
+        "new_date/new_time (AAAA-MM-DD, HH:MM). expected_version: a version do novo "
+        "horário na listagem; hold_token se o novo horário estiver reservado."
+    ),
+    "cancel_appointment": "Cancela uma consulta marcada (doctor, date AAAA-MM-DD, time HH:MM).",
+    "hold_slot": (
+        "Reserva o horário (doctor, date, time) por alguns minutos (ttl_seconds) "
+        "enquanto o usuário confirma; a resposta traz \"hold_token\". Indisponível "
+        "em clínicas com vários processos (backends json/sqlite)."
+    ),
+    "release_hold": "Desiste de uma reserva feita com hold_slot (hold_token).",
+    "list_my_appointments": "Consultas marcadas do paciente atual nesta clínica.",
+    "list_appointment_history": (
+        "Consultas do paciente atual em meses já encerrados (arquivo); date_from/date_to "
+        "(AAAA-MM-DD) opcionais."
+    ),
+    "changes_since": (
+        "Alterações da agenda com sequência maior que seq, para sincronizar outro "
+        "sistema (epoch: o da resposta anterior)."
+    ),
+}
+
+
+# ------------------------------------------------------------------
+# Pool de threads dos handlers
+# ------------------------------------------------------------------
+
+def handler_pool() -> Optional[ThreadPoolExecutor]:
+    """Pool compartilhado pelos endpoints deste processo (None se desligado)."""
+    global _pool
+    if HANDLER_THREADS <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(HANDLER_THREADS, thread_name_prefix="mcp-handler")
+    return _pool
+
+
+async def _run(fn: Callable[..., T], *args: Any) -> T:
+    """``fn(*args)`` no pool dos handlers (ou no próprio loop, se desligado)."""
+    pool = handler_pool()
+    if pool is None:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+
+
+def _reset_pool() -> None:
+    global _pool
+    _pool = None
+
+
+# Threads do pool não sobrevivem ao fork: o filho cria o seu sob demanda.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_pool)
+
+
+# ------------------------------------------------------------------
+# Configuração
+# ------------------------------------------------------------------
+
+class ClinicConfig:
+    """Uma entrada do arquivo de configuração de clínicas."""
+
+    def __init__(self, raw: dict[str, Any], base_dir: Path) -> None:
+        try:
+            self.id: str = raw["id"]
+            self.specialty: str = raw["specialty"]
+            self.db_path = (base_dir / raw["db"]).resolve()
+            self.patients_path = (base_dir / raw["patients"]).resolve()
+        except KeyError as exc:
+            raise ValueError(f"Campo ausente na configuração de clínica: {exc}") from None
+        self.name: str = raw.get("name", self.id)
+        self.label: str = raw.get("label", self.specialty)
+        self.port: Optional[int] = raw.get("port")
+
+
+def load_config(path: Optional[Path] = None) -> list[ClinicConfig]:
+    """Lê as clínicas de ``path`` (padrão: ``CLINIC_CONFIG`` ou ``clinics.json``)."""
+    path = Path(path or os.getenv("CLINIC_CONFIG") or DEFAULT_CONFIG)
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    clinics = [ClinicConfig(c, path.parent) for c in raw.get("clinics", [])]
+
+    seen: dict[Any, str] = {}
+    for c in clinics:
+        for key in (("id", c.id), ("db", c.db_path), ("patients", c.patients_path)):
+            if key in seen:
+                raise ValueError(
+                    f"Configuração inválida: {c.id} e {seen[key]} compartilham {key[0]}")
+            seen[key] = c.id
+    return clinics
+
+
+def get_clinic_config(clinic_id: str, path: Optional[Path] = None) -> ClinicConfig:
+    for c in load_config(path):
+        if c.id == clinic_id:
+            return c
+    raise ValueError(f"Clínica '{clinic_id}' não encontrada na configuração")
+
+
+# ------------------------------------------------------------------
+# Clínica
+# ------------------------------------------------------------------
+
+class Clinic:
+    """Os pacientes, o banco de horários e as ferramentas de uma clínica."""
+
+    def __init__(self, config: ClinicConfig) -> None:
+        self.config = config
+        self._patients = PatientStore(config.patients_path)
+        self._search: Optional[PatientIndex] = None
+        self._search_key: Any = None
+        self._search_lock = threading.Lock()
+        self.tools: dict[str, ToolHandler] = {
+            "list_patients": self._list_patients,
+            "get_patient": self._get_patient,
+            "query": self._query,
+        }
+        self.tools.update(
+            (name, partial(handler, config.db_path, config.specialty))
+            for name, handler in SLOT_TOOLS.items()
+        )
+        # Versão dos dados de cada ferramenta com ETag (ver docstring do módulo).
+        slot_tag = partial(db.state_tag, config.db_path)
+        self._tags: dict[str, Callable[[], Any]] = {
+            "list_patients": self._patients_tag,
+            "get_patient": self._patients_tag,
+            "query": self._patients_tag,
+            "list_available_slots": slot_tag,
+            "list_my_appointments": slot_tag,
+            "list_appointment_history": slot_tag,
+        }
+        # Ferramentas com modo streaming: campo da lista → gerador de páginas.
+        self.streams: dict[str, tuple[str, Callable[..., Iterator[list[dict[str, Any]]]]]] = {
+            "list_patients": ("patients", self._iter_patients),
+            "list_available_slots": (
+                "available_slots",
+                partial(db.iter_available_slots, config.db_path, config.specialty),
+            ),
+        }
+        # tools/list: montada uma vez; tool_list_json é o que vai na rede.
+        self.tool_list: dict[str, Any] = {
+            "clinic": {"id": config.id, "name": config.name,
+                       "specialty": config.specialty, "label": config.label},
+            "tools": [
+                describe_tool(name, handler, TOOL_DESCRIPTIONS.get(name),
+                              read_only=name in READ_ONLY_TOOLS)
+                for name, handler in self.tools.items()
+            ],
+        }
+        self.tool_list_json = wire.dumps_json(self.tool_list)
+
+    def _search_index(self) -> PatientIndex:
+        """
+        Índice de busca, montado na primeira ``query``; se o arquivo de
+        pacientes mudou desde então, reindexa só os registros alterados.
+        """
+        self._patients.refresh()
+        with self._search_lock:
+            key = self._patients.key
+            if self._search is None:
+                self._search = PatientIndex(self._patients.records())
+            elif key != self._search_key:
+                self._search.sync(self._patients.records())
+            self._search_key = key
+            return self._search
+
+    def _patients_tag(self) -> Any:
+        self._patients.refresh()
+        return self._patients.key
+
+    def _list_patients(self, **_kwargs: Any) -> dict[str, Any]:
+        """Resumo de todos os pacientes (Privacidade: apenas IDs e condições)."""
+        return {
+            "patients": [
+                {"patient_id": p["patient_id"], "condition": p["condition"]}
+                for p in self._patients.records()
+            ]
+        }
+
+    def _iter_patients(self, **_kwargs: Any) -> Iterator[list[dict[str, Any]]]:
+        """``list_patients`` em páginas, lendo o NDJSON em sequência."""
+        page: list[dict[str, Any]] = []
+        for p in self._patients.records():
+            page.append({"patient_id": p["patient_id"], "condition": p["condition"]})
+            if len(page) == STREAM_PAGE:
+                yield page
+                page = []
+        if page:
+            yield page
+
+    def _get_patient(self, patient_id: str = "", **_kwargs: Any) -> dict[str, Any]:
+        """Registro completo de um único paciente."""
+        patient = self._patients.get(patient_id)
+        if patient is None:
+            return {"error": f"Paciente '{patient_id}' não encontrado"}
+        return {"patient": patient}
+
+    def _query(self, query: str = "", **_kwargs: Any) -> dict[str, Any]:
+        """Busca em texto livre (por prefixo de termo) nos registros da clínica."""
+        # O índice só tem ids: os registros vêm do store (cache LRU).
+        matches = [
+            {"patient_id": p["patient_id"], "condition": p["condition"]}
+            for p in self._patients.get_many(self._search_index().search(query))
+        ]
+        return {"specialty": self.config.specialty, "query": query, "matches": matches}
+
+    def call(self, request: MCPRequest) -> MCPResponse:
+        """
+        Atende uma requisição JSON-RPC 2.0 / MCP.
+
+        Espera method="tools/call" com params.name identificando a ferramenta
+        e params.arguments contendo os argumentos nomeados da ferramenta, ou
+        method="tools/list" (a lista pré-montada).
+        """
+        if request.method == "tools/list":
+            return MCPResponse(id=request.id, result=self.tool_list)
+        if request.method != "tools/call":
+            return MCPResponse(
+                id=request.id,
+                error={
+                    "code": -32601,
+                    "message": (f"Método '{request.method}' não suportado. "
+                                "Use 'tools/call' ou 'tools/list'."),
+                },
+            )
+
+        tool_name = request.params.get("name", "")
+        arguments = dict(request.params.get("arguments", {}))
+        if_none_match = arguments.pop("if_none_match", None)
+
+        handler = self.tools.get(tool_name)
+        if handler is None:
+            return MCPResponse(
+                id=request.id,
+                error={
+                    "code": -32602,
+                    "message": (
+                        f"Ferramenta desconhecida '{tool_name}'. "
+                        f"Disponíveis: {list(self.tools.keys())}"
+                    ),
+                },
+            )
+
+        # Versão lida antes do handler: se algo mudar no meio, a resposta é
+        # mais nova que o etag e a próxima leitura só a busca de novo.
+        tag_of = self._tags.get(tool_name)
+        etag = _etag(tag_of(), tool_name, arguments) if tag_of is not None else None
+        if etag is not None and if_none_match == etag:
+            return MCPResponse(id=request.id, result={"not_modified": True, "etag": etag})
+
+        result = handler(**arguments)
+        if etag is not None and "error" not in result:
+            result = {**result, "etag": etag}
+        return MCPResponse(id=request.id, result=result)
+
+    async def call_async(self, request: MCPRequest) -> MCPResponse:
+        """``call`` fora do event loop, no pool de threads dos handlers."""
+        return await _run(self.call, request)
+
+    def stream(self, request: MCPRequest) -> Iterator[bytes]:
+        """
+        ``call`` em NDJSON, um pedaço por página (ver docstring do módulo).
+
+        Ferramentas sem modo streaming respondem só o envelope, numa linha.
+        Erros de validação viram ``result.error`` no envelope final, como
+        nas respostas comuns.
+        """
+        entry = self.streams.get(request.params.get("name", ""))
+        if request.method != "tools/call" or entry is None:
+            yield _ndjson(response_to_dict(self.call(request)))
+            return
+
+        field, pages = entry
+        yield _ndjson({"jsonrpc": "2.0", "id": request.id, "stream": field})
+        count = 0
+        result: dict[str, Any]
+        try:
+            for page in pages(**request.params.get("arguments", {})):
+                count += len(page)
+                yield b"".join(_ndjson(item) for item in page)
+            result = {"count": count}
+        except ValueError as exc:  # filtro ou cursor inválido
+            result = {"error": str(exc), "count": count}
+        yield _ndjson({"jsonrpc": "2.0", "id": request.id, "result": result})
+
+    async def stream_async(self, request: MCPRequest,
+                           coding: Optional[str] = None) -> AsyncIterator[bytes]:
+        """
+        ``stream`` com cada página produzida (e comprimida, com ``coding``)
+        no pool de threads dos handlers.
+        """
+        chunks = self.stream(request)
+        if coding is not None:
+            chunks = wire.compress_chunks(chunks, coding)
+        pool = handler_pool()
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                if pool is None:
+                    chunk = next(chunks, None)
+                else:
+                    chunk = await loop.run_in_executor(pool, next, chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            chunks.close()
+
+    async def call_batch(self, requests: list[MCPRequest]) -> list[MCPResponse]:
+        """
+        Atende um lote JSON-RPC 2.0; as respostas seguem a ordem do lote.
+
+        Leituras consecutivas rodam juntas no pool; uma mutação só começa
+        depois das chamadas anteriores e termina antes das seguintes.
+        """
+        responses: list[MCPResponse] = []
+        reads: list[MCPRequest] = []
+        for request in requests:
+            if request.method == "tools/list" or request.params.get("name") in READ_ONLY_TOOLS:
+                reads.append(request)
+                continue
+            responses += await asyncio.gather(*map(self.call_async, reads))
+            reads = []
+            responses.append(await self.call_async(request))
+        responses += await asyncio.gather(*map(self.call_async, reads))
+        return responses
+
+    async def handle(self, body: MCPBody) -> MCPReply:
+        """Requisição única ou lote, como chegou no endpoint."""
+        if isinstance(body, MCPRequest):
+            return await self.call_async(body)
+        if not body:
+            return _error("", -32600, "Lote JSON-RPC vazio")
+        parsed = [_batch_element(item) for item in body]
+        valid = [r for r in parsed if isinstance(r, MCPRequest)]
+        answers = iter(await self.call_batch(valid))
+        return [next(answers) if isinstance(r, MCPRequest) else r for r in parsed]
+
+
+def _error(request_id: str, code: int, message: str) -> MCPResponse:
+    return MCPResponse(id=request_id, error={"code": code, "message": message})
+
+
+def _batch_element(item: Any) -> MCPRequest | MCPResponse:
+    """Requisição validada, ou a resposta -32600 do elemento malformado."""
+    try:
+        return MCPRequest.model_validate(item)
+    except ValidationError as exc:
+        return MCPResponse(
+            id=_request_id(item),
+            error={"code": -32600, "message": "Invalid Request",
+                   "data": exc.errors(include_url=False, include_context=False,
+                                      include_input=False)},
+        )
+
+
+def _request_id(item: Any) -> str:
+    """``id`` de um elemento de lote ainda não validado ("" se não houver)."""
+    request_id = item.get("id") if isinstance(item, dict) else getattr(item, "id", None)
+    return "" if request_id is None else str(request_id)
+
+
+def _etag(version: Any, tool_name: str, arguments: dict[str, Any]) -> str:
+    """Hash curto de (versão dos dados, ferramenta, argumentos)."""
+    raw = json.dumps([version, tool_name, arguments], sort_keys=True, default=str)
+    return hashlib.blake2b(raw.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _ndjson(obj: Any) -> bytes:
+    return wire.dumps_json(obj) + b"\n"
+
+
+def _wants_stream(accept: Optional[str], body: MCPBody) -> bool:
+    return isinstance(body, MCPRequest) and accept is not None and NDJSON in accept
+
+
+def _streaming(clinic: Clinic, request: MCPRequest,
+               accept_encoding: Optional[str]) -> StreamingResponse:
+    coding = wire.content_coding(accept_encoding)
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if coding is not None:
+        headers["Content-Encoding"] = coding
+    return StreamingResponse(clinic.stream_async(request, coding),
+                             media_type=NDJSON, headers=headers)
+
+
+def _render(reply: MCPReply, accept: Optional[str],
+            accept_encoding: Optional[str]) -> Response:
+    if isinstance(reply, MCPResponse):
+        obj: Any = response_to_dict(reply)
+    else:
+        obj = [response_to_dict(r) for r in reply]
+    body, headers = wire.render(obj, accept, accept_encoding)
+    return Response(body, headers=headers)
+
+
+def _tool_list(clinic: Clinic, request: MCPRequest, accept: Optional[str],
+               accept_encoding: Optional[str]) -> Optional[Response]:
+    """
+    ``tools/list`` em JSON direto do buffer pré-codificado da clínica (só o
+    ``id`` é codificado); None se a resposta pedida é outra.
+    """
+    if (not isinstance(request, MCPRequest) or request.method != "tools/list"
+            or wire.media_type(accept) != wire.JSON):
+        return None
+    body = b"".join((b'{"jsonrpc":"2.0","id":', wire.dumps_json(request.id),
+                     b',"result":', clinic.tool_list_json, b',"error":null}'))
+    body, headers = wire.finish(body, wire.JSON, accept_encoding)
+    return Response(body, headers=headers)
+
+
+async def _respond(reply: MCPReply, accept: Optional[str],
+                   accept_encoding: Optional[str]) -> Response:
+    """
+    Resposta já codificada (e comprimida, se negociado), montada no pool.
+    Retornar o modelo deixaria o FastAPI validá-lo e percorrer ``result``
+    inteiro com ``jsonable_encoder`` — mais caro que o próprio handler.
+    """
+    return await _run(_render, reply, accept, accept_encoding)
+
+
+# ------------------------------------------------------------------
+# Aplicações FastAPI
+# ------------------------------------------------------------------
+
+def create_clinic_app(config: ClinicConfig) -> FastAPI:
+    """Servidor de uma única clínica, com o endpoint ``/mcp``."""
+    clinic = Clinic(config)
+    app = FastAPI(
+        title=f"{config.name} — {config.label} (Servidor MCP)",
+        description=f"Silo de dados federado de {config.label.lower()} expondo ferramentas MCP.",
+        version="0.1.0",
+    )
+    app.state.clinic = clinic
+
+    @app.post("/mcp", response_model=MCPReply)
+    async def mcp_endpoint(
+        request: MCPBody,
+        accept: Annotated[Optional[str], Header()] = None,
+        accept_encoding: Annotated[Optional[str], Header()] = None,
+    ) -> Response:
+        """Ponto de entrada JSON-RPC 2.0 / MCP (requisição única, lote ou streaming)."""
+        if _wants_stream(accept, request):
+            return _streaming(clinic, request, accept_encoding)
+        listing = _tool_list(clinic, request, accept, accept_encoding)
+        if listing is not None:
+            return listing
+        return await _respond(await clinic.handle(request), accept, accept_encoding)
+
+    return app
+
+
+def create_multi_clinic_app(configs: Iterable[ClinicConfig]) -> FastAPI:
+    """Várias clínicas num único processo, em ``/clinics/{id}/mcp``."""
+    clinics = {c.id: Clinic(c) for c in configs}
+    app = FastAPI(
+        title="Clínicas federadas (Servidor MCP)",
+        description=f"{len(clinics)} silos de dados federados, um endpoint MCP por clínica.",
+        version="0.1.0",
+    )
+    app.state.clinics = clinics
+
+    @app.get("/clinics")
+    async def list_clinics() -> dict[str, Any]:
+        return {"clinics": [
+            {"id": c.config.id, "specialty": c.config.specialty,
+             "endpoint": f"/clinics/{c.config.id}/mcp"}
+            for c in clinics.values()
+        ]}
+
+    @app.post("/clinics/{clinic_id}/mcp", response_model=MCPReply)
+    async def mcp_endpoint(
+        clinic_id: str,
+        request: MCPBody,
+        accept: Annotated[Optional[str], Header()] = None,
+        accept_encoding: Annotated[Optional[str], Header()] = None,
+    ) -> Response:
+        """Ponto de entrada JSON-RPC 2.0 / MCP da clínica ``clinic_id``."""
+        clinic = clinics.get(clinic_id)
+        if clinic is None:
+            message = f"Clínica '{clinic_id}' não encontrada"
+            if isinstance(request, MCPRequest):
+                return await _respond(_error(request.id, -32601, message), accept, accept_encoding)
+            return await _respond([_error(_request_id(r), -32601, message) for r in request],
+                                  accept, accept_encoding)
+        if _wants_stream(accept, request):
+            return _streaming(clinic, request, accept_encoding)
+        listing = _tool_list(clinic, request, accept, accept_encoding)
+        if listing is not None:
+            return listing
+        return await _respond(await clinic.handle(request), accept, accept_encoding)
+
+    return app
+
+
+# ------------------------------------------------------------------
+# Execução direta
+# ------------------------------------------------------------------
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Servidor MCP de clínicas")
+    parser.add_argument("--config", type=Path, default=None)
+    parser.add_argument("--clinic", action="append", default=[],
+                        help="id da clínica (repetível); sem --all, uma só")
+    parser.add_argument("--all", action="store_true", help="todas as clínicas da configuração")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=None)
+    args = parser.parse_args()
+
+    configs = load_config(args.config)
+    if not args.all:
+        wanted = set(args.clinic)
+        configs = [c for c in configs if c.id in wanted]
+        if not configs:
+            parser.error("informe --all ou ao menos um --clinic existente")
+    if len(configs) == 1 and not args.all:
+        uvicorn.run(create_clinic_app(configs[0]), host=args.host,
+                    port=args.port or configs[0].port or 8000)
+    else:
+        uvicorn.run(create_multi_clinic_app(configs), host=args.host, port=args.port or 8000)
@@ -1,62 +1,441 @@
 """
-Banco de dados simples baseado em arquivo JSON para horários de consulta.
-=========================================================================
-Cada clínica mantém seu próprio ``db.json`` — este módulo fornece
-helpers de leitura/escrita e os quatro handlers relacionados a consultas
-(listar, agendar, cancelar, reagendar) para que todos os servidores
-reutilizem a mesma lógica.
+Banco de dados de horários de consulta com backend plugável.
+=============================================================
+Cada clínica mantém seu próprio ``db.json`` — este módulo fornece os
+handlers relacionados a consultas (listar, reservar, agendar, agendar em
+lote, cancelar, reagendar, consultar as consultas e o histórico de um
+paciente, acompanhar as mudanças) para que todos os servidores reutilizem
+a mesma lógica.
+
+O armazenamento fica atrás da interface ``SlotStore`` (ver
+``shared/slot_store.py``). O backend é escolhido pela variável de
+ambiente ``CLINIC_DB_BACKEND``:
+
+    memory  — (padrão) tabela em memória carregada uma vez; o ``db.json``
+              é regravado em segundo plano a cada
+              ``CLINIC_DB_FLUSH_INTERVAL`` segundos e no encerramento.
+    group   — tabela em memória; cada escrita só retorna depois de gravada
+              em disco, e escritas concorrentes compartilham um único
+              snapshot durável (``CLINIC_DB_GROUP_COMMIT_MAX_BATCH`` e
+              ``CLINIC_DB_GROUP_COMMIT_MAX_WAIT_MS``).
+    journal — tabela em memória; cada mutação é uma linha acrescentada a
+              ``db.journal``, compactado no ``db.json`` a cada
+              ``CLINIC_DB_COMPACT_INTERVAL`` segundos.
+    json    — lê e regrava o ``db.json`` inteiro a cada operação.
+    sqlite  — ``db.sqlite`` ao lado do ``db.json``, importado uma única vez.
+
+Reservas temporárias (``hold_slot``/``release_hold``, ver
+``shared/holds.py``) ficam na memória do processo: horários reservados
+saem da listagem e só podem ser agendados com o ``hold_token`` da reserva
+até ela expirar. Por isso só existem nos backends de processo único
+(``memory``, ``group``, ``journal``); com ``json``/``sqlite`` outro worker
+agendaria sem ver a reserva, e ``hold_slot`` responde um erro.
+
+Com ``CLINIC_ARCHIVE_KEEP_MONTHS=N`` (N > 0), uma vez por dia os horários
+anteriores aos últimos N meses são movidos para o arquivo mensal
+compactado ``db.archive/`` (ver ``shared/slot_archive.py``), consultado
+apenas por ``list_appointment_history``. O padrão (0) não arquiva nada.
+
+Toda mutação feita pelos handlers é numerada no feed de mudanças da
+clínica (ver ``shared/change_feed.py``); ``changes_since`` devolve só os
+deltas posteriores a uma sequência. ``state_tag`` resume o estado lido
+pelas listagens num valor curto, usado como ETag pelas ferramentas de
+leitura (ver ``shared/clinic_app.py``).
 """
 
 from __future__ import annotations
 
+import atexit
+import base64
 import json
+import logging
+import os
 import threading
+from contextlib import ExitStack
+from datetime import date as _date, datetime, timezone
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterator
+
+from shared.change_feed import ChangeFeed
+from shared.holds import Hold, HoldManager, SlotHeld
+from shared.slot_archive import SlotArchive, archive_cutoff
+from shared.slot_store import (
+    Booking,
+    GroupCommitSlotStore,
+    JournalSlotStore,
+    JsonSlotStore,
+    MemorySlotStore,
+    PersistenceError,
+    SlotStore,
+    SlotView,
+    SortKey,
+    SqliteSlotStore,
+    VersionConflict,
+    sort_key,
+)
+from shared.slot_table import cpf_hash, day_minutes, format_minutes, time_minutes
+
+logger = logging.getLogger(__name__)
+
+BACKENDS: dict[str, Callable[[Path], SlotStore]] = {
+    "memory": MemorySlotStore,
+    "group": GroupCommitSlotStore,
+    "journal": JournalSlotStore,
+    "json": JsonSlotStore,
+    "sqlite": SqliteSlotStore,
+}
+
+# Tamanho padrão/máximo de página de list_available_slots — mantém a
+# resposta (e os tokens enviados ao LLM) limitada em clínicas grandes.
+DEFAULT_SLOT_LIMIT = 50
+MAX_SLOT_LIMIT = 500
+
+# Máximo de agendamentos por chamada de book_appointments_bulk.
+MAX_BULK_BOOKINGS = 500
 
-_lock = threading.Lock()
+# Duração padrão/máxima (s) de uma reserva de hold_slot.
+DEFAULT_HOLD_TTL = float(os.getenv("CLINIC_HOLD_TTL", "120"))
+MAX_HOLD_TTL = 900.0
+
+# Mudanças guardadas no feed de cada clínica; página padrão/máxima de changes_since.
+CHANGE_FEED_SIZE = int(os.getenv("CLINIC_CHANGE_FEED_SIZE", "10000"))
+DEFAULT_CHANGE_LIMIT = 500
+MAX_CHANGE_LIMIT = 5000
+
+# Meses mantidos no armazenamento quente; 0 desliga o arquivamento automático.
+ARCHIVE_KEEP_MONTHS = int(os.getenv("CLINIC_ARCHIVE_KEEP_MONTHS", "0"))
+
+_stores: dict[Path, SlotStore] = {}
+_stores_lock = threading.Lock()
+_holds: dict[Path, HoldManager] = {}
+_changes: dict[Path, ChangeFeed] = {}
+_archives: dict[Path, SlotArchive] = {}
+_archived_on: dict[Path, _date] = {}
+_archiving: set[Path] = set()  # também evita reentrar via get_store em archive_past
+_archive_lock = threading.Lock()
 
 
 # ------------------------------------------------------------------
-# Helpers de baixo nível
+# Seleção de backend
 # ------------------------------------------------------------------
 
-def _load_slots(db_path: Path) -> list[dict[str, Any]]:
-    with open(db_path, encoding="utf-8") as f:
-        return json.load(f)["slots"]
+def get_store(db_path: Path) -> SlotStore:
+    """Retorna (criando na primeira chamada) o backend associado a ``db_path``."""
+    key = Path(db_path).resolve()
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                backend = os.getenv("CLINIC_DB_BACKEND", "memory").lower()
+                if backend not in BACKENDS:
+                    raise ValueError(
+                        f"CLINIC_DB_BACKEND inválido: '{backend}'. "
+                        f"Disponíveis: {list(BACKENDS)}"
+                    )
+                store = BACKENDS[backend](key)
+                _stores[key] = store
+    if ARCHIVE_KEEP_MONTHS > 0:
+        _maybe_archive(key)
+    return store
+
+
+def get_holds(db_path: Path) -> HoldManager:
+    """Reservas temporárias da clínica de ``db_path`` (neste processo)."""
+    key = Path(db_path).resolve()
+    holds = _holds.get(key)
+    if holds is None:
+        with _stores_lock:
+            holds = _holds.setdefault(key, HoldManager())
+    return holds
+
+
+def get_changes(db_path: Path) -> ChangeFeed:
+    """Feed de mudanças da clínica de ``db_path`` (neste processo)."""
+    key = Path(db_path).resolve()
+    feed = _changes.get(key)
+    if feed is None:
+        with _stores_lock:
+            feed = _changes.setdefault(key, ChangeFeed(CHANGE_FEED_SIZE))
+    return feed
+
+
+def get_archive(db_path: Path) -> SlotArchive:
+    """Arquivo mensal de horários passados da clínica de ``db_path``."""
+    key = Path(db_path).resolve()
+    archive = _archives.get(key)
+    if archive is None:
+        with _stores_lock:
+            archive = _archives.setdefault(key, SlotArchive(key))
+    return archive
+
 
+def state_tag(db_path: Path) -> str:
+    """
+    Versão do que as leituras de horários da clínica enxergam: muda a cada
+    mutação no backend, a cada reserva criada, liberada ou vencida e a cada
+    reinício do processo (epoch do feed). Igual → mesma resposta.
+    """
+    return (f"{get_changes(db_path).epoch}.{get_store(db_path).data_version()}"
+            f".{get_holds(db_path).generation}")
 
-def _save_slots(db_path: Path, slots: list[dict[str, Any]]) -> None:
-    with open(db_path, "w", encoding="utf-8") as f:
-        json.dump({"slots": slots}, f, ensure_ascii=False, indent=2)
-        f.write("\n")
+
+def archive_past(db_path: Path, keep_months: int = 1, today: _date | None = None) -> int:
+    """
+    Move para ``db.archive/`` os horários anteriores aos últimos
+    ``keep_months`` meses (1 = só o mês corrente fica). Retorna quantos
+    horários foram arquivados.
+    """
+    cutoff = archive_cutoff(today or _date.today(), keep_months)
+    archived: list[dict[str, Any]] = []
+
+    def sink(slots: list[dict[str, Any]]) -> None:
+        get_archive(db_path).write(slots)
+        archived.extend(slots)
+
+    count = get_store(db_path).archive_before(cutoff, sink)
+    get_changes(db_path).record("archive", archived)
+    return count
+
+
+def _maybe_archive(key: Path) -> None:
+    """
+    Arquivamento automático, no máximo uma vez por dia por clínica.
+
+    O dia só é marcado depois de um arquivamento bem-sucedido; uma falha é
+    registrada no log e tentada de novo no próximo acesso, sem derrubar a
+    leitura ou o agendamento que a disparou.
+    """
+    today = _date.today()
+    if _archived_on.get(key) == today:
+        return
+    with _archive_lock:
+        if _archived_on.get(key) == today or key in _archiving:
+            return
+        _archiving.add(key)
+    try:
+        archive_past(key, ARCHIVE_KEEP_MONTHS, today)
+    except Exception:
+        logger.exception("Falha no arquivamento automático de %s", key)
+    else:
+        _archived_on[key] = today
+    finally:
+        with _archive_lock:
+            _archiving.discard(key)
+
+
+def close_stores() -> None:
+    """Fecha todos os backends abertos neste processo."""
+    with _stores_lock:
+        for store in _stores.values():
+            store.close()
+        _stores.clear()
+
+
+# Garante o flush final dos backends com write-back no encerramento do processo.
+atexit.register(close_stores)
+
+# Processos filhos (fork) não herdam os backends do pai: cada um abre os
+# seus e passa pelos locks de arquivo como qualquer outro processo.
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_stores.clear)
+    os.register_at_fork(after_in_child=_holds.clear)
+    os.register_at_fork(after_in_child=_changes.clear)
+    os.register_at_fork(after_in_child=_archived_on.clear)
+    os.register_at_fork(after_in_child=_archiving.clear)
 
 
 # ------------------------------------------------------------------
 # Handlers — chamados via functools.partial de cada servidor
 # ------------------------------------------------------------------
 
+def _encode_cursor(key: SortKey) -> str:
+    raw = json.dumps(list(key), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> SortKey:
+    """Decodifica o cursor opaco de paginação; ValueError se for inválido."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        date, time, doctor = map(str, json.loads(raw))
+        # Cursor forjado: a data/hora chegaria a ``to_minutes`` nos backends.
+        day_minutes(date)
+        time_minutes(time)
+        return (date, time, doctor)
+    except (ValueError, TypeError) as exc:
+        raise ValueError(f"Cursor inválido: {cursor!r}") from exc
+
+
+def _window_filters(date_from: str, date_to: str, time_from: str,
+                    time_to: str) -> dict[str, str]:
+    """
+    Valida e normaliza ("9:00" → "09:00") os filtros de data/hora uma vez,
+    antes de chegar ao backend: o json e o sqlite comparam strings e
+    devolveriam [] para "2025/01/01" em vez de um erro.
+    """
+    for value in (date_from, date_to):
+        if value:
+            day_minutes(value)
+    filters = {"date_from": date_from, "date_to": date_to}
+    for name, value in (("time_from", time_from), ("time_to", time_to)):
+        filters[name] = format_minutes(time_minutes(value))[1] if value else ""
+    return filters
+
+
+def _parse_version(value: int | str | None) -> int | None:
+    """``expected_version`` opcional vindo do JSON-RPC (int ou string)."""
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"expected_version inválido: {value!r}") from None
+
+
+def _freed(s: dict[str, Any]) -> dict[str, Any]:
+    """Estado de um horário depois de liberado, a partir do estado anterior."""
+    return {**s, "available": True, "version": s.get("version", 0) + 1}
+
+
+def _conflict_info(s: dict[str, Any], expected_version: int) -> dict[str, Any]:
+    return {
+        "doctor": s["doctor"], "date": s["date"], "time": s["time"],
+        "available": s["available"],
+        "expected_version": expected_version,
+        "current_version": s.get("version", 0),
+    }
+
+
+def _conflict(exc: VersionConflict) -> dict[str, Any]:
+    """Resposta de conflito: estado atual do horário para replanejar."""
+    s = exc.slot
+    return {
+        "error": (f"Horário alterado desde a listagem: {s['doctor']} em "
+                  f"{s['date']} às {s['time']}"),
+        "conflict": _conflict_info(s, exc.expected_version),
+    }
+
+
+def _held_error(hold: Hold) -> dict[str, Any]:
+    return {
+        "error": (f"Horário reservado por outra sessão: {hold.doctor} em "
+                  f"{hold.key[0]} às {hold.key[1]}"),
+        "held_until": _iso(hold.expires_at),
+    }
+
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat(timespec="seconds")
+
+
+def _check_hold(db_path: Path, doctor: str, date: str, time: str,
+                hold_token: str) -> dict[str, Any] | None:
+    """
+    Confere se ``hold_token``, quando informado, é a reserva deste horário.
+
+    Retorna um dict de erro ou None. Reservas de outras sessões são
+    conferidas por ``_claim`` junto com a gravação, não aqui.
+    """
+    if not hold_token:
+        return None
+    hold = get_holds(db_path).get(hold_token)
+    if hold is None:
+        return {"error": "Reserva expirada ou inexistente: reserve novamente com hold_slot"}
+    if hold.key != (date, time, doctor.lower()):
+        return {"error": (f"hold_token pertence a outro horário: {hold.doctor} em "
+                          f"{hold.key[0]} às {hold.key[1]}")}
+    return None
+
+
+def _claim(stack: ExitStack, db_path: Path, doctor: str, date: str, time: str,
+           hold_token: str) -> None:
+    """
+    Protege o horário até ``stack`` fechar: levanta ``SlotHeld`` se outra
+    sessão o reservou, e nenhuma reserva nova surge antes da gravação.
+    """
+    stack.enter_context(get_holds(db_path).claim((date, time, doctor.lower()), hold_token))
+
+
 def handle_list_available_slots(
     db_path: Path,
     specialty: str,
     doctor: str = "",
+    date_from: str = "",
+    date_to: str = "",
+    time_from: str = "",
+    time_to: str = "",
+    limit: int | str | None = None,
+    cursor: str = "",
     **_kw: Any,
 ) -> dict[str, Any]:
-    with _lock:
-        slots = _load_slots(db_path)
-    available = [
-        {"doctor": s["doctor"], "specialty": s["specialty"],
-         "date": s["date"], "time": s["time"], "available": True}
-        for s in slots if s["available"]
-    ]
-    if doctor:
-        dl = doctor.lower()
-        available = [s for s in available if dl in s["doctor"].lower()]
-    return {
+    try:
+        limit = DEFAULT_SLOT_LIMIT if limit in (None, "") else int(limit)
+        after = _decode_cursor(cursor) if cursor else None
+        window = _window_filters(date_from, date_to, time_from, time_to)
+    except ValueError as exc:
+        return {"error": str(exc)}
+    limit = max(1, min(limit, MAX_SLOT_LIMIT))
+
+    # Pede um a mais para saber se há próxima página sem uma segunda consulta
+    # (e mais um por reserva ativa, já que horários reservados são omitidos).
+    held = get_holds(db_path).held_keys()
+    slots = get_store(db_path).list_available(
+        doctor, **window, limit=limit + 1 + len(held), after=after,
+    )
+    if held:
+        slots = [s for s in slots if sort_key(s) not in held][:limit + 1]
+    available = [_available_out(s) for s in slots[:limit]]
+    result: dict[str, Any] = {
         "specialty": specialty,
         "available_slots": available,
         "note": "Para confirmar o agendamento, informe o horario desejado.",
     }
+    if len(slots) > limit:
+        result["next_cursor"] = _encode_cursor(sort_key(slots[limit - 1]))
+    return result
+
+
+def _available_out(s: SlotView) -> dict[str, Any]:
+    return {"doctor": s["doctor"], "specialty": s["specialty"],
+            "date": s["date"], "time": s["time"], "available": True,
+            "version": s.get("version", 0)}
+
+
+def iter_available_slots(
+    db_path: Path,
+    specialty: str,
+    doctor: str = "",
+    date_from: str = "",
+    date_to: str = "",
+    time_from: str = "",
+    time_to: str = "",
+    cursor: str = "",
+    page_size: int = MAX_SLOT_LIMIT,
+    **_kw: Any,
+) -> Iterator[list[dict[str, Any]]]:
+    """
+    Todos os horários livres do filtro, página a página (``list_available_slots``
+    em streaming, sem ``limit``). Cada página é uma consulta ao backend que
+    continua da anterior, então a memória não cresce com o tamanho da agenda.
+
+    Raises:
+        ValueError: cursor ou filtro de data/hora inválido.
+    """
+    after = _decode_cursor(cursor) if cursor else None
+    window = _window_filters(date_from, date_to, time_from, time_to)
+    store = get_store(db_path)
+    while True:
+        slots = store.list_available(doctor, **window, limit=page_size, after=after)
+        if not slots:
+            return
+        after = sort_key(slots[-1])
+        held = get_holds(db_path).held_keys()
+        page = [_available_out(s) for s in slots if sort_key(s) not in held]
+        if page:
+            yield page
+        if len(slots) < page_size:
+            return
 
 
 def handle_book_appointment(
@@ -67,34 +446,192 @@ def handle_book_appointment(
     time: str = "",
     patient_name: str = "",
     cpf: str = "",
+    expected_version: int | str | None = None,
+    hold_token: str = "",
     **_kw: Any,
 ) -> dict[str, Any]:
+    if hold_token and not (doctor and date and time):
+        # O token identifica o horário reservado: doctor/date/time são opcionais.
+        hold = get_holds(db_path).get(hold_token)
+        if hold is not None:
+            doctor, (date, time) = doctor or hold.doctor, hold.key[:2]
     if not doctor or not date or not time:
         return {"error": "Campos obrigatórios ausentes: doctor, date, time"}
     if not patient_name or not cpf:
         return {"error": "Identificação do paciente ausente: patient_name, cpf"}
+    held = _check_hold(db_path, doctor, date, time, hold_token)
+    if held is not None:
+        return held
+
+    try:
+        with ExitStack() as claims:
+            _claim(claims, db_path, doctor, date, time, hold_token)
+            s = get_store(db_path).book(doctor, date, time, patient_name, cpf,
+                                        _parse_version(expected_version))
+    except SlotHeld as exc:
+        return _held_error(exc.hold)
+    except VersionConflict as exc:
+        return _conflict(exc)
+    except (PersistenceError, ValueError) as exc:
+        return {"error": str(exc)}
+    if s is None:
+        return {"error": f"Horário indisponível: {doctor} em {date} às {time}"}
+    get_changes(db_path).record("book", [s])
+    if hold_token:
+        get_holds(db_path).release(hold_token)
+    return {
+        "status": "confirmed",
+        "appointment": {
+            "doctor": s["doctor"], "date": date, "time": time,
+            "patient_name": patient_name, "cpf": cpf,
+            "specialty": specialty, "version": s["version"],
+        },
+        "message": "Consulta agendada com sucesso.",
+    }
+
+
+_BULK_FIELDS = ("doctor", "date", "time", "patient_name", "cpf")
+
+_BULK_ERRORS = {
+    "not_found": "Horário não encontrado",
+    "unavailable": "Horário indisponível",
+    "conflict": "Horário alterado desde a listagem",
+    "duplicate": "Horário repetido no lote",
+    "not_applied": "Não aplicado: outro item do lote foi recusado",
+}
 
-    with _lock:
-        slots = _load_slots(db_path)
-        for s in slots:
-            if (s["doctor"].lower() == doctor.lower()
-                    and s["date"] == date
-                    and s["time"] == time
-                    and s["available"]):
-                s["available"] = False
-                s["patient_name"] = patient_name
-                s["cpf"] = cpf
-                _save_slots(db_path, slots)
-                return {
-                    "status": "confirmed",
-                    "appointment": {
-                        "doctor": s["doctor"], "date": date, "time": time,
-                        "patient_name": patient_name, "cpf": cpf,
-                        "specialty": specialty,
-                    },
-                    "message": "Consulta agendada com sucesso.",
-                }
-    return {"error": f"Horário indisponível: {doctor} em {date} às {time}"}
+
+def handle_book_appointments_bulk(
+    db_path: Path,
+    specialty: str,
+    appointments: list[dict[str, Any]] | None = None,
+    **_kw: Any,
+) -> dict[str, Any]:
+    """
+    Agenda vários horários em uma única chamada, tudo ou nada.
+
+    ``appointments`` é uma lista de objetos com doctor, date, time,
+    patient_name, cpf e ``expected_version`` opcional. Todos são
+    aplicados numa única transação/escrita do backend, ou nenhum é; o
+    resultado traz o status de cada item na ordem recebida.
+    """
+    if not appointments or not isinstance(appointments, list):
+        return {"error": "Campo obrigatório ausente: appointments (lista de agendamentos)"}
+    if len(appointments) > MAX_BULK_BOOKINGS:
+        return {"error": f"Máximo de {MAX_BULK_BOOKINGS} agendamentos por chamada"}
+
+    bookings: list[Booking] = []
+    for i, item in enumerate(appointments):
+        if not isinstance(item, dict):
+            return {"error": f"Agendamento {i}: esperado um objeto"}
+        missing = [f for f in _BULK_FIELDS if not item.get(f)]
+        if missing:
+            return {"error": f"Agendamento {i}: campos obrigatórios ausentes: {', '.join(missing)}"}
+        try:
+            version = _parse_version(item.get("expected_version"))
+        except ValueError as exc:
+            return {"error": f"Agendamento {i}: {exc}"}
+        held = _check_hold(db_path, item["doctor"], item["date"], item["time"],
+                           item.get("hold_token", ""))
+        if held is not None:
+            return {**held, "error": f"Agendamento {i}: {held['error']}"}
+        bookings.append({**{f: item[f] for f in _BULK_FIELDS}, "expected_version": version})
+
+    results = []
+    try:
+        with ExitStack() as claims:
+            for item in appointments:
+                _claim(claims, db_path, item["doctor"], item["date"], item["time"],
+                       item.get("hold_token", ""))
+            outcomes = get_store(db_path).book_many(bookings)
+    except SlotHeld as exc:
+        i = next(i for i, b in enumerate(bookings)
+                 if (b["date"], b["time"], b["doctor"].lower()) == exc.hold.key)
+        held = _held_error(exc.hold)
+        return {**held, "error": f"Agendamento {i}: {held['error']}"}
+    except PersistenceError as exc:
+        return {"error": str(exc)}
+    for i, (b, (status, s)) in enumerate(zip(bookings, outcomes)):
+        item: dict[str, Any] = {"index": i, "status": status}
+        if status == "confirmed":
+            item["appointment"] = {
+                "doctor": s["doctor"], "date": b["date"], "time": b["time"],
+                "patient_name": b["patient_name"], "cpf": b["cpf"],
+                "specialty": specialty, "version": s["version"],
+            }
+        else:
+            item["error"] = (f"{_BULK_ERRORS[status]}: {b['doctor']} em "
+                             f"{b['date']} às {b['time']}")
+            if status == "conflict":
+                item["conflict"] = _conflict_info(s, b["expected_version"])
+        results.append(item)
+
+    confirmed = all(r["status"] == "confirmed" for r in results)
+    if confirmed:
+        get_changes(db_path).record("book", (s for _, s in outcomes))
+        for item in appointments:
+            if item.get("hold_token"):
+                get_holds(db_path).release(item["hold_token"])
+    return {
+        "status": "confirmed" if confirmed else "rejected",
+        "results": results,
+        "message": (f"{len(results)} consulta(s) agendada(s) com sucesso."
+                    if confirmed else
+                    "Nenhuma consulta foi agendada: corrija os itens recusados."),
+    }
+
+
+def handle_list_my_appointments(
+    db_path: Path,
+    specialty: str,
+    cpf: str = "",
+    **_kw: Any,
+) -> dict[str, Any]:
+    """Consultas marcadas para o CPF, via índice hash(CPF) → horários do backend."""
+    if not cpf:
+        return {"error": "Identificação do paciente ausente: cpf"}
+    appointments = [
+        {"doctor": s["doctor"], "specialty": specialty, "date": s["date"],
+         "time": s["time"], "version": s.get("version", 0)}
+        for s in get_store(db_path).list_booked(cpf)
+    ]
+    return {
+        "specialty": specialty,
+        "appointments": appointments,
+        "note": ("Use estes dados (médico, data, hora) para cancelar ou reagendar."
+                 if appointments else "Nenhuma consulta encontrada para este CPF."),
+    }
+
+
+def handle_list_appointment_history(
+    db_path: Path,
+    specialty: str,
+    cpf: str = "",
+    date_from: str = "",
+    date_to: str = "",
+    **_kw: Any,
+) -> dict[str, Any]:
+    """
+    Consultas do CPF em meses já arquivados.
+
+    Só as partições de ``db.archive/`` dentro da faixa de datas são lidas;
+    consultas ainda no armazenamento quente vêm de ``list_my_appointments``.
+    """
+    if not cpf:
+        return {"error": "Identificação do paciente ausente: cpf"}
+    key = cpf_hash(cpf)
+    appointments = [
+        {"doctor": s["doctor"], "specialty": specialty,
+         "date": s["date"], "time": s["time"]}
+        for s in get_archive(db_path).read(date_from, date_to)
+        if not s["available"] and s.get("cpf") and cpf_hash(s["cpf"]) == key
+    ]
+    return {
+        "specialty": specialty,
+        "appointments": appointments,
+        "note": ("Consultas de meses encerrados (somente leitura)." if appointments
+                 else "Nenhuma consulta arquivada para este CPF."),
+    }
 
 
 def handle_cancel_appointment(
@@ -105,6 +642,7 @@ def handle_cancel_appointment(
     time: str = "",
     patient_name: str = "",
     cpf: str = "",
+    expected_version: int | str | None = None,
     **_kw: Any,
 ) -> dict[str, Any]:
     if not doctor or not date or not time:
@@ -112,27 +650,25 @@ def handle_cancel_appointment(
     if not patient_name or not cpf:
         return {"error": "Identificação do paciente ausente: patient_name, cpf"}
 
-    with _lock:
-        slots = _load_slots(db_path)
-        for s in slots:
-            if (s["doctor"].lower() == doctor.lower()
-                    and s["date"] == date
-                    and s["time"] == time
-                    and not s["available"]):
-                s["available"] = True
-                s["patient_name"] = None
-                s["cpf"] = None
-                _save_slots(db_path, slots)
-                return {
-                    "status": "cancelled",
-                    "cancelled_appointment": {
-                        "doctor": s["doctor"], "date": date, "time": time,
-                        "patient_name": patient_name, "cpf": cpf,
-                        "specialty": specialty,
-                    },
-                    "message": "Consulta cancelada com sucesso.",
-                }
-    return {"error": f"Consulta não encontrada: {doctor} em {date} às {time}"}
+    try:
+        s = get_store(db_path).cancel(doctor, date, time,
+                                      _parse_version(expected_version))
+    except VersionConflict as exc:
+        return _conflict(exc)
+    except (PersistenceError, ValueError) as exc:
+        return {"error": str(exc)}
+    if s is None:
+        return {"error": f"Consulta não encontrada: {doctor} em {date} às {time}"}
+    get_changes(db_path).record("cancel", [_freed(s)])
+    return {
+        "status": "cancelled",
+        "cancelled_appointment": {
+            "doctor": s["doctor"], "date": date, "time": time,
+            "patient_name": patient_name, "cpf": cpf,
+            "specialty": specialty,
+        },
+        "message": "Consulta cancelada com sucesso.",
+    }
 
 
 def handle_reschedule_appointment(
@@ -145,6 +681,8 @@ def handle_reschedule_appointment(
     new_time: str = "",
     patient_name: str = "",
     cpf: str = "",
+    expected_version: int | str | None = None,
+    hold_token: str = "",
     **_kw: Any,
 ) -> dict[str, Any]:
     if not original_date or not original_time or not doctor:
@@ -154,43 +692,162 @@ def handle_reschedule_appointment(
     if not patient_name or not cpf:
         return {"error": "Identificação do paciente ausente: patient_name, cpf"}
 
-    with _lock:
-        slots = _load_slots(db_path)
-        orig = new = None
-        for s in slots:
-            if (s["doctor"].lower() == doctor.lower()
-                    and s["date"] == original_date
-                    and s["time"] == original_time
-                    and not s["available"]):
-                orig = s
-            if (s["doctor"].lower() == doctor.lower()
-                    and s["date"] == new_date
-                    and s["time"] == new_time
-                    and s["available"]):
-                new = s
-
-        if not orig:
-            return {"error": f"Consulta original não encontrada: {doctor} em {original_date} às {original_time}"}
-        if not new:
-            return {"error": f"Novo horário indisponível: {doctor} em {new_date} às {new_time}"}
-
-        orig["available"] = True
-        orig["patient_name"] = None
-        orig["cpf"] = None
-        new["available"] = False
-        new["patient_name"] = patient_name
-        new["cpf"] = cpf
-        _save_slots(db_path, slots)
-
-        return {
-            "status": "rescheduled",
-            "original_appointment": {
-                "doctor": doctor, "date": original_date, "time": original_time,
-            },
-            "new_appointment": {
-                "doctor": new["doctor"], "date": new_date, "time": new_time,
-                "patient_name": patient_name, "cpf": cpf,
-                "specialty": specialty,
-            },
-            "message": "Consulta reagendada com sucesso.",
-        }
+    held = _check_hold(db_path, doctor, new_date, new_time, hold_token)
+    if held is not None:
+        return held
+
+    try:
+        with ExitStack() as claims:
+            _claim(claims, db_path, doctor, new_date, new_time, hold_token)
+            orig, new = get_store(db_path).reschedule(
+                doctor, original_date, original_time, new_date, new_time,
+                patient_name, cpf, _parse_version(expected_version),
+            )
+    except SlotHeld as exc:
+        return _held_error(exc.hold)
+    except VersionConflict as exc:
+        return _conflict(exc)
+    except (PersistenceError, ValueError) as exc:
+        return {"error": str(exc)}
+    if not orig:
+        return {"error": f"Consulta original não encontrada: {doctor} em {original_date} às {original_time}"}
+    if not new:
+        return {"error": f"Novo horário indisponível: {doctor} em {new_date} às {new_time}"}
+    get_changes(db_path).record("reschedule", [_freed(orig), new])
+    if hold_token:
+        get_holds(db_path).release(hold_token)
+
+    return {
+        "status": "rescheduled",
+        "original_appointment": {
+            "doctor": doctor, "date": original_date, "time": original_time,
+        },
+        "new_appointment": {
+            "doctor": new["doctor"], "date": new_date, "time": new_time,
+            "patient_name": patient_name, "cpf": cpf,
+            "specialty": specialty, "version": new["version"],
+        },
+        "message": "Consulta reagendada com sucesso.",
+    }
+
+
+def handle_hold_slot(
+    db_path: Path,
+    specialty: str,
+    doctor: str = "",
+    date: str = "",
+    time: str = "",
+    patient_name: str = "",
+    cpf: str = "",
+    ttl_seconds: int | float | str | None = None,
+    **_kw: Any,
+) -> dict[str, Any]:
+    """
+    Reserva um horário livre por ``ttl_seconds`` (padrão ``CLINIC_HOLD_TTL``).
+
+    Enquanto a reserva vale, o horário some da listagem e só
+    ``book_appointment`` com o ``hold_token`` devolvido consegue ocupá-lo.
+    O mesmo paciente (cpf) pode reservar de novo para renovar o prazo.
+    """
+    if not doctor or not date or not time:
+        return {"error": "Campos obrigatórios ausentes: doctor, date, time"}
+    if get_store(db_path).shared_across_processes:
+        return {"error": (
+            "Reservas (hold_slot) indisponíveis com o backend "
+            f"'{os.getenv('CLINIC_DB_BACKEND', 'memory').lower()}': outros processos "
+            "gravam no mesmo banco sem ver a reserva. Agende direto, com "
+            "expected_version da listagem."
+        )}
+    try:
+        ttl = DEFAULT_HOLD_TTL if ttl_seconds in (None, "") else float(ttl_seconds)
+        s = _free_slot(db_path, doctor, date, time)
+    except ValueError as exc:
+        return {"error": str(exc)}
+    ttl = max(1.0, min(ttl, MAX_HOLD_TTL))
+
+    unavailable = {"error": f"Horário indisponível: {doctor} em {date} às {time}"}
+    if s is None:
+        return unavailable
+    holds = get_holds(db_path)
+    try:
+        hold = holds.hold(sort_key(s), s["doctor"], ttl, cpf)
+    except SlotHeld as exc:
+        return _held_error(exc.hold)
+    # ``hold`` espera as gravações em curso do horário; se uma delas o
+    # ocupou depois da listagem acima, a reserva não vale nada.
+    if _free_slot(db_path, doctor, date, time) is None:
+        holds.release(hold.token)
+        return unavailable
+    return {
+        "status": "held",
+        "hold_token": hold.token,
+        "expires_at": _iso(hold.expires_at),
+        "ttl_seconds": ttl,
+        "slot": {
+            "doctor": s["doctor"], "specialty": specialty,
+            "date": s["date"], "time": s["time"], "version": s.get("version", 0),
+        },
+        "message": "Horário reservado. Confirme com book_appointment usando o hold_token.",
+    }
+
+
+def _free_slot(db_path: Path, doctor: str, date: str, time: str) -> SlotView | None:
+    free = get_store(db_path).list_available(
+        doctor, date_from=date, date_to=date, time_from=time, time_to=time)
+    return next((s for s in free if s["doctor"].lower() == doctor.lower()), None)
+
+
+def handle_release_hold(
+    db_path: Path,
+    specialty: str,
+    hold_token: str = "",
+    **_kw: Any,
+) -> dict[str, Any]:
+    if not hold_token:
+        return {"error": "Campo obrigatório ausente: hold_token"}
+    hold = get_holds(db_path).release(hold_token)
+    if hold is None:
+        return {"error": "Reserva expirada ou inexistente"}
+    return {
+        "status": "released",
+        "slot": {"doctor": hold.doctor, "date": hold.key[0], "time": hold.key[1]},
+        "message": "Reserva liberada.",
+    }
+
+
+def handle_changes_since(
+    db_path: Path,
+    specialty: str,
+    seq: int | str | None = 0,
+    epoch: str = "",
+    limit: int | str | None = None,
+    **_kw: Any,
+) -> dict[str, Any]:
+    """
+    Deltas de horários com sequência maior que ``seq``.
+
+    Com ``reset`` verdadeiro (servidor reiniciado, ``epoch`` diferente ou
+    ``seq`` fora do buffer) nenhuma mudança é devolvida: o consumidor
+    lista os horários de novo e continua a partir do ``seq`` retornado.
+    """
+    try:
+        since = int(seq or 0)
+        limit = DEFAULT_CHANGE_LIMIT if limit in (None, "") else int(limit)
+    except (TypeError, ValueError):
+        return {"error": f"seq/limit inválidos: {seq!r}, {limit!r}"}
+    limit = max(1, min(limit, MAX_CHANGE_LIMIT))
+
+    feed = get_changes(db_path)
+    if epoch and epoch != feed.epoch:
+        changes, reset = [], True
+    else:
+        changes, reset = feed.since(since, limit)
+    latest = feed.seq
+    return {
+        "specialty": specialty,
+        "epoch": feed.epoch,
+        "seq": changes[-1]["seq"] if changes else (latest if reset else since),
+        "changes": changes,
+        "has_more": bool(changes) and changes[-1]["seq"] < latest,
+        "reset": reset,
+    }
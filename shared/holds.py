@@ -0,0 +1,172 @@
+"""
+Reservas temporárias de horários (holds)
+========================================
+Entre listar horários e o usuário escolher um, outra sessão pode ocupar o
+horário. ``hold_slot`` reserva o horário por alguns segundos e devolve um
+token que ``book_appointment`` consome em O(1).
+
+As reservas vivem na memória do processo do servidor da clínica. A
+expiração usa um heap de (expira_em, token) com remoção preguiçosa: cada
+operação descarta apenas as reservas vencidas no topo do heap, sem varrer
+as demais nem manter uma thread de timer.
+
+Quem grava um horário o protege com ``claim`` durante a gravação: a
+conferência das reservas e a marcação do horário acontecem numa única
+seção crítica, e ``hold`` do mesmo horário espera a gravação terminar.
+"""
+
+from __future__ import annotations
+
+import heapq
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from time import monotonic
+from typing import Callable, Iterator, Optional
+
+# (data, hora, lower(médico)) — mesma chave de ordenação de ``slot_store``.
+HoldKey = tuple[str, str, str]
+
+
+class Hold:
+    """Uma reserva ativa."""
+
+    __slots__ = ("token", "key", "doctor", "cpf", "expires", "expires_at")
+
+    def __init__(self, token: str, key: HoldKey, doctor: str, cpf: str,
+                 expires: float, expires_at: float) -> None:
+        self.token = token
+        self.key = key
+        self.doctor = doctor
+        self.cpf = cpf
+        self.expires = expires        # relógio monotônico
+        self.expires_at = expires_at  # epoch, para a resposta ao cliente
+
+
+class SlotHeld(Exception):
+    """O horário já está reservado por outra sessão."""
+
+    def __init__(self, hold: Hold, remaining: float) -> None:
+        self.hold = hold
+        self.remaining = remaining
+        super().__init__(
+            f"Horário reservado por outra sessão: {hold.doctor} em "
+            f"{hold.key[0]} às {hold.key[1]} (libera em {remaining:.0f}s)"
+        )
+
+
+class HoldManager:
+    """Reservas de uma clínica, indexadas por token e por horário."""
+
+    def __init__(self, clock: Callable[[], float] = monotonic) -> None:
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._by_token: dict[str, Hold] = {}
+        self._by_key: dict[HoldKey, Hold] = {}
+        self._heap: list[tuple[float, str]] = []
+        # Horários sendo gravados agora (``claim``), com o número de gravações.
+        self._claims: dict[HoldKey, int] = {}
+        self._unclaimed = threading.Condition(self._lock)
+        # Muda sempre que o conjunto de horários reservados muda.
+        self._generation = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._reap(self._clock())
+            return len(self._by_token)
+
+    def _reap(self, now: float) -> None:
+        """Remove as reservas vencidas do topo do heap (chamado sob ``_lock``)."""
+        heap = self._heap
+        while heap and heap[0][0] <= now:
+            expires, token = heapq.heappop(heap)
+            hold = self._by_token.get(token)
+            # Entradas antigas de reservas renovadas ou já removidas são ignoradas.
+            if hold is not None and hold.expires == expires:
+                self._drop(hold)
+
+    def _drop(self, hold: Hold) -> None:
+        self._generation += 1
+        del self._by_token[hold.token]
+        if self._by_key.get(hold.key) is hold:
+            del self._by_key[hold.key]
+
+    def hold(self, key: HoldKey, doctor: str, ttl: float, cpf: str = "") -> Hold:
+        """
+        Reserva ``key`` por ``ttl`` segundos.
+
+        Se o mesmo paciente (``cpf``) já reservou o horário, a reserva é
+        renovada e mantém o token; reservado por outro, levanta ``SlotHeld``.
+        """
+        with self._lock:
+            while key in self._claims:
+                self._unclaimed.wait()
+            now = self._clock()
+            self._reap(now)
+            current = self._by_key.get(key)
+            if current is not None:
+                if not cpf or current.cpf != cpf:
+                    raise SlotHeld(current, current.expires - now)
+                hold = current
+            else:
+                hold = Hold(secrets.token_urlsafe(16), key, doctor, cpf, 0.0, 0.0)
+                self._generation += 1
+                self._by_token[hold.token] = hold
+                self._by_key[key] = hold
+            hold.expires = now + ttl
+            hold.expires_at = time.time() + ttl
+            heapq.heappush(self._heap, (hold.expires, hold.token))
+            return hold
+
+    @contextmanager
+    def claim(self, key: HoldKey, token: str = "") -> Iterator[None]:
+        """
+        Protege ``key`` enquanto o bloco grava o horário.
+
+        Levanta ``SlotHeld`` se outra sessão (token diferente de ``token``)
+        reservou o horário; até o bloco terminar, nenhuma reserva nova de
+        ``key`` é criada.
+        """
+        with self._lock:
+            now = self._clock()
+            self._reap(now)
+            current = self._by_key.get(key)
+            if current is not None and current.token != token:
+                raise SlotHeld(current, current.expires - now)
+            self._claims[key] = self._claims.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                left = self._claims.pop(key) - 1
+                if left:
+                    self._claims[key] = left
+                else:
+                    self._unclaimed.notify_all()
+
+    def get(self, token: str) -> Optional[Hold]:
+        with self._lock:
+            self._reap(self._clock())
+            return self._by_token.get(token)
+
+    def release(self, token: str) -> Optional[Hold]:
+        """Remove a reserva; retorna-a ou None se não existe (ou expirou)."""
+        with self._lock:
+            self._reap(self._clock())
+            hold = self._by_token.get(token)
+            if hold is not None:
+                self._drop(hold)
+            return hold
+
+    @property
+    def generation(self) -> int:
+        """Contador de mudanças nas reservas ativas (criadas, liberadas ou vencidas)."""
+        with self._lock:
+            self._reap(self._clock())
+            return self._generation
+
+    def held_keys(self) -> set[HoldKey]:
+        with self._lock:
+            self._reap(self._clock())
+            return set(self._by_key)
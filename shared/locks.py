@@ -0,0 +1,123 @@
+"""
+Primitivas de lock para os backends de horários
+================================================
+    FileLock — lock entre processos via ``fcntl.flock`` sobre um arquivo
+               ``.lock`` ao lado do banco, combinado com um lock de
+               leitores/escritor entre as threads do processo (o flock não
+               distingue threads que compartilham o descritor).
+
+Em plataformas sem ``fcntl`` (Windows) o ``FileLock`` protege apenas as
+threads do processo atual.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import ContextManager, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover — Windows
+    fcntl = None  # type: ignore[assignment]
+
+
+class FileLock:
+    """
+    Lock exclusivo/compartilhado entre processos sobre ``path``.
+
+    Dentro do processo, leitores (``shared``) entram juntos e só o primeiro
+    toma o ``LOCK_SH``; o último a sair o libera — um ``LOCK_UN`` vale para
+    o descritor inteiro. Um escritor à espera barra novos leitores.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writing = False
+        self._writers_waiting = 0
+        self._fd: Optional[int] = None
+
+    def _open(self) -> int:
+        if self._fd is None:
+            self._fd = os.open(str(self.path), os.O_RDWR | os.O_CREAT, 0o644)
+        return self._fd
+
+    @contextmanager
+    def _hold_exclusive(self) -> Iterator[None]:
+        with self._cond:
+            self._writers_waiting += 1
+            try:
+                while self._writing or self._readers:
+                    self._cond.wait()
+            finally:
+                self._writers_waiting -= 1
+            self._writing = True
+        try:
+            fd = self._open()
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            with self._cond:
+                self._writing = False
+                self._cond.notify_all()
+
+    @contextmanager
+    def _hold_shared(self) -> Iterator[None]:
+        with self._cond:
+            while self._writing or self._writers_waiting:
+                self._cond.wait()
+            if not self._readers:
+                fd = self._open()
+                if fcntl is not None:
+                    fcntl.flock(fd, fcntl.LOCK_SH)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    if fcntl is not None and self._fd is not None:
+                        fcntl.flock(self._fd, fcntl.LOCK_UN)
+                    self._cond.notify_all()
+
+    def exclusive(self) -> ContextManager[None]:
+        """Bloqueia até obter o lock exclusivo (escritas)."""
+        return self._hold_exclusive()
+
+    def shared(self) -> ContextManager[None]:
+        """Bloqueia até obter o lock compartilhado (leituras); leitores não se serializam."""
+        return self._hold_shared()
+
+    def try_own(self) -> bool:
+        """
+        Tenta obter o lock exclusivo sem bloquear e mantê-lo até ``release()``.
+
+        Usado pelos backends em memória, que só são consistentes quando um
+        único processo é dono do arquivo.
+        """
+        fd = self._open()
+        if fcntl is None:
+            return True
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False
+        return True
+
+    def release(self) -> None:
+        """Libera o lock e fecha o descritor do arquivo ``.lock``."""
+        if self._fd is not None:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
@@ -9,6 +9,10 @@ Nota de arquitetura — Preservação de Privacidade:
     Cada mensagem é autocontida para que os servidores das clínicas nunca
     precisem compartilhar dados brutos de pacientes entre si. O orquestrador
     encaminha requisições discretas e apenas agrega resultados anonimizados.
+
+Os modelos validam o envelope; para ler e gravar mensagens no caminho
+quente use ``parse_response``, ``request_to_dict`` e ``response_to_dict``,
+que não percorrem o conteúdo de ``params``/``result``.
 """
 
 from __future__ import annotations
@@ -52,3 +56,41 @@ class MCPResponse(BaseModel):
         default=None,
         description="Objeto de erro com código, mensagem e dados opcionais",
     )
+
+
+# ------------------------------------------------------------------
+# Codec enxuto do envelope
+# ------------------------------------------------------------------
+# ``model_dump`` percorre ``result`` inteiro (campo ``Any``) e a
+# serialização de resposta do FastAPI o percorre de novo; numa listagem
+# grande isso custa mais que o handler. As funções abaixo tratam só os
+# campos do envelope e passam ``params``/``result``/``error`` adiante como
+# vieram, sem copiar nem validar o conteúdo.
+
+class EnvelopeError(ValueError):
+    """Envelope JSON-RPC malformado."""
+
+
+def request_to_dict(request: MCPRequest) -> dict[str, Any]:
+    return {"jsonrpc": request.jsonrpc, "id": request.id,
+            "method": request.method, "params": request.params}
+
+
+def response_to_dict(response: MCPResponse) -> dict[str, Any]:
+    return {"jsonrpc": response.jsonrpc, "id": response.id,
+            "result": response.result, "error": response.error}
+
+
+def parse_response(obj: Any) -> MCPResponse:
+    """``MCPResponse`` de um dict decodificado, validando só o envelope."""
+    if not isinstance(obj, dict):
+        raise EnvelopeError(f"Resposta JSON-RPC deve ser um objeto, não {type(obj).__name__}")
+    jsonrpc = obj.get("jsonrpc", "2.0")
+    response_id = obj.get("id")
+    error = obj.get("error")
+    if not isinstance(jsonrpc, str) or not isinstance(response_id, str):
+        raise EnvelopeError("Resposta JSON-RPC sem 'jsonrpc'/'id' textuais")
+    if error is not None and not isinstance(error, dict):
+        raise EnvelopeError("'error' da resposta JSON-RPC deve ser um objeto")
+    return MCPResponse.model_construct(
+        jsonrpc=jsonrpc, id=response_id, result=obj.get("result"), error=error)
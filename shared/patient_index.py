@@ -0,0 +1,193 @@
+"""
+Índice invertido de pacientes
+=============================
+Busca em texto livre (ferramenta ``query``) sem varrer a clínica inteira:
+os valores de cada registro (nunca os nomes dos campos) são normalizados —
+minúsculas, sem acentos — e quebrados em termos, e cada termo aponta para
+os pacientes que o contêm.
+
+Uma busca casa por prefixo de termo ("hiper" acha "Hipertensão", "joao"
+acha "João"); com vários termos, o paciente precisa casar todos. O
+vocabulário fica ordenado, então cada termo da busca custa uma busca
+binária mais as listas de pacientes dos termos com aquele prefixo — o
+custo acompanha o número de resultados, não o tamanho da clínica.
+
+Atualização incremental: ``sync`` recebe a lista nova de registros e só
+reindexa os que mudaram; ``add`` e ``remove`` tratam um registro por vez.
+
+O índice não guarda registros: só os ``patient_id`` e, de cada um, o
+conjunto de termos indexados (para saber o que mudou). ``search`` devolve
+ids, e o registro completo vem do ``PatientStore`` (cache LRU) — indexar
+a clínica não a carrega inteira na memória.
+"""
+
+from __future__ import annotations
+
+import bisect
+import re
+import sys
+import threading
+import unicodedata
+from typing import Any, Iterable, Iterator, Optional
+
+Patient = dict[str, Any]
+
+_TOKEN = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Minúsculas e sem acentos: ``"João"`` → ``"joao"``."""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(fold(text))
+
+
+def _values(value: Any) -> Iterator[str]:
+    """Os valores de um registro, inclusive aninhados — sem as chaves."""
+    if isinstance(value, dict):
+        for v in value.values():
+            yield from _values(v)
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            yield from _values(v)
+    elif value is not None:
+        yield str(value)
+
+
+_NO_TERMS: frozenset[str] = frozenset()
+
+
+def _terms_of(record: Optional[Patient]) -> frozenset[str]:
+    if record is None:
+        return _NO_TERMS
+    # Internados: cada termo fica uma vez na memória, por mais pacientes que o tenham.
+    return frozenset(map(sys.intern, tokenize(" ".join(_values(record)))))
+
+
+class PatientIndex:
+    """Busca por termos nos pacientes de uma clínica; guarda só ids e termos."""
+
+    def __init__(self, records: Iterable[Patient] = ()) -> None:
+        self._lock = threading.Lock()
+        # patient_id → termos indexados, na ordem do arquivo.
+        self._indexed: dict[str, frozenset[str]] = {}
+        self._rank: dict[str, int] = {}
+        self._postings: dict[str, set[str]] = {}
+        # Vocabulário ordenado (busca por prefixo); None = reordenar na próxima busca.
+        self._terms: Optional[list[str]] = []
+        self._next_rank = 0
+        self.sync(records)
+
+    def __len__(self) -> int:
+        return len(self._indexed)
+
+    # ------------------------------------------------------------------
+    # Atualização
+    # ------------------------------------------------------------------
+
+    def sync(self, records: Iterable[Patient]) -> int:
+        """
+        Passa a refletir ``records`` (na ordem dada, lidos em sequência);
+        retorna quantos registros foram reindexados — os de termos iguais
+        aos atuais ficam como estão.
+        """
+        # Termos calculados fora do lock: só ids e termos ficam na memória.
+        fresh = {r["patient_id"]: _terms_of(r) for r in records}
+        with self._lock:
+            gone = [pid for pid in self._indexed if pid not in fresh]
+            changed = [pid for pid, terms in fresh.items() if self._indexed.get(pid) != terms]
+            if len(gone) + len(changed) > 64:
+                # Carga grande: ordena o vocabulário uma vez só, no fim.
+                self._terms = None
+            for pid in gone:
+                self._index(pid, _NO_TERMS)
+            for pid in changed:
+                self._index(pid, fresh[pid])
+            self._indexed = fresh
+            self._rank = {pid: i for i, pid in enumerate(fresh)}
+            self._next_rank = len(fresh)
+            return len(gone) + len(changed)
+
+    def add(self, record: Patient) -> None:
+        """Inclui ou substitui um registro (novos vão para o fim da ordem)."""
+        terms = _terms_of(record)
+        with self._lock:
+            pid = record["patient_id"]
+            self._index(pid, terms)
+            if pid not in self._rank:
+                self._rank[pid] = self._next_rank
+                self._next_rank += 1
+            self._indexed[pid] = terms
+
+    def remove(self, patient_id: str) -> bool:
+        with self._lock:
+            if patient_id not in self._indexed:
+                return False
+            self._index(patient_id, _NO_TERMS)
+            del self._indexed[patient_id]
+            del self._rank[patient_id]
+            return True
+
+    def _index(self, pid: str, new: frozenset[str]) -> None:
+        """Troca os termos indexados de ``pid`` por ``new``."""
+        old = self._indexed.get(pid, _NO_TERMS)
+        for term in old - new:
+            self._drop_posting(term, pid)
+        for term in new - old:
+            posting = self._postings.get(term)
+            if posting is None:
+                posting = self._postings[term] = set()
+                if self._terms is not None:
+                    bisect.insort(self._terms, term)
+            posting.add(pid)
+
+    def _drop_posting(self, term: str, pid: str) -> None:
+        posting = self._postings[term]
+        posting.discard(pid)
+        if not posting:
+            del self._postings[term]
+            if self._terms is not None:
+                del self._terms[bisect.bisect_left(self._terms, term)]
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def __contains__(self, patient_id: str) -> bool:
+        return patient_id in self._indexed
+
+    def search(self, query: str) -> list[str]:
+        """
+        ``patient_id`` dos pacientes que casam todos os termos de ``query``
+        por prefixo, na ordem do arquivo. Busca sem termos devolve todos.
+        """
+        tokens = set(tokenize(query))
+        with self._lock:
+            if not tokens:
+                return list(self._indexed)
+            if self._terms is None:
+                self._terms = sorted(self._postings)
+            # Listas de pacientes de cada termo da busca, do termo mais raro
+            # ao mais comum; os seguintes só filtram os candidatos.
+            groups = sorted((self._prefix(t) for t in tokens),
+                            key=lambda g: sum(map(len, g)))
+            matches: set[str] = set().union(*groups[0])
+            for group in groups[1:]:
+                if not matches:
+                    break
+                matches = set().union(*(matches & posting for posting in group))
+            return sorted(matches, key=self._rank.__getitem__)
+
+    def _prefix(self, token: str) -> list[set[str]]:
+        """Listas de pacientes dos termos que começam por ``token``."""
+        terms = self._terms
+        i = bisect.bisect_left(terms, token)
+        j = i
+        while j < len(terms) and terms[j].startswith(token):
+            j += 1
+        return [self._postings[t] for t in terms[i:j]]
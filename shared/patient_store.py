@@ -0,0 +1,226 @@
+"""
+Armazenamento de pacientes de uma clínica
+=========================================
+Os pacientes ficam em disco em NDJSON (um registro JSON por linha) e não
+são carregados na partida: o store mantém só o índice
+``patient_id → (offset, tamanho)`` da linha de cada registro e lê do
+disco, sob demanda, o registro pedido. Os registros mais usados ficam num
+cache LRU limitado (``CLINIC_PATIENT_CACHE``, padrão 1024).
+
+O índice de offsets é guardado ao lado do arquivo (``patients.ndjson.idx``)
+junto com (mtime, tamanho, inode) do NDJSON; ao reabrir uma clínica cujo
+arquivo não mudou, ele é lido pronto em vez de varrer o NDJSON — a partida
+não depende do número de pacientes, e ``get`` custa uma leitura de uma
+linha (ou nada, no cache).
+
+Edições no NDJSON são percebidas pelo (mtime, tamanho, inode): ``refresh``
+refaz o índice e esvazia o cache.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional
+
+Patient = dict[str, Any]
+_FileKey = tuple[int, int, int]
+
+PATIENT_CACHE_SIZE = int(os.getenv("CLINIC_PATIENT_CACHE", "1024"))
+
+
+def _file_key(path: Path) -> _FileKey:
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def write_ndjson(path: Path, records: Iterable[Patient]) -> None:
+    """Grava ``records`` em NDJSON (arquivo temporário + rename atômico)."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False))
+            f.write("\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class PatientStore:
+    """Pacientes de um arquivo NDJSON, por ``patient_id``, lidos sob demanda."""
+
+    def __init__(self, path: Path, cache_size: Optional[int] = None) -> None:
+        self.path = Path(path)
+        self.index_path = self.path.with_name(self.path.name + ".idx")
+        self._cache_size = PATIENT_CACHE_SIZE if cache_size is None else cache_size
+        self._lock = threading.Lock()
+        self._cache: OrderedDict[str, Patient] = OrderedDict()
+        self._offsets: dict[str, tuple[int, int]] = {}
+        self._key: Optional[_FileKey] = None
+        self.stats = {"hits": 0, "misses": 0, "scans": 0}
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __contains__(self, patient_id: str) -> bool:
+        return patient_id in self._offsets
+
+    @property
+    def key(self) -> Optional[_FileKey]:
+        """(mtime, tamanho, inode) do arquivo na última abertura do índice."""
+        return self._key
+
+    # ------------------------------------------------------------------
+    # Índice de offsets
+    # ------------------------------------------------------------------
+
+    def refresh(self) -> bool:
+        """Reabre o índice se o arquivo mudou; True se mudou."""
+        key = _file_key(self.path)
+        if key == self._key:
+            return False
+        with self._lock:
+            if key == self._key:
+                return False
+            offsets = self._load_index(key)
+            self._offsets = self._scan(key) if offsets is None else offsets
+            self._cache.clear()
+            self._key = key
+            return True
+
+    def _load_index(self, key: _FileKey) -> Optional[dict[str, tuple[int, int]]]:
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if tuple(saved.get("key", ())) != key:
+            return None
+        try:
+            return dict(zip(saved["ids"], zip(saved["offsets"], saved["sizes"])))
+        except (KeyError, TypeError):
+            return None
+
+    def _scan(self, key: _FileKey) -> dict[str, tuple[int, int]]:
+        """Varre o NDJSON uma vez e guarda o índice ao lado do arquivo."""
+        self.stats["scans"] += 1
+        offsets: dict[str, tuple[int, int]] = {}
+        pos = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    offsets[json.loads(line)["patient_id"]] = (pos, len(line))
+                pos += len(line)
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                # Em colunas: bem mais rápido de ler que um objeto por paciente.
+                json.dump({"key": key, "ids": list(offsets),
+                           "offsets": [off for off, _ in offsets.values()],
+                           "sizes": [size for _, size in offsets.values()]},
+                          f, ensure_ascii=False)
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            pass  # pasta só de leitura: reconstrói a cada partida
+        return offsets
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def get(self, patient_id: str) -> Optional[Patient]:
+        """O registro de ``patient_id`` (cache LRU, senão uma linha do disco)."""
+        self.refresh()
+        with self._lock:
+            record = self._cache.get(patient_id)
+            if record is not None:
+                self._cache.move_to_end(patient_id)
+                self.stats["hits"] += 1
+                return record
+            self.stats["misses"] += 1
+            location = self._offsets.get(patient_id)
+        if location is None:
+            return None
+
+        record = self._read(location)
+        if record is None or record.get("patient_id") != patient_id:
+            # O arquivo foi trocado entre o stat e a leitura: reabre e tenta de novo.
+            self.refresh()
+            location = self._offsets.get(patient_id)
+            record = self._read(location) if location else None
+            if record is None:
+                return None
+
+        with self._lock:
+            self._cache[patient_id] = record
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+        return record
+
+    def get_many(self, patient_ids: Iterable[str]) -> list[Patient]:
+        """
+        Os registros de ``patient_ids``, na ordem dada, sem os inexistentes:
+        como ``get``, mas as linhas fora do cache saem de uma única abertura
+        do arquivo, lidas em ordem de offset.
+        """
+        self.refresh()
+        ids = list(patient_ids)
+        found: dict[str, Patient] = {}
+        missing: list[tuple[tuple[int, int], str]] = []
+        with self._lock:
+            for pid in ids:
+                record = self._cache.get(pid)
+                if record is not None:
+                    self._cache.move_to_end(pid)
+                    self.stats["hits"] += 1
+                    found[pid] = record
+                    continue
+                self.stats["misses"] += 1
+                location = self._offsets.get(pid)
+                if location is not None:
+                    missing.append((location, pid))
+        if missing:
+            read: dict[str, Patient] = {}
+            with open(self.path, "rb") as f:
+                for (offset, size), pid in sorted(missing):
+                    f.seek(offset)
+                    try:
+                        record = json.loads(f.read(size))
+                    except ValueError:
+                        record = None
+                    if record is not None and record.get("patient_id") == pid:
+                        read[pid] = record
+            with self._lock:
+                for pid, record in read.items():
+                    self._cache[pid] = record
+                while len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+            found.update(read)
+            for _, pid in missing:
+                if pid not in found:
+                    # O arquivo foi trocado entre o stat e a leitura: caminho de ``get``.
+                    record = self.get(pid)
+                    if record is not None:
+                        found[pid] = record
+        return [found[pid] for pid in ids if pid in found]
+
+    def _read(self, location: tuple[int, int]) -> Optional[Patient]:
+        offset, size = location
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            line = f.read(size)
+        try:
+            return json.loads(line)
+        except ValueError:
+            return None
+
+    def records(self) -> Iterator[Patient]:
+        """Todos os registros, na ordem do arquivo (lidos em sequência, sem cache)."""
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
@@ -0,0 +1,122 @@
+"""
+Arquivo mensal de horários passados
+===================================
+Horários de meses já encerrados saem do armazenamento quente (``db.json``,
+``db.sqlite`` ou a tabela em memória) e vão para partições mensais
+compactadas ao lado do banco da clínica:
+
+    clinic_x/db.archive/2025-07.json.gz   {"month": "2025-07", "slots": [...]}
+
+O caminho quente (listar, agendar, cancelar) nunca lê o arquivo, então o
+tamanho do que é carregado e percorrido passa a ser limitado pelo
+horizonte de agendamento e não pela idade da clínica. O histórico é
+consultado explicitamente, partição por partição, pela ferramenta
+``list_appointment_history``.
+
+Cada partição é regravada por inteiro (arquivo temporário + fsync +
+rename atômico) e mesclada pela chave (data, hora, lower(médico)), então
+arquivar de novo o mesmo horário — por exemplo, depois de uma queda entre
+a gravação do arquivo e a remoção do armazenamento quente — é inofensivo.
+"""
+
+from __future__ import annotations
+
+import gzip
+import json
+import os
+import threading
+from datetime import date as _date
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+Slot = dict[str, Any]
+
+
+def month_of(date: str) -> str:
+    """Partição ("AAAA-MM") de uma data AAAA-MM-DD."""
+    return date[:7]
+
+
+def archive_cutoff(today: _date, keep_months: int) -> str:
+    """
+    Primeiro dia do mês mais antigo mantido no armazenamento quente.
+
+    ``keep_months`` = 1 mantém apenas o mês corrente; 2 mantém também o
+    anterior, e assim por diante.
+    """
+    index = today.year * 12 + today.month - 1 - (keep_months - 1)
+    return f"{index // 12:04d}-{index % 12 + 1:02d}-01"
+
+
+class SlotArchive:
+    """Partições mensais compactadas de uma clínica (``db.archive/``)."""
+
+    def __init__(self, db_path: Path) -> None:
+        self.path = db_path.with_suffix(".archive")
+        self._lock = threading.Lock()
+
+    def _partition(self, month: str) -> Path:
+        return self.path / f"{month}.json.gz"
+
+    def months(self) -> list[str]:
+        """Meses arquivados, em ordem crescente."""
+        if not self.path.is_dir():
+            return []
+        return sorted(p.name[:7] for p in self.path.glob("????-??.json.gz"))
+
+    def _read(self, month: str) -> list[Slot]:
+        try:
+            with gzip.open(self._partition(month), "rt", encoding="utf-8") as f:
+                return json.load(f)["slots"]
+        except FileNotFoundError:
+            return []
+
+    def _write(self, month: str, slots: list[Slot]) -> None:
+        target = self._partition(month)
+        tmp_path = target.with_name(target.name + ".tmp")
+        with open(tmp_path, "wb") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as gz:
+                gz.write(json.dumps({"month": month, "slots": slots},
+                                    ensure_ascii=False).encode("utf-8"))
+            raw.flush()
+            os.fsync(raw.fileno())
+        os.replace(tmp_path, target)
+
+    def write(self, slots: Iterable[Slot]) -> int:
+        """
+        Acrescenta ``slots`` às partições dos seus meses.
+
+        Um horário já arquivado com a mesma chave é substituído. Retorna
+        quantos horários foram gravados.
+        """
+        by_month: dict[str, list[Slot]] = {}
+        for s in slots:
+            by_month.setdefault(month_of(s["date"]), []).append(s)
+        if not by_month:
+            return 0
+        with self._lock:
+            self.path.mkdir(exist_ok=True)
+            for month, new in by_month.items():
+                merged = {_key(s): s for s in self._read(month)}
+                merged.update((_key(s), s) for s in new)
+                self._write(month, sorted(merged.values(), key=_key))
+        return sum(len(v) for v in by_month.values())
+
+    def read(self, date_from: str = "", date_to: str = "") -> Iterator[Slot]:
+        """
+        Horários arquivados na faixa de datas, em ordem de (data, hora, médico).
+
+        Só as partições dos meses da faixa são abertas.
+        """
+        for month in self.months():
+            if (date_from and month < month_of(date_from)) or (
+                    date_to and month > month_of(date_to)):
+                continue
+            for s in self._read(month):
+                if (not date_from or s["date"] >= date_from) and (
+                        not date_to or s["date"] <= date_to):
+                    yield s
+
+
+def _key(slot: Slot) -> tuple[str, str, str]:
+    return (slot["date"], slot["time"], slot["doctor"].lower())
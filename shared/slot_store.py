@@ -0,0 +1,1476 @@
+"""
+Backends de armazenamento de horários de consulta
+==================================================
+Define a interface ``SlotStore`` usada pelos handlers de ``shared/db.py``
+e suas implementações:
+
+    JsonSlotStore        — formato original: um ``db.json`` lido e
+                           regravado por inteiro a cada operação.
+    MemorySlotStore      — tabela em memória carregada uma vez, com índice
+                           hash e persistência assíncrona (write-back).
+    GroupCommitSlotStore — mesma tabela em memória; escritas concorrentes
+                           são confirmadas juntas por um snapshot durável.
+    JournalSlotStore     — mesma tabela em memória, persistida por um
+                           journal append-only compactado periodicamente.
+    SqliteSlotStore      — banco SQLite ao lado do ``db.json``
+                           (``db.sqlite``), com índice único em (médico,
+                           data, hora), UPDATEs de linha única dentro de
+                           transações e modo WAL.
+
+Os handlers não conhecem o backend — recebem apenas dicts de horário com
+as mesmas chaves do ``db.json`` original.
+
+Todos os backends aceitam modelos de agenda recorrentes (chave
+``templates`` do ``db.json``, ver ``shared/slot_templates.py``): os
+horários livres gerados por modelos são produzidos só para a janela
+consultada e entram no armazenamento apenas quando são ocupados.
+
+``archive_before`` tira do armazenamento os horários de meses encerrados
+(ver ``shared/slot_archive.py``); a tabela em memória, o ``db.json`` e o
+``db.sqlite`` ficam limitados ao horizonte de agendamento.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+from itertools import islice
+from pathlib import Path
+from time import monotonic
+from types import MappingProxyType
+from typing import Any, Callable, Iterable, Mapping, Optional
+
+from shared.locks import FileLock
+from shared.slot_table import SlotTable, cpf_hash, day_minutes
+from shared.slot_templates import TemplateSet
+
+logger = logging.getLogger(__name__)
+
+Slot = dict[str, Any]
+SlotView = Mapping[str, Any]
+# Pedido de ``book_many``: doctor, date, time, patient_name, cpf e,
+# opcionalmente, expected_version.
+Booking = Mapping[str, Any]
+# Resultado por pedido de ``book_many``: (status, horário).
+BulkResult = tuple[str, Optional[Slot]]
+
+
+# ------------------------------------------------------------------
+# Helpers de baixo nível (formato db.json)
+# ------------------------------------------------------------------
+
+# Cache de parse do db.json por caminho, validado por (st_mtime_ns,
+# st_size, st_ino). O conteúdo em cache é compartilhado e nunca é
+# alterado: leitores recebem visões somente-leitura e escritores fazem
+# cópia na escrita (copy-on-write) trocando apenas o dict do horário
+# alterado.
+_ParseKey = tuple[int, int, int]
+_parse_cache: dict[Path, tuple[_ParseKey, "_Parsed"]] = {}
+_parse_cache_lock = threading.Lock()
+_parse_cache_counters = {"hits": 0, "misses": 0}
+
+
+class _Parsed:
+    """Horários e modelos de um ``db.json``, indexados por chave de ordenação e por CPF."""
+
+    def __init__(self, slots: list[Slot], templates: TemplateSet) -> None:
+        self.slots = slots
+        self.views = tuple(MappingProxyType(s) for s in slots)
+        self.templates = templates
+        self.index: dict[SortKey, int] = {}
+        self.by_cpf: dict[str, list[int]] = {}
+        for i, slot in enumerate(slots):
+            self.index.setdefault(sort_key(slot), i)
+            if not slot["available"] and slot.get("cpf"):
+                self.by_cpf.setdefault(cpf_hash(slot["cpf"]), []).append(i)
+
+
+def _parse_key(db_path: Path) -> _ParseKey:
+    st = os.stat(db_path)
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def _cache_put(db_path: Path, key: _ParseKey, parsed: _Parsed) -> _Parsed:
+    with _parse_cache_lock:
+        _parse_cache[db_path] = (key, parsed)
+    return parsed
+
+
+def _parse_db(db_path: Path) -> tuple[list[Slot], TemplateSet]:
+    """Parse direto do ``db.json``, sem cache (o chamador fica com a lista)."""
+    with open(db_path, encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("slots", []), TemplateSet(data.get("templates"))
+
+
+def _document(slots: list[Slot], templates: TemplateSet) -> dict[str, Any]:
+    """Conteúdo do ``db.json``; a chave ``templates`` só aparece se houver modelos."""
+    doc: dict[str, Any] = {"templates": templates.to_list()} if templates else {}
+    doc["slots"] = slots
+    return doc
+
+
+def _load_cached(db_path: Path) -> _Parsed:
+    key = _parse_key(db_path)
+    entry = _parse_cache.get(db_path)
+    hit = entry is not None and entry[0] == key
+    with _parse_cache_lock:
+        _parse_cache_counters["hits" if hit else "misses"] += 1
+    if hit:
+        return entry[1]
+    return _cache_put(db_path, key, _Parsed(*_parse_db(db_path)))
+
+
+def _save_slots(db_path: Path, slots: list[Slot], templates: TemplateSet) -> None:
+    with open(db_path, "w", encoding="utf-8") as f:
+        json.dump(_document(slots, templates), f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    # O que acabou de ser gravado já é o conteúdo parseado do arquivo.
+    _cache_put(db_path, _parse_key(db_path), _Parsed(slots, templates))
+
+
+def _with_templates(
+    stored: Iterable[SlotView],
+    generated: Iterable[SlotView],
+    exists: Callable[[SlotView], bool],
+    limit: Optional[int],
+) -> list[SlotView]:
+    """
+    Intercala os horários livres gravados com os gerados por modelos.
+
+    Ambas as sequências vêm em ordem de ``sort_key``; horários gerados que
+    já estão gravados (ocupados, bloqueados ou livres) são descartados.
+    """
+    virtual = (v for v in generated if not exists(v))
+    return list(islice(heapq.merge(stored, virtual, key=sort_key), limit))
+
+
+def parse_cache_stats() -> dict[str, int]:
+    """Contadores de acertos/faltas do cache de parse do ``db.json``."""
+    with _parse_cache_lock:
+        return dict(_parse_cache_counters)
+
+
+# Ordem das listagens: (data, hora, lower(médico)). Também é a chave do
+# cursor de paginação devolvido em ``after``.
+SortKey = tuple[str, str, str]
+
+
+def sort_key(slot: SlotView) -> SortKey:
+    return (slot["date"], slot["time"], slot["doctor"].lower())
+
+
+def _in_window(slot: SlotView, doctor_key: str, time_from: str, time_to: str) -> bool:
+    """Filtros que não fazem parte da ordenação: médico e faixa de horário."""
+    return ((not doctor_key or doctor_key in slot["doctor"].lower())
+            and (not time_from or slot["time"] >= time_from)
+            and (not time_to or slot["time"] <= time_to))
+
+
+class VersionConflict(Exception):
+    """
+    O horário mudou desde que o chamador o leu.
+
+    Levantada quando ``expected_version`` não confere com a versão atual;
+    ``slot`` traz o estado atual do horário para o chamador replanejar sem
+    listar a clínica inteira de novo.
+    """
+
+    def __init__(self, slot: SlotView, expected_version: int) -> None:
+        self.slot: Slot = dict(slot)
+        self.expected_version = expected_version
+        super().__init__(
+            f"Horário alterado: {slot['doctor']} em {slot['date']} às "
+            f"{slot['time']} (versão {slot['version']}, esperada {expected_version})"
+        )
+
+
+class PersistenceError(RuntimeError):
+    """
+    A mutação não pôde ser gravada em disco e foi desfeita na memória.
+
+    O backend continua utilizável: nada do que foi recusado aparece nas
+    leituras nem em snapshots futuros.
+    """
+
+
+def _check_version(slot: SlotView, expected_version: Optional[int]) -> None:
+    if expected_version is not None and slot.get("version", 0) != expected_version:
+        raise VersionConflict(dict(slot, version=slot.get("version", 0)), expected_version)
+
+
+def _plan_bulk(
+    bookings: list[Booking],
+    lookup: Callable[[Booking], tuple[Any, Optional[SlotView]]],
+) -> tuple[list[str], list[Any], list[Optional[SlotView]]]:
+    """
+    Valida os pedidos de ``book_many`` sem alterar nada.
+
+    ``lookup`` retorna (referência do backend, horário atual) ou
+    (None, None). Retorna o status de cada pedido ("ok", "not_found",
+    "conflict", "unavailable" ou "duplicate"), as referências e os horários.
+    """
+    statuses: list[str] = []
+    handles: list[Any] = []
+    views: list[Optional[SlotView]] = []
+    seen: set[SortKey] = set()
+    for b in bookings:
+        handle, slot = lookup(b)
+        expected = b.get("expected_version")
+        if slot is None:
+            status = "not_found"
+        elif expected is not None and slot.get("version", 0) != expected:
+            status = "conflict"
+        elif not slot["available"]:
+            status = "unavailable"
+        elif sort_key(slot) in seen:
+            status = "duplicate"
+        else:
+            status = "ok"
+            seen.add(sort_key(slot))
+        statuses.append(status)
+        handles.append(handle)
+        views.append(slot)
+    return statuses, handles, views
+
+
+def _bulk_rejected(statuses: list[str], views: list[Optional[SlotView]]) -> list[BulkResult]:
+    """Resultados de um lote recusado: nada foi aplicado."""
+    return [
+        ("not_applied", None) if st == "ok"
+        else (st, dict(v) if st == "conflict" and v is not None else None)
+        for st, v in zip(statuses, views)
+    ]
+
+
+# ------------------------------------------------------------------
+# Interface
+# ------------------------------------------------------------------
+
+class SlotStore:
+    """
+    Interface comum dos backends de horários.
+
+    Todas as operações de escrita são atômicas: ou aplicam a mudança
+    inteira ou não alteram nada e retornam ``None``.
+
+    Cada horário carrega uma ``version`` incrementada a cada mutação. As
+    escritas aceitam ``expected_version`` (lida em ``list_available``) e
+    funcionam como compare-and-swap: se o horário mudou desde então,
+    levantam ``VersionConflict`` em vez de aplicar a mudança.
+
+    ``shared_across_processes`` indica que outros processos podem gravar no
+    mesmo banco ao mesmo tempo (``json``/``sqlite``): estado mantido só na
+    memória deste processo — as reservas de ``shared/holds.py`` — não vale
+    para as gravações deles.
+    """
+
+    shared_across_processes = False
+
+    def list_available(
+        self,
+        doctor: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        time_from: str = "",
+        time_to: str = "",
+        limit: Optional[int] = None,
+        after: Optional[SortKey] = None,
+    ) -> list[SlotView]:
+        """
+        Retorna os horários livres em ordem de (data, hora, médico).
+
+        Args:
+            doctor:            Filtro por trecho do nome do médico.
+            date_from/date_to: Faixa de datas inclusiva (AAAA-MM-DD).
+            time_from/time_to: Faixa de horário do dia inclusiva (HH:MM).
+            limit:             Máximo de horários retornados.
+            after:             Chave de ordenação do último horário já
+                               entregue (paginação por cursor).
+        """
+        raise NotImplementedError
+
+    def book(self, doctor: str, date: str, time: str, patient_name: str,
+             cpf: str, expected_version: Optional[int] = None) -> Optional[Slot]:
+        """Ocupa um horário livre; retorna o horário atualizado ou None."""
+        raise NotImplementedError
+
+    def cancel(self, doctor: str, date: str, time: str,
+               expected_version: Optional[int] = None) -> Optional[Slot]:
+        """Libera um horário ocupado; retorna o horário antes da liberação ou None."""
+        raise NotImplementedError
+
+    def reschedule(
+        self, doctor: str, original_date: str, original_time: str,
+        new_date: str, new_time: str, patient_name: str, cpf: str,
+        expected_version: Optional[int] = None,
+    ) -> tuple[Optional[Slot], Optional[Slot]]:
+        """
+        Move uma consulta para outro horário do mesmo médico.
+
+        Retorna (original, novo). A mudança só é aplicada quando ambos são
+        encontrados; caso contrário o item ausente vem como None.
+        ``expected_version`` se refere ao novo horário.
+        """
+        raise NotImplementedError
+
+    def list_booked(self, cpf: str) -> list[Slot]:
+        """Horários ocupados pelo paciente ``cpf``, em ordem de (data, hora, médico)."""
+        raise NotImplementedError
+
+    def archive_before(self, date: str, sink: Callable[[list[Slot]], Any]) -> int:
+        """
+        Remove os horários com data anterior a ``date`` (AAAA-MM-DD).
+
+        Os horários são entregues a ``sink`` (que os grava no arquivo)
+        antes da remoção; se ``sink`` falhar nada é removido. Retorna
+        quantos horários saíram do armazenamento.
+        """
+        raise NotImplementedError
+
+    def book_many(self, bookings: list[Booking]) -> list[BulkResult]:
+        """
+        Agenda vários horários de uma vez: tudo ou nada, com uma única escrita.
+
+        Retorna (status, horário) por pedido, na ordem recebida. Se todos
+        puderem ser agendados o status é "confirmed" com o horário
+        atualizado; caso contrário nada é aplicado e cada pedido traz o
+        motivo ("not_found", "unavailable", "conflict", "duplicate") ou
+        "not_applied" quando ele sozinho seria aceito. Em "conflict" o
+        horário atual acompanha o status.
+        """
+        raise NotImplementedError
+
+    def data_version(self) -> Any:
+        """
+        Valor que muda sempre que os horários gravados mudam, inclusive por
+        outro processo: enquanto for o mesmo, as leituras dão o mesmo
+        resultado (tags de versão das ferramentas de leitura em ``shared/db.py``).
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        """Libera recursos do backend (conexões, arquivos)."""
+
+
+# ------------------------------------------------------------------
+# Backend JSON (comportamento original)
+# ------------------------------------------------------------------
+
+class JsonSlotStore(SlotStore):
+    """
+    Lê e regrava o ``db.json`` inteiro a cada operação.
+
+    O read-modify-write é protegido por um lock de arquivo (``db.lock``),
+    então vários processos (ex.: workers do uvicorn) podem compartilhar o
+    mesmo ``db.json`` sem agendar o mesmo horário duas vezes. Enquanto o
+    arquivo não muda, as leituras reutilizam o parse em cache.
+    """
+
+    shared_across_processes = True
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = db_path
+        self._file_lock = FileLock(db_path.with_suffix(".lock"))
+
+    def list_available(
+        self,
+        doctor: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        time_from: str = "",
+        time_to: str = "",
+        limit: Optional[int] = None,
+        after: Optional[SortKey] = None,
+    ) -> list[SlotView]:
+        with self._file_lock.shared():
+            parsed = _load_cached(self.db_path)
+        dl = doctor.lower()
+        available = sorted(
+            (s for s in parsed.views
+             if s["available"]
+             and (not date_from or s["date"] >= date_from)
+             and (not date_to or s["date"] <= date_to)
+             and _in_window(s, dl, time_from, time_to)
+             and (after is None or sort_key(s) > after)),
+            key=sort_key,
+        )
+        if parsed.templates:
+            generated = parsed.templates.expand(
+                doctor, date_from, date_to, time_from, time_to, after)
+            return _with_templates(available, generated,
+                                   lambda v: sort_key(v) in parsed.index, limit)
+        return available[:limit] if limit is not None else available
+
+    def list_booked(self, cpf: str) -> list[Slot]:
+        with self._file_lock.shared():
+            parsed = _load_cached(self.db_path)
+        return sorted((dict(parsed.slots[i]) for i in parsed.by_cpf.get(cpf_hash(cpf), ())),
+                      key=sort_key)
+
+    def data_version(self) -> Any:
+        # Toda escrita regrava o db.json: (mtime, tamanho, inode) identifica o conteúdo.
+        return _parse_key(self.db_path)
+
+    @staticmethod
+    def _find(parsed: _Parsed, slots: list[Slot], doctor: str, date: str, time: str,
+              available: bool, expected_version: Optional[int] = None) -> Optional[int]:
+        """
+        Posição do horário em ``slots`` (cópia de ``parsed.slots``).
+
+        Um horário livre gerado por modelo é acrescentado a ``slots`` para
+        poder ser ocupado.
+        """
+        i = parsed.index.get((date, time, doctor.lower()))
+        slot = slots[i] if i is not None else parsed.templates.find(doctor, date, time)
+        if slot is None:
+            return None
+        _check_version(slot, expected_version)
+        if slot["available"] != available:
+            return None
+        if i is None:
+            slots.append(slot)
+            i = len(slots) - 1
+        return i
+
+    @staticmethod
+    def _assign(slot: SlotView, patient_name: Optional[str], cpf: Optional[str]) -> Slot:
+        """Nova versão do horário, ocupado (``patient_name``) ou livre (None)."""
+        return {**slot, "available": patient_name is None,
+                "patient_name": patient_name, "cpf": cpf,
+                "version": slot.get("version", 0) + 1}
+
+    def book(self, doctor: str, date: str, time: str, patient_name: str,
+             cpf: str, expected_version: Optional[int] = None) -> Optional[Slot]:
+        with self._file_lock.exclusive():
+            parsed = _load_cached(self.db_path)
+            slots = list(parsed.slots)
+            i = self._find(parsed, slots, doctor, date, time, True, expected_version)
+            if i is None:
+                return None
+            slots[i] = self._assign(slots[i], patient_name, cpf)
+            _save_slots(self.db_path, slots, parsed.templates)
+            return dict(slots[i])
+
+    def cancel(self, doctor: str, date: str, time: str,
+               expected_version: Optional[int] = None) -> Optional[Slot]:
+        with self._file_lock.exclusive():
+            parsed = _load_cached(self.db_path)
+            slots = list(parsed.slots)
+            i = self._find(parsed, slots, doctor, date, time, False, expected_version)
+            if i is None:
+                return None
+            before = dict(slots[i])
+            slots[i] = self._assign(before, None, None)
+            _save_slots(self.db_path, slots, parsed.templates)
+            return before
+
+    def reschedule(
+        self, doctor: str, original_date: str, original_time: str,
+        new_date: str, new_time: str, patient_name: str, cpf: str,
+        expected_version: Optional[int] = None,
+    ) -> tuple[Optional[Slot], Optional[Slot]]:
+        with self._file_lock.exclusive():
+            parsed = _load_cached(self.db_path)
+            slots = list(parsed.slots)
+            i = self._find(parsed, slots, doctor, original_date, original_time, False)
+            j = self._find(parsed, slots, doctor, new_date, new_time, True, expected_version)
+            if i is None or j is None:
+                return (dict(slots[i]) if i is not None else None,
+                        dict(slots[j]) if j is not None else None)
+
+            before = dict(slots[i])
+            slots[i] = self._assign(before, None, None)
+            slots[j] = self._assign(slots[j], patient_name, cpf)
+            _save_slots(self.db_path, slots, parsed.templates)
+            return before, dict(slots[j])
+
+    def book_many(self, bookings: list[Booking]) -> list[BulkResult]:
+        with self._file_lock.exclusive():
+            parsed = _load_cached(self.db_path)
+            slots = list(parsed.slots)
+
+            def lookup(b: Booking) -> tuple[Optional[int], Optional[SlotView]]:
+                i = parsed.index.get((b["date"], b["time"], b["doctor"].lower()))
+                if i is None:
+                    return None, parsed.templates.find(b["doctor"], b["date"], b["time"])
+                return i, slots[i]
+
+            statuses, rows, views = _plan_bulk(bookings, lookup)
+            if any(st != "ok" for st in statuses):
+                return _bulk_rejected(statuses, views)
+            booked: list[Slot] = []
+            for i, b, view in zip(rows, bookings, views):
+                if i is None:  # gerado por modelo: passa a ser gravado
+                    slots.append(view)
+                    i = len(slots) - 1
+                slots[i] = self._assign(slots[i], b["patient_name"], b["cpf"])
+                booked.append(slots[i])
+            _save_slots(self.db_path, slots, parsed.templates)
+            return [("confirmed", dict(slot)) for slot in booked]
+
+    def archive_before(self, date: str, sink: Callable[[list[Slot]], Any]) -> int:
+        with self._file_lock.exclusive():
+            parsed = _load_cached(self.db_path)
+            old = [dict(s) for s in parsed.slots if s["date"] < date]
+            if not old:
+                return 0
+            sink(old)
+            _save_slots(self.db_path, [s for s in parsed.slots if s["date"] >= date],
+                        parsed.templates)
+            return len(old)
+
+    def close(self) -> None:
+        self._file_lock.release()
+
+
+# ------------------------------------------------------------------
+# Backend em memória com write-back
+# ------------------------------------------------------------------
+
+def _write_snapshot(db_path: Path, slots: list[Slot], templates: TemplateSet) -> None:
+    """Grava o snapshot em arquivo temporário e o renomeia atomicamente."""
+    tmp_path = db_path.with_name(db_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(_document(slots, templates), f, ensure_ascii=False, indent=2)
+        f.write("\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, db_path)
+
+
+class MemorySlotStore(SlotStore):
+    """
+    Tabela de horários carregada uma única vez do ``db.json``.
+
+    A memória é a fonte da verdade: leituras nunca tocam o disco e as
+    buscas de book/cancel/reschedule usam o índice hash de ``SlotTable``
+    (representação colunar compacta, ver ``shared/slot_table.py``) em
+    (lower(médico), data, hora). Escritas marcam a tabela como suja e uma
+    thread de write-back grava o snapshot a cada ``flush_interval``
+    segundos; ``close()`` sempre faz o flush final.
+
+    Concorrência: a busca no índice não usa lock; a mutação é um
+    compare-and-swap sob o lock da tabela (confere disponibilidade e
+    ``version`` e aplica), então o lock fica retido só pelo CAS e pelo
+    registro da mudança. Como a tabela vive na
+    memória deste processo, o arquivo ``db.lock`` é mantido em modo
+    exclusivo enquanto o backend estiver aberto: um segundo processo sobre
+    o mesmo ``db.json`` falha na abertura em vez de divergir silenciosamente.
+    Para vários workers use os backends ``json`` ou ``sqlite``.
+    """
+
+    _interval_env = ("CLINIC_DB_FLUSH_INTERVAL", "1.0")
+
+    def __init__(self, db_path: Path, flush_interval: Optional[float] = None) -> None:
+        self.db_path = db_path
+        env_name, env_default = self._interval_env
+        self.flush_interval = (
+            flush_interval if flush_interval is not None
+            else float(os.getenv(env_name, env_default))
+        )
+        self._owner = FileLock(db_path.with_suffix(".lock"))
+        if not self._owner.try_own():
+            self._owner.release()
+            raise RuntimeError(
+                f"{db_path} já está aberto por outro processo. Backends em "
+                "memória exigem um único processo por clínica; use "
+                "CLINIC_DB_BACKEND=json ou sqlite com múltiplos workers."
+            )
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        slots, self._templates = _parse_db(db_path)
+        self._table = SlotTable.from_slots(slots)
+        self._dirty = False
+        self._mutations = 0
+        self._open()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name=f"slot-flush:{db_path.parent.name}",
+            daemon=True,
+        )
+        self._flusher.start()
+
+    # -- persistência -------------------------------------------------
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                # Disco cheio, permissão, rename... a tabela continua suja e
+                # a próxima volta tenta de novo; a thread não pode morrer.
+                logger.exception("Falha ao gravar o snapshot de %s", self.db_path)
+
+    def _open(self) -> None:
+        """Prepara a persistência antes da thread de flush iniciar."""
+
+    def _commit(self, op: str, changes: list[dict[str, Any]]) -> Any:
+        """
+        Registra uma mutação já aplicada em memória (chamado sob ``_lock``).
+
+        O valor retornado é repassado a ``_await`` depois que o lock é
+        liberado.
+        """
+        self._dirty = True
+
+    def _record(self, op: str, changes: list[dict[str, Any]]) -> Any:
+        """Conta a mutação (``data_version``) e a repassa a ``_commit`` (sob ``_lock``)."""
+        self._mutations += 1
+        return self._commit(op, changes)
+
+    def _undo(self, changes: list[dict[str, Any]]) -> None:
+        """Restaura (sob ``_lock``) os estados ``before`` de ``changes``, do fim ao início."""
+        for change in reversed(changes):
+            row = self._table.find(*change["key"])
+            if row is not None:
+                self._table.set(row, **change["before"])
+        self._mutations += 1
+
+    def _await(self, ticket: Any) -> None:
+        """Bloqueia até a mutação identificada por ``ticket`` ser durável."""
+
+    def flush(self) -> None:
+        """Grava o snapshot se houver mudanças pendentes."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = self._table.to_slots()
+                self._dirty = False
+            try:
+                _write_snapshot(self.db_path, snapshot, self._templates)
+            except BaseException:
+                with self._lock:
+                    self._dirty = True
+                raise
+
+    def close(self) -> None:
+        self._closed.set()
+        self._flusher.join()
+        self.flush()
+        self._release()
+
+    def _release(self) -> None:
+        """Fecha os arquivos de persistência e libera a posse do ``db.json``."""
+        self._owner.release()
+
+    # -- operações ----------------------------------------------------
+
+    def _assign(self, row: int, patient_name: Optional[str],
+                cpf: Optional[str]) -> dict[str, Any]:
+        """
+        Ocupa o horário (``patient_name`` preenchido) ou o libera (None)
+        e retorna a mudança com os estados antes/depois.
+        """
+        s = self._table.row(row)
+        before = {"available": s["available"], "patient_name": s["patient_name"],
+                  "cpf": s["cpf"], "version": s["version"]}
+        after = {"available": patient_name is None, "patient_name": patient_name,
+                 "cpf": cpf, "version": s["version"] + 1}
+        self._table.set(row, **after)
+        return {"key": [s["doctor"], s["date"], s["time"]],
+                "before": before, "after": after}
+
+    def _cas(self, row: Optional[int], available: bool,
+             expected_version: Optional[int]) -> bool:
+        """
+        Confere (sob ``_lock``) se a linha pode ser alterada.
+
+        Levanta ``VersionConflict`` se a versão não confere com
+        ``expected_version``; retorna False se a disponibilidade não é a
+        esperada.
+        """
+        if row is None or not self._table.is_live(row):
+            return False
+        if expected_version is not None and self._table.version[row] != expected_version:
+            raise VersionConflict(self._table.row(row), expected_version)
+        return bool(self._table.available[row]) == available
+
+    def _materialize(self, doctor: str, date: str, time: str,
+                     expected_version: Optional[int] = None) -> Optional[int]:
+        """
+        Grava na tabela (sob ``_lock``) o horário livre gerado por modelo.
+
+        O conflito de versão é verificado antes, para que um pedido
+        recusado não deixe o horário gravado.
+        """
+        row = self._table.find(doctor, date, time)
+        if row is not None:
+            return row
+        slot = self._templates.find(doctor, date, time)
+        if slot is None:
+            return None
+        _check_version(slot, expected_version)
+        return self._table.insert(slot)
+
+    def list_available(
+        self,
+        doctor: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        time_from: str = "",
+        time_to: str = "",
+        limit: Optional[int] = None,
+        after: Optional[SortKey] = None,
+    ) -> list[SlotView]:
+        table = self._table
+        with self._lock:
+            rows = table.scan(doctor, date_from, date_to, time_from, time_to, after)
+            stored = map(table.row, rows)
+            if not self._templates:
+                return list(islice(stored, limit))
+            generated = self._templates.expand(
+                doctor, date_from, date_to, time_from, time_to, after)
+            return _with_templates(
+                stored, generated,
+                lambda v: table.find(v["doctor"], v["date"], v["time"]) is not None,
+                limit,
+            )
+
+    def list_booked(self, cpf: str) -> list[Slot]:
+        with self._lock:
+            return [self._table.row(r) for r in self._table.rows_for_cpf(cpf)]
+
+    def data_version(self) -> Any:
+        # A tabela só muda neste processo (db.lock exclusivo).
+        return self._mutations
+
+    def book(self, doctor: str, date: str, time: str, patient_name: str,
+             cpf: str, expected_version: Optional[int] = None) -> Optional[Slot]:
+        row = self._table.find(doctor, date, time)
+        with self._lock:
+            if row is None:
+                row = self._materialize(doctor, date, time, expected_version)
+            if not self._cas(row, True, expected_version):
+                return None
+            ticket = self._record("book", [self._assign(row, patient_name, cpf)])
+            booked = self._table.row(row)
+        self._await(ticket)
+        return booked
+
+    def cancel(self, doctor: str, date: str, time: str,
+               expected_version: Optional[int] = None) -> Optional[Slot]:
+        row = self._table.find(doctor, date, time)
+        with self._lock:
+            if not self._cas(row, False, expected_version):
+                return None
+            before = self._table.row(row)
+            ticket = self._record("cancel", [self._assign(row, None, None)])
+        self._await(ticket)
+        return before
+
+    def reschedule(
+        self, doctor: str, original_date: str, original_time: str,
+        new_date: str, new_time: str, patient_name: str, cpf: str,
+        expected_version: Optional[int] = None,
+    ) -> tuple[Optional[Slot], Optional[Slot]]:
+        orig = self._table.find(doctor, original_date, original_time)
+        new = self._table.find(doctor, new_date, new_time)
+        with self._lock:
+            if new is None and orig is not None and not self._table.available[orig]:
+                new = self._materialize(doctor, new_date, new_time, expected_version)
+            orig_ok = self._cas(orig, False, None)
+            new_ok = self._cas(new, True, expected_version)
+            if not orig_ok or not new_ok:
+                return (self._table.row(orig) if orig_ok else None,
+                        self._table.row(new) if new_ok else None)
+            before = self._table.row(orig)
+            ticket = self._record("reschedule", [
+                self._assign(orig, None, None),
+                self._assign(new, patient_name, cpf),
+            ])
+            after = self._table.row(new)
+        self._await(ticket)
+        return before, after
+
+    def book_many(self, bookings: list[Booking]) -> list[BulkResult]:
+        def lookup(b: Booking) -> tuple[Optional[int], Optional[SlotView]]:
+            row = self._table.find(b["doctor"], b["date"], b["time"])
+            if row is None:
+                return None, self._templates.find(b["doctor"], b["date"], b["time"])
+            return row, self._table.row(row)
+
+        with self._lock:
+            statuses, rows, views = _plan_bulk(bookings, lookup)
+            if any(st != "ok" for st in statuses):
+                return _bulk_rejected(statuses, views)
+            rows = [row if row is not None else self._table.insert(view)
+                    for row, view in zip(rows, views)]
+            ticket = self._record("book_many", [
+                self._assign(row, b["patient_name"], b["cpf"])
+                for row, b in zip(rows, bookings)
+            ])
+            booked = [self._table.row(row) for row in rows]
+        self._await(ticket)
+        return [("confirmed", s) for s in booked]
+
+    def archive_before(self, date: str, sink: Callable[[list[Slot]], Any]) -> int:
+        """Arquiva e remove as linhas antigas; o snapshot é regravado na hora."""
+        with self._lock:
+            rows = self._table.rows_before(day_minutes(date))
+            if not rows:
+                return 0
+            sink([self._table.row(r) for r in rows])
+            self._table.remove(rows)
+            ticket = self._record("archive", [])
+        self._await(ticket)
+        self.flush()
+        return len(rows)
+
+
+# ------------------------------------------------------------------
+# Backend em memória com group commit
+# ------------------------------------------------------------------
+
+class GroupCommitSlotStore(MemorySlotStore):
+    """
+    Tabela em memória com escritas duráveis agrupadas (group commit).
+
+    Cada mutação é aplicada em memória sob o lock e recebe um número de
+    sequência; o chamador então espera, fora do lock, até que um snapshot
+    contendo essa sequência seja gravado (arquivo temporário + fsync +
+    rename atômico). Uma thread de commit junta as mutações que chegam
+    dentro de ``max_wait`` segundos — ou até ``max_batch`` mutações — e
+    confirma todas com uma única escrita em disco.
+
+    Se a escrita falha, todas as mutações ainda não duráveis são desfeitas
+    na tabela (estados ``before``, em ordem inversa) e os chamadores
+    recebem ``PersistenceError``: o que foi recusado não reaparece num
+    snapshot posterior. O arquivamento (``archive_before``) não é desfeito
+    — as linhas já estão no arquivo mensal.
+    """
+
+    def __init__(
+        self,
+        db_path: Path,
+        max_batch: Optional[int] = None,
+        max_wait: Optional[float] = None,
+    ) -> None:
+        self.max_batch = max_batch or int(
+            os.getenv("CLINIC_DB_GROUP_COMMIT_MAX_BATCH", "64"))
+        self.max_wait = max_wait if max_wait is not None else float(
+            os.getenv("CLINIC_DB_GROUP_COMMIT_MAX_WAIT_MS", "5")) / 1000
+        self._applied_seq = 0
+        self._durable_seq = 0
+        # Mutações aplicadas e ainda não duráveis: (sequência, mudanças).
+        self._undo_log: list[tuple[int, list[dict[str, Any]]]] = []
+        self._failed: set[int] = set()
+        self._commit_error: Optional[BaseException] = None
+        self._cond = threading.Condition(threading.Lock())
+        super().__init__(db_path, flush_interval=self.max_wait)
+
+    def _commit(self, op: str, changes: list[dict[str, Any]]) -> Any:
+        self._applied_seq += 1
+        ticket = self._applied_seq
+        self._undo_log.append((ticket, changes))
+        with self._cond:
+            self._cond.notify_all()
+        return ticket
+
+    def _await(self, ticket: Any) -> None:
+        with self._cond:
+            while ticket not in self._failed:
+                if self._durable_seq >= ticket:
+                    return
+                self._cond.wait()
+            self._failed.discard(ticket)
+            raise PersistenceError(
+                f"Falha ao gravar os horários em disco ({self._commit_error}); "
+                "a operação foi desfeita"
+            ) from self._commit_error
+
+    def _rollback(self) -> list[int]:
+        """Desfaz (sob ``_lock``) as mutações não duráveis; retorna suas sequências."""
+        for _, changes in reversed(self._undo_log):
+            self._undo(changes)
+        undone = [seq for seq, _ in self._undo_log]
+        self._undo_log = []
+        return undone
+
+    def _pending(self) -> int:
+        return self._applied_seq - self._durable_seq
+
+    def _flush_loop(self) -> None:
+        while not self._closed.is_set():
+            with self._cond:
+                while not self._pending() and not self._closed.is_set():
+                    self._cond.wait()
+                # Janela do lote: espera mais mutações até max_wait/max_batch.
+                deadline = monotonic() + self.max_wait
+                while self._pending() < self.max_batch:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0 or self._closed.is_set():
+                        break
+                    self._cond.wait(remaining)
+            try:
+                self.flush()
+            except Exception:
+                # Os chamadores do lote já recebem PersistenceError em _await.
+                logger.exception("Falha no group commit de %s", self.db_path)
+
+    def flush(self) -> None:
+        """Grava um snapshot que confirma todas as mutações já aplicadas."""
+        with self._flush_lock:
+            with self._lock:
+                covered = self._applied_seq
+                if covered == self._durable_seq:
+                    return
+                snapshot = self._table.to_slots()
+            try:
+                _write_snapshot(self.db_path, snapshot, self._templates)
+            except BaseException as exc:
+                with self._lock:
+                    undone = self._rollback()
+                    with self._cond:
+                        self._failed.update(undone)
+                        self._durable_seq = self._applied_seq
+                        self._commit_error = exc
+                        self._cond.notify_all()
+                raise
+            with self._lock:
+                self._undo_log = [(seq, ch) for seq, ch in self._undo_log if seq > covered]
+                with self._cond:
+                    self._durable_seq = covered
+                    self._cond.notify_all()
+
+    def close(self) -> None:
+        self._closed.set()
+        with self._cond:
+            self._cond.notify_all()
+        self._flusher.join()
+        self.flush()
+        self._release()
+
+
+# ------------------------------------------------------------------
+# Backend em memória com journal append-only
+# ------------------------------------------------------------------
+
+def _read_journal(path: Path) -> tuple[list[dict[str, Any]], int]:
+    """
+    Lê os registros de um journal NDJSON.
+
+    Uma última linha incompleta (queda no meio de um append) é ignorada.
+    Retorna os registros e o tamanho em bytes da parte válida do arquivo.
+    """
+    records: list[dict[str, Any]] = []
+    valid = 0
+    if not path.exists():
+        return records, valid
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            valid += len(line)
+    return records, valid
+
+
+class JournalSlotStore(MemorySlotStore):
+    """
+    Tabela em memória persistida por um journal append-only (``db.journal``).
+
+    Cada book/cancel/reschedule acrescenta uma única linha com os estados
+    antes/depois dos horários envolvidos e faz fsync — custo O(1) por
+    consulta, independente do tamanho da agenda. Na inicialização o
+    journal é reaplicado sobre o snapshot (``db.json``). A compactação
+    roda em segundo plano a cada ``CLINIC_DB_COMPACT_INTERVAL`` segundos:
+    o journal corrente é rotacionado para ``db.journal.compacting``, o
+    snapshot é regravado atomicamente e só então o journal antigo é
+    removido. Se a gravação do snapshot falha, o ``.compacting`` fica e a
+    próxima compactação acrescenta o journal corrente ao fim dele em vez
+    de substituí-lo. Como os registros guardam estados absolutos,
+    reaplicá-los sobre um snapshot que já os contém é inofensivo.
+
+    Se o append (ou o fsync) falha, a mutação é desfeita na tabela e o
+    chamador recebe ``PersistenceError``; o pedaço de linha que tenha
+    chegado ao journal é cortado antes do próximo append.
+    """
+
+    _interval_env = ("CLINIC_DB_COMPACT_INTERVAL", "30")
+
+    def __init__(self, db_path: Path, flush_interval: Optional[float] = None) -> None:
+        self.journal_path = db_path.with_suffix(".journal")
+        self._compacting_path = db_path.with_suffix(".journal.compacting")
+        super().__init__(db_path, flush_interval)
+
+    def _open(self) -> None:
+        for path in (self._compacting_path, self.journal_path):
+            records, valid = _read_journal(path)
+            for record in records:
+                self._replay(record)
+                self._dirty = True
+            if path.exists() and path.stat().st_size > valid:
+                os.truncate(path, valid)
+        self._open_journal()
+
+    def _open_journal(self) -> None:
+        # Sem buffer: um append que falha não deixa bytes pendentes para depois.
+        self._journal = open(self.journal_path, "ab", buffering=0)
+        self._journal_end = os.fstat(self._journal.fileno()).st_size
+        self._journal_torn = False
+
+    def _replay(self, record: dict[str, Any]) -> None:
+        for change in record["changes"]:
+            row = self._materialize(*change["key"])
+            if row is not None:
+                self._table.set(row, **change["after"])
+
+    def _commit(self, op: str, changes: list[dict[str, Any]]) -> Any:
+        line = json.dumps({"op": op, "changes": changes},
+                          ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+        try:
+            self._mend()
+            self._journal_torn = True
+            written = self._journal.write(line)
+            if written != len(line):
+                raise OSError(f"append incompleto: {written} de {len(line)} bytes")
+            os.fsync(self._journal.fileno())
+        except OSError as exc:
+            self._undo(changes)
+            try:
+                self._mend()
+            except OSError:
+                pass  # fica marcado; o próximo append (ou a rotação) corta
+            raise PersistenceError(
+                f"Falha ao gravar os horários em disco ({exc}); a operação foi desfeita"
+            ) from exc
+        self._journal_end += len(line)
+        self._journal_torn = False
+        self._dirty = True
+
+    def _mend(self) -> None:
+        """Corta (sob ``_lock``) o que um append que falhou deixou após ``_journal_end``."""
+        if self._journal_torn:
+            os.ftruncate(self._journal.fileno(), self._journal_end)
+            self._journal_torn = False
+
+    def flush(self) -> None:
+        """Compacta o journal no snapshot se houver registros pendentes."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._dirty:
+                    return
+                snapshot = self._table.to_slots()
+                self._rotate()
+                self._dirty = False
+            try:
+                _write_snapshot(self.db_path, snapshot, self._templates)
+            except BaseException:
+                with self._lock:
+                    self._dirty = True
+                raise
+            os.remove(self._compacting_path)
+
+    def _rotate(self) -> None:
+        """
+        Passa o journal corrente para ``db.journal.compacting`` (sob ``_lock``).
+
+        Um ``.compacting`` que sobrou de uma compactação que falhou guarda
+        registros que ainda não estão no ``db.json``: o journal corrente é
+        acrescentado ao fim dele, nunca o substitui.
+        """
+        self._mend()
+        self._journal.close()
+        try:
+            if self._compacting_path.exists():
+                with open(self.journal_path, "rb") as src, \
+                        open(self._compacting_path, "ab") as dst:
+                    shutil.copyfileobj(src, dst)
+                    dst.flush()
+                    os.fsync(dst.fileno())
+                os.truncate(self.journal_path, 0)
+            else:
+                os.replace(self.journal_path, self._compacting_path)
+        finally:
+            self._open_journal()
+
+    def _release(self) -> None:
+        self._journal.close()
+        super()._release()
+
+
+# ------------------------------------------------------------------
+# Backend SQLite
+# ------------------------------------------------------------------
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS slots (
+    id           INTEGER PRIMARY KEY,
+    doctor       TEXT    NOT NULL,
+    doctor_key   TEXT    NOT NULL,
+    specialty    TEXT    NOT NULL,
+    date         TEXT    NOT NULL,
+    time         TEXT    NOT NULL,
+    available    INTEGER NOT NULL,
+    patient_name TEXT,
+    cpf          TEXT,
+    version      INTEGER NOT NULL DEFAULT 0,
+    cpf_hash     TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_slots_doctor_date_time
+    ON slots (doctor_key, date, time);
+CREATE INDEX IF NOT EXISTS idx_slots_date_time
+    ON slots (date, time, doctor_key);
+CREATE TABLE IF NOT EXISTS templates (
+    id   INTEGER PRIMARY KEY,
+    body TEXT    NOT NULL
+);
+CREATE TABLE IF NOT EXISTS mutations (
+    id    INTEGER PRIMARY KEY CHECK (id = 0),
+    count INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO mutations (id, count) VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS slots_insert_counted AFTER INSERT ON slots
+    BEGIN UPDATE mutations SET count = count + 1; END;
+CREATE TRIGGER IF NOT EXISTS slots_update_counted AFTER UPDATE ON slots
+    BEGIN UPDATE mutations SET count = count + 1; END;
+CREATE TRIGGER IF NOT EXISTS slots_delete_counted AFTER DELETE ON slots
+    BEGIN UPDATE mutations SET count = count + 1; END;
+"""
+
+_COLUMNS = "doctor, specialty, date, time, available, patient_name, cpf, version"
+
+
+# Colunas acrescentadas depois da primeira versão do schema.
+_ADDED_COLUMNS = (("version", "INTEGER NOT NULL DEFAULT 0"), ("cpf_hash", "TEXT"))
+
+
+def _ensure_schema(conn: sqlite3.Connection) -> None:
+    """Cria as tabelas e migra bancos criados antes das colunas novas."""
+    conn.executescript(_SCHEMA)
+    columns = {r[1] for r in conn.execute("PRAGMA table_info(slots)")}
+    for name, decl in _ADDED_COLUMNS:
+        if name not in columns:
+            try:
+                conn.execute(f"ALTER TABLE slots ADD COLUMN {name} {decl}")
+            except sqlite3.OperationalError:
+                pass  # outro processo acrescentou a coluna primeiro
+    if "cpf_hash" not in columns:
+        rows = conn.execute("SELECT id, cpf FROM slots WHERE cpf IS NOT NULL").fetchall()
+        conn.executemany("UPDATE slots SET cpf_hash = ? WHERE id = ?",
+                         [(cpf_hash(cpf), i) for i, cpf in rows])
+        conn.commit()
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_slots_cpf_hash ON slots (cpf_hash)")
+
+
+def _row_to_slot(row: sqlite3.Row) -> Slot:
+    return {
+        "doctor": row["doctor"], "specialty": row["specialty"],
+        "date": row["date"], "time": row["time"],
+        "available": bool(row["available"]),
+        "patient_name": row["patient_name"], "cpf": row["cpf"],
+        "version": row["version"],
+    }
+
+
+def _insert_slots(conn: sqlite3.Connection, slots: Iterable[SlotView]) -> None:
+    conn.executemany(
+        f"INSERT OR IGNORE INTO slots (doctor_key, cpf_hash, {_COLUMNS}) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (s["doctor"].lower(), cpf_hash(s["cpf"]) if s.get("cpf") else None,
+             s["doctor"], s["specialty"], s["date"], s["time"],
+             int(bool(s["available"])), s.get("patient_name"), s.get("cpf"),
+             s.get("version", 0))
+            for s in slots
+        ],
+    )
+
+
+def import_json_to_sqlite(json_path: Path, sqlite_path: Path) -> int:
+    """
+    Importação única de um ``db.json`` para o banco SQLite.
+
+    Horários e modelos só são importados enquanto a tabela correspondente
+    estiver vazia (a importação não sobrescreve dados gravados depois
+    dela). ``PRAGMA user_version`` marca que os horários já foram
+    importados, para que uma tabela esvaziada pelo arquivamento não seja
+    reimportada. Retorna o número de horários importados.
+    """
+    conn = sqlite3.connect(str(sqlite_path))
+    try:
+        _ensure_schema(conn)
+        has_slots = (conn.execute("SELECT 1 FROM slots LIMIT 1").fetchone()
+                     or conn.execute("PRAGMA user_version").fetchone()[0])
+        has_templates = conn.execute("SELECT 1 FROM templates LIMIT 1").fetchone()
+        if has_slots and has_templates:
+            return 0
+        slots, templates = _parse_db(json_path)
+        with conn:
+            if not has_slots:
+                _insert_slots(conn, slots)
+                conn.execute("PRAGMA user_version = 1")
+            if not has_templates:
+                conn.executemany(
+                    "INSERT INTO templates (body) VALUES (?)",
+                    [(json.dumps(t, ensure_ascii=False),) for t in templates.to_list()],
+                )
+        return 0 if has_slots else len(slots)
+    finally:
+        conn.close()
+
+
+class SqliteSlotStore(SlotStore):
+    """
+    Horários em SQLite, importados uma única vez do ``db.json``.
+
+    Cada thread usa sua própria conexão. book/cancel são um único
+    ``UPDATE ... WHERE version = ?`` (compare-and-swap, repetido se outra
+    escrita venceu a corrida); reschedule altera dois horários numa
+    transação ``BEGIN IMMEDIATE``. O lock de escrita do próprio SQLite vale
+    entre processos, então vários workers podem compartilhar o mesmo
+    ``db.sqlite``.
+    """
+
+    shared_across_processes = True
+
+    def __init__(self, db_path: Path, sqlite_path: Optional[Path] = None) -> None:
+        self.db_path = db_path
+        self.sqlite_path = sqlite_path or db_path.with_suffix(".sqlite")
+        if db_path.exists():
+            import_json_to_sqlite(db_path, self.sqlite_path)
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._templates = TemplateSet(
+            json.loads(body) for (body,) in
+            self._conn().execute("SELECT body FROM templates ORDER BY id"))
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(
+                str(self.sqlite_path), isolation_level=None,
+                check_same_thread=False,
+            )
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            _ensure_schema(conn)
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def _lookup(conn: sqlite3.Connection, doctor: str, date: str,
+                time: str) -> Optional[sqlite3.Row]:
+        return conn.execute(
+            f"SELECT id, {_COLUMNS} FROM slots "
+            "WHERE doctor_key = ? AND date = ? AND time = ?",
+            (doctor.lower(), date, time),
+        ).fetchone()
+
+    def _materialize(self, conn: sqlite3.Connection, doctor: str, date: str,
+                     time: str) -> Optional[sqlite3.Row]:
+        """Grava o horário livre gerado por modelo (se houver) e o relê."""
+        slot = self._templates.find(doctor, date, time)
+        if slot is None:
+            return None
+        _insert_slots(conn, [slot])
+        return self._lookup(conn, doctor, date, time)
+
+    def _select(self, conn: sqlite3.Connection, doctor: str, date: str,
+                time: str, available: bool,
+                expected_version: Optional[int] = None) -> Optional[sqlite3.Row]:
+        row = self._lookup(conn, doctor, date, time)
+        if row is None and available:
+            virtual = self._templates.find(doctor, date, time)
+            if virtual is None:
+                return None
+            _check_version(virtual, expected_version)
+            row = self._materialize(conn, doctor, date, time)
+        if row is None:
+            return None
+        _check_version(_row_to_slot(row), expected_version)
+        return row if bool(row["available"]) == available else None
+
+    def _swap(self, conn: sqlite3.Connection, row: sqlite3.Row,
+              patient_name: Optional[str], cpf: Optional[str]) -> bool:
+        """Aplica a mudança só se a linha ainda está na versão lida."""
+        cur = conn.execute(
+            "UPDATE slots SET available = ?, patient_name = ?, cpf = ?, cpf_hash = ?, "
+            "version = version + 1 WHERE id = ? AND version = ?",
+            (int(patient_name is None), patient_name, cpf,
+             cpf_hash(cpf) if cpf else None, row["id"], row["version"]),
+        )
+        return cur.rowcount == 1
+
+    def list_available(
+        self,
+        doctor: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        time_from: str = "",
+        time_to: str = "",
+        limit: Optional[int] = None,
+        after: Optional[SortKey] = None,
+    ) -> list[SlotView]:
+        where = ["available = 1"]
+        args: list[Any] = []
+        for clause, value in (
+            ("instr(doctor_key, ?) > 0", doctor.lower()),
+            ("date >= ?", date_from),
+            ("date <= ?", date_to),
+            ("time >= ?", time_from),
+            ("time <= ?", time_to),
+        ):
+            if value:
+                where.append(clause)
+                args.append(value)
+        if after is not None:
+            where.append("(date, time, doctor_key) > (?, ?, ?)")
+            args.extend(after)
+        sql = (f"SELECT {_COLUMNS} FROM slots WHERE {' AND '.join(where)} "
+               "ORDER BY date, time, doctor_key")
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        conn = self._conn()
+        stored = [_row_to_slot(r) for r in conn.execute(sql, args)]
+        if not self._templates:
+            return stored
+        generated = self._templates.expand(
+            doctor, date_from, date_to, time_from, time_to, after)
+        return _with_templates(
+            stored, generated,
+            lambda v: self._lookup(conn, v["doctor"], v["date"], v["time"]) is not None,
+            limit,
+        )
+
+    def data_version(self) -> Any:
+        # Contador mantido por triggers: vale entre conexões e processos.
+        return self._conn().execute("SELECT count FROM mutations").fetchone()[0]
+
+    def list_booked(self, cpf: str) -> list[Slot]:
+        rows = self._conn().execute(
+            f"SELECT {_COLUMNS} FROM slots WHERE cpf_hash = ? AND available = 0 "
+            "ORDER BY date, time, doctor_key",
+            (cpf_hash(cpf),),
+        )
+        return [_row_to_slot(r) for r in rows]
+
+    def book(self, doctor: str, date: str, time: str, patient_name: str,
+             cpf: str, expected_version: Optional[int] = None) -> Optional[Slot]:
+        conn = self._conn()
+        while True:
+            row = self._select(conn, doctor, date, time, True, expected_version)
+            if row is None:
+                return None
+            if self._swap(conn, row, patient_name, cpf):
+                break
+        slot = _row_to_slot(row)
+        slot.update(available=False, patient_name=patient_name, cpf=cpf,
+                    version=row["version"] + 1)
+        return slot
+
+    def cancel(self, doctor: str, date: str, time: str,
+               expected_version: Optional[int] = None) -> Optional[Slot]:
+        conn = self._conn()
+        while True:
+            row = self._select(conn, doctor, date, time, False, expected_version)
+            if row is None:
+                return None
+            if self._swap(conn, row, None, None):
+                return _row_to_slot(row)
+
+    def reschedule(
+        self, doctor: str, original_date: str, original_time: str,
+        new_date: str, new_time: str, patient_name: str, cpf: str,
+        expected_version: Optional[int] = None,
+    ) -> tuple[Optional[Slot], Optional[Slot]]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            orig = self._select(conn, doctor, original_date, original_time, False)
+            new = self._select(conn, doctor, new_date, new_time, True, expected_version)
+            if orig is None or new is None:
+                conn.execute("ROLLBACK")
+                return (_row_to_slot(orig) if orig else None,
+                        _row_to_slot(new) if new else None)
+            self._swap(conn, orig, None, None)
+            self._swap(conn, new, patient_name, cpf)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        new_slot = _row_to_slot(new)
+        new_slot.update(available=False, patient_name=patient_name, cpf=cpf,
+                        version=new["version"] + 1)
+        return _row_to_slot(orig), new_slot
+
+    def book_many(self, bookings: list[Booking]) -> list[BulkResult]:
+        conn = self._conn()
+
+        def lookup(b: Booking) -> tuple[Optional[sqlite3.Row], Optional[SlotView]]:
+            row = self._lookup(conn, b["doctor"], b["date"], b["time"])
+            if row is None:
+                return None, self._templates.find(b["doctor"], b["date"], b["time"])
+            return row, _row_to_slot(row)
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            statuses, rows, views = _plan_bulk(bookings, lookup)
+            if any(st != "ok" for st in statuses):
+                conn.execute("ROLLBACK")
+                return _bulk_rejected(statuses, views)
+            rows = [row if row is not None
+                    else self._materialize(conn, b["doctor"], b["date"], b["time"])
+                    for row, b in zip(rows, bookings)]
+            for row, b in zip(rows, bookings):
+                self._swap(conn, row, b["patient_name"], b["cpf"])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        results: list[BulkResult] = []
+        for row, b in zip(rows, bookings):
+            slot = _row_to_slot(row)
+            slot.update(available=False, patient_name=b["patient_name"],
+                        cpf=b["cpf"], version=row["version"] + 1)
+            results.append(("confirmed", slot))
+        return results
+
+    def archive_before(self, date: str, sink: Callable[[list[Slot]], Any]) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            old = [_row_to_slot(r) for r in conn.execute(
+                f"SELECT {_COLUMNS} FROM slots WHERE date < ? ORDER BY id", (date,))]
+            if old:
+                sink(old)
+                conn.execute("DELETE FROM slots WHERE date < ?", (date,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(old)
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+# ------------------------------------------------------------------
+# Execução direta — importação única de todos os db.json
+# ------------------------------------------------------------------
+if __name__ == "__main__":
+    import sys
+
+    for arg in sys.argv[1:]:
+        path = Path(arg)
+        count = import_json_to_sqlite(path, path.with_suffix(".sqlite"))
+        print(f"{path}: {count} horário(s) importado(s)")
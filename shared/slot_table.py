@@ -0,0 +1,307 @@
+"""
+Tabela compacta de horários em memória
+=======================================
+Representação colunar usada pelos backends em memória de
+``shared/slot_store.py``. Em vez de um dict de 7 chaves por horário:
+
+    - médicos e especialidades são internados em tabelas pequenas e cada
+      linha guarda apenas o índice (``array('H')``);
+    - data e hora viram um único inteiro: minutos desde 1970-01-01
+      (``array('i')``);
+    - disponibilidade é um ``array('B')`` e a versão do horário (incrementada
+      a cada mutação) um ``array('I')``;
+    - nome e CPF do paciente ficam num dict esparso, só para linhas
+      ocupadas, com um índice secundário hash(CPF) → linhas.
+
+O índice hash (médico, data, hora) → linha usa uma chave inteira única e o
+índice ordenado por (data, hora, médico) é um ``array('I')`` de linhas.
+Dicts só são materializados na fronteira (respostas MCP e snapshot).
+
+Linhas arquivadas (``remove``) saem dos índices e do snapshot, mas mantêm
+o número: buscas feitas fora do lock continuam apontando para a linha
+certa, que ``is_live`` passa a recusar.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from array import array
+from bisect import bisect_left
+from datetime import date as _date
+from functools import lru_cache
+from typing import Any, Iterable, Iterator, Optional
+
+_EPOCH_ORDINAL = _date(1970, 1, 1).toordinal()
+_MINUTES_PER_DAY = 24 * 60
+_DOCTOR_BITS = 16
+
+
+def to_minutes(date: str, time: str) -> int:
+    """Converte ("AAAA-MM-DD", "HH:MM") em minutos desde a época; ValueError se inválido."""
+    return day_minutes(date) + time_minutes(time)
+
+
+@lru_cache(maxsize=4096)  # poucas datas distintas, repetidas em cada médico/hora
+def day_minutes(date: str) -> int:
+    """Minuto em que começa o dia ``date`` (AAAA-MM-DD)."""
+    if len(date) != 10:
+        raise ValueError(f"Data inválida: {date!r}")
+    return (_date.fromisoformat(date).toordinal() - _EPOCH_ORDINAL) * _MINUTES_PER_DAY
+
+
+def time_minutes(time: str) -> int:
+    """Minuto do dia de ``time`` (HH:MM)."""
+    hours, sep, minutes = time.partition(":")
+    if not sep or len(minutes) != 2 or not hours.isdigit() or not minutes.isdigit():
+        raise ValueError(f"Hora inválida: {time!r}")
+    h, m = int(hours), int(minutes)
+    if h > 23 or m > 59:
+        raise ValueError(f"Hora inválida: {time!r}")
+    return h * 60 + m
+
+
+def cpf_hash(cpf: Any) -> str:
+    """Chave do índice por paciente: SHA-256 dos dígitos do CPF."""
+    digits = "".join(ch for ch in str(cpf) if ch.isdigit())
+    return hashlib.sha256(digits.encode("ascii")).hexdigest()
+
+
+def format_minutes(value: int) -> tuple[str, str]:
+    """Inverso de ``to_minutes``: retorna ("AAAA-MM-DD", "HH:MM")."""
+    day, minute = divmod(value, _MINUTES_PER_DAY)
+    return (_date.fromordinal(_EPOCH_ORDINAL + day).isoformat(),
+            f"{minute // 60:02d}:{minute % 60:02d}")
+
+
+class _Interned:
+    """Tabela de strings internadas: string ↔ índice pequeno."""
+
+    def __init__(self) -> None:
+        self.values: list[str] = []
+        self._ids: dict[str, int] = {}
+
+    def id(self, value: str) -> int:
+        idx = self._ids.get(value)
+        if idx is None:
+            idx = len(self.values)
+            if idx >= 1 << _DOCTOR_BITS:
+                raise OverflowError("Limite de valores internados excedido")
+            self.values.append(value)
+            self._ids[value] = idx
+        return idx
+
+    def get(self, value: str) -> Optional[int]:
+        return self._ids.get(value)
+
+
+class SlotTable:
+    """Horários de uma clínica em colunas compactas."""
+
+    def __init__(self) -> None:
+        self.doctors = _Interned()
+        self.specialties = _Interned()
+        # Nome do médico em minúsculas → id da chave usada no índice hash.
+        self._doctor_keys = _Interned()
+        self._doctor_key_of = array("H")
+
+        self.doctor = array("H")
+        self.specialty = array("H")
+        self.minute = array("i")
+        self.available = array("B")
+        self.version = array("I")
+        self.patients: dict[int, tuple[str, str]] = {}
+        self._by_cpf: dict[str, set[int]] = {}
+
+        self._index: dict[int, int] = {}
+        self._removed: set[int] = set()
+        self._order = array("I")
+        self._order_minutes = array("i")
+
+    @classmethod
+    def from_slots(cls, slots: Iterable[dict[str, Any]]) -> "SlotTable":
+        table = cls()
+        for s in slots:
+            table.append(s)
+        table.rebuild_order()
+        return table
+
+    def __len__(self) -> int:
+        return len(self.minute)
+
+    # -- construção -----------------------------------------------------
+
+    def append(self, slot: dict[str, Any]) -> int:
+        """Acrescenta um horário; chame ``rebuild_order`` depois de um lote."""
+        row = len(self.minute)
+        doctor_id = self.doctors.id(slot["doctor"])
+        if doctor_id == len(self._doctor_key_of):
+            self._doctor_key_of.append(self._doctor_keys.id(slot["doctor"].lower()))
+        self.doctor.append(doctor_id)
+        self.specialty.append(self.specialties.id(slot["specialty"]))
+        minute = to_minutes(slot["date"], slot["time"])
+        self.minute.append(minute)
+        self.available.append(1 if slot["available"] else 0)
+        self.version.append(slot.get("version", 0))
+        if not slot["available"]:
+            self._set_patient(row, slot.get("patient_name"), slot.get("cpf"))
+        self._index.setdefault(self._hash_key(self._doctor_key_of[doctor_id], minute), row)
+        return row
+
+    def rebuild_order(self) -> None:
+        """Reconstrói o índice ordenado por (data, hora, médico)."""
+        keys = self._doctor_keys.values
+        rows = sorted(
+            self._index.values(),
+            key=lambda r: (self.minute[r], keys[self._doctor_key_of[self.doctor[r]]]),
+        )
+        self._order = array("I", rows)
+        self._order_minutes = array("i", (self.minute[r] for r in rows))
+
+    def insert(self, slot: dict[str, Any]) -> int:
+        """Acrescenta um horário mantendo o índice ordenado (sem reconstruí-lo)."""
+        row = self.append(slot)
+        minute, key = self.minute[row], self.doctor_key(row)
+        mins = self._order_minutes
+        pos = bisect_left(mins, minute)
+        while pos < len(mins) and mins[pos] == minute and self.doctor_key(self._order[pos]) < key:
+            pos += 1
+        self._order.insert(pos, row)
+        mins.insert(pos, minute)
+        return row
+
+    @staticmethod
+    def _hash_key(doctor_key: int, minute: int) -> int:
+        return (minute << _DOCTOR_BITS) | doctor_key
+
+    # -- leitura ----------------------------------------------------------
+
+    def find(self, doctor: str, date: str, time: str) -> Optional[int]:
+        """Linha do horário (médico sem distinção de caixa, data, hora) ou None."""
+        doctor_key = self._doctor_keys.get(doctor.lower())
+        if doctor_key is None:
+            return None
+        try:
+            minute = to_minutes(date, time)
+        except ValueError:
+            return None
+        return self._index.get(self._hash_key(doctor_key, minute))
+
+    def rows_for_cpf(self, cpf: Any) -> list[int]:
+        """Linhas ocupadas pelo CPF, em ordem de (data, hora, médico)."""
+        rows = self._by_cpf.get(cpf_hash(cpf), ())
+        return sorted(rows, key=lambda r: (self.minute[r], self.doctor_key(r)))
+
+    def rows_before(self, minute: int) -> list[int]:
+        """Linhas vivas anteriores a ``minute``, na ordem original."""
+        return [r for r in range(len(self))
+                if self.minute[r] < minute and r not in self._removed]
+
+    def is_live(self, row: int) -> bool:
+        return row not in self._removed
+
+    def doctor_key(self, row: int) -> str:
+        return self._doctor_keys.values[self._doctor_key_of[self.doctor[row]]]
+
+    def row(self, row: int) -> dict[str, Any]:
+        """Materializa a linha no formato de dict do ``db.json``."""
+        date, time = format_minutes(self.minute[row])
+        patient_name, cpf = self.patients.get(row, (None, None))
+        return {
+            "doctor": self.doctors.values[self.doctor[row]],
+            "specialty": self.specialties.values[self.specialty[row]],
+            "date": date, "time": time,
+            "available": bool(self.available[row]),
+            "patient_name": patient_name, "cpf": cpf,
+            "version": self.version[row],
+        }
+
+    def scan(
+        self,
+        doctor: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        time_from: str = "",
+        time_to: str = "",
+        after: Optional[tuple[str, str, str]] = None,
+    ) -> Iterator[int]:
+        """
+        Percorre, em ordem, as linhas livres que passam pelos filtros.
+
+        A faixa de datas e o cursor ``after`` (data, hora, lower(médico))
+        são localizados por bisect; custo O(log n + linhas na faixa).
+        """
+        mins = self._order_minutes
+        lo = bisect_left(mins, day_minutes(date_from)) if date_from else 0
+        hi = (bisect_left(mins, day_minutes(date_to) + _MINUTES_PER_DAY)
+              if date_to else len(mins))
+        after_minute, after_doctor = -1, ""
+        if after is not None:
+            after_minute = to_minutes(after[0], after[1])
+            after_doctor = after[2]
+            lo = max(lo, bisect_left(mins, after_minute))
+        tod_from = time_minutes(time_from) if time_from else 0
+        tod_to = time_minutes(time_to) if time_to else _MINUTES_PER_DAY
+        dl = doctor.lower()
+        allowed = (
+            None if not dl else
+            {i for i, name in enumerate(self._doctor_keys.values) if dl in name}
+        )
+
+        for i in range(lo, hi):
+            row = self._order[i]
+            if not self.available[row]:
+                continue
+            minute = mins[i]
+            doctor_key = self._doctor_key_of[self.doctor[row]]
+            if minute == after_minute and self._doctor_keys.values[doctor_key] <= after_doctor:
+                continue
+            if allowed is not None and doctor_key not in allowed:
+                continue
+            if not tod_from <= minute % _MINUTES_PER_DAY <= tod_to:
+                continue
+            yield row
+
+    # -- escrita ----------------------------------------------------------
+
+    def set(self, row: int, available: bool, patient_name: Optional[str],
+            cpf: Optional[str], version: Optional[int] = None) -> None:
+        """
+        Define o estado da linha; dados do paciente só ficam em linhas ocupadas.
+
+        Sem ``version`` a versão da linha é incrementada; com ela (replay do
+        journal) é atribuída diretamente.
+        """
+        self.available[row] = 1 if available else 0
+        self.version[row] = self.version[row] + 1 if version is None else version
+        self._clear_patient(row)
+        if not available:
+            self._set_patient(row, patient_name, cpf)
+
+    def remove(self, rows: Iterable[int]) -> None:
+        """Tira as linhas dos índices e do snapshot (arquivamento)."""
+        for row in rows:
+            key = self._hash_key(self._doctor_key_of[self.doctor[row]], self.minute[row])
+            if self._index.get(key) == row:
+                del self._index[key]
+            self.available[row] = 0
+            self._clear_patient(row)
+            self._removed.add(row)
+        self.rebuild_order()
+
+    def _clear_patient(self, row: int) -> None:
+        previous = self.patients.pop(row, None)
+        if previous is not None and previous[1]:
+            rows = self._by_cpf.get(cpf_hash(previous[1]))
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self._by_cpf[cpf_hash(previous[1])]
+
+    def _set_patient(self, row: int, patient_name: Optional[str], cpf: Optional[str]) -> None:
+        self.patients[row] = (patient_name, cpf)
+        if cpf:
+            self._by_cpf.setdefault(cpf_hash(cpf), set()).add(row)
+
+    def to_slots(self) -> list[dict[str, Any]]:
+        """Todas as linhas vivas como dicts, na ordem original (snapshot)."""
+        return [self.row(r) for r in range(len(self)) if r not in self._removed]
@@ -0,0 +1,144 @@
+"""
+Modelos de agenda recorrentes
+=============================
+Em vez de listar cada horário no ``db.json``, uma clínica pode declarar
+modelos recorrentes na chave ``templates``:
+
+    {
+      "doctor": "Dr. Roberto Silva", "specialty": "Cardiologia",
+      "weekdays": ["mon", "wed"], "start": "09:00", "end": "12:00",
+      "every": 30, "from": "2025-07-01", "until": "2026-06-30",
+      "exceptions": ["2025-12-25"]
+    }
+
+gera horários às segundas e quartas das 09:00 às 11:30 (``end`` é
+exclusivo), a cada 30 minutos, exceto nas datas de ``exceptions``. Os
+horários são gerados sob demanda, só para a janela consultada; apenas os
+horários ocupados ou bloqueados ficam gravados em ``slots``, e um horário
+gravado sempre prevalece sobre o gerado pelo modelo.
+"""
+
+from __future__ import annotations
+
+import heapq
+from datetime import date as _date, timedelta
+from typing import Any, Iterable, Iterator, Optional
+
+from shared.slot_table import time_minutes
+
+_WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+_ONE_DAY = timedelta(days=1)
+
+
+def _weekday(value: Any) -> int:
+    if isinstance(value, int) and 0 <= value <= 6:
+        return value
+    if isinstance(value, str) and value.lower()[:3] in _WEEKDAYS:
+        return _WEEKDAYS.index(value.lower()[:3])
+    raise ValueError(f"Dia da semana inválido no modelo: {value!r}")
+
+
+class SlotTemplate:
+    """Um modelo recorrente de um médico."""
+
+    def __init__(self, raw: dict[str, Any]) -> None:
+        try:
+            self.doctor: str = raw["doctor"]
+            self.specialty: str = raw["specialty"]
+            self.weekdays = frozenset(_weekday(d) for d in raw["weekdays"])
+            start, end = time_minutes(raw["start"]), time_minutes(raw["end"])
+            every = int(raw.get("every", 30))
+            self.first = _date.fromisoformat(raw["from"])
+            self.last = _date.fromisoformat(raw["until"])
+        except KeyError as exc:
+            raise ValueError(f"Campo ausente no modelo de agenda: {exc}") from None
+        if every <= 0 or start >= end:
+            raise ValueError(f"Faixa de horário inválida no modelo de {raw['doctor']}")
+        self.doctor_key = self.doctor.lower()
+        self.times = [f"{m // 60:02d}:{m % 60:02d}" for m in range(start, end, every)]
+        self._time_set = frozenset(self.times)
+        self.exceptions = frozenset(raw.get("exceptions", ()))
+        self.raw = raw
+
+    def covers(self, date: str, time: str) -> bool:
+        """Se o modelo gera o horário (data, hora)."""
+        if time not in self._time_set or date in self.exceptions:
+            return False
+        try:
+            day = _date.fromisoformat(date)
+        except ValueError:
+            return False
+        return self.first <= day <= self.last and day.weekday() in self.weekdays
+
+    def occurrences(self, date_from: str = "", date_to: str = "",
+                    time_from: str = "", time_to: str = "") -> Iterator[tuple[str, str]]:
+        """Gera (data, hora) em ordem, só dentro da janela pedida."""
+        day = max(self.first, _date.fromisoformat(date_from)) if date_from else self.first
+        last = min(self.last, _date.fromisoformat(date_to)) if date_to else self.last
+        times = [t for t in self.times
+                 if (not time_from or t >= time_from) and (not time_to or t <= time_to)]
+        while day <= last:
+            iso = day.isoformat()
+            if day.weekday() in self.weekdays and iso not in self.exceptions:
+                for t in times:
+                    yield iso, t
+            day += _ONE_DAY
+
+    def slot(self, date: str, time: str) -> dict[str, Any]:
+        """Materializa um horário livre gerado pelo modelo."""
+        return {
+            "doctor": self.doctor, "specialty": self.specialty,
+            "date": date, "time": time, "available": True,
+            "patient_name": None, "cpf": None, "version": 0,
+        }
+
+
+class TemplateSet:
+    """Conjunto de modelos de uma clínica (imutável após a carga)."""
+
+    def __init__(self, raw: Optional[Iterable[dict[str, Any]]] = None) -> None:
+        self.templates = [SlotTemplate(t) for t in raw or ()]
+
+    def __bool__(self) -> bool:
+        return bool(self.templates)
+
+    def to_list(self) -> list[dict[str, Any]]:
+        return [t.raw for t in self.templates]
+
+    def find(self, doctor: str, date: str, time: str) -> Optional[dict[str, Any]]:
+        """Horário gerado por algum modelo para (médico, data, hora), ou None."""
+        key = doctor.lower()
+        for t in self.templates:
+            if t.doctor_key == key and t.covers(date, time):
+                return t.slot(date, time)
+        return None
+
+    def expand(
+        self,
+        doctor: str = "",
+        date_from: str = "",
+        date_to: str = "",
+        time_from: str = "",
+        time_to: str = "",
+        after: Optional[tuple[str, str, str]] = None,
+    ) -> Iterator[dict[str, Any]]:
+        """
+        Horários gerados na janela, em ordem de (data, hora, lower(médico)).
+
+        ``after`` tem o mesmo formato do cursor de ``list_available``.
+        Modelos sobrepostos do mesmo médico geram o horário uma única vez.
+        """
+        if after is not None and (not date_from or after[0] > date_from):
+            date_from = after[0]
+        dl = doctor.lower()
+        streams = [
+            ((d, t, tpl.doctor_key, tpl) for d, t in tpl.occurrences(
+                date_from, date_to, time_from, time_to))
+            for tpl in self.templates if not dl or dl in tpl.doctor_key
+        ]
+        last = None
+        for d, t, key, tpl in heapq.merge(*streams, key=lambda o: o[:3]):
+            if (d, t, key) == last or (after is not None and (d, t, key) <= after):
+                continue
+            last = (d, t, key)
+            yield tpl.slot(d, t)
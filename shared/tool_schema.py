@@ -0,0 +1,120 @@
+"""
+Esquemas das ferramentas MCP (``tools/list``)
+=============================================
+Deriva o ``inputSchema`` (JSON Schema) de cada ferramenta da assinatura
+do seu handler, uma vez, na partida do servidor:
+
+    str → "string", int → "integer", float → "number", bool → "boolean",
+    list[...] → "array", dict[...] → "object", A | B → tipos de A e B,
+    X | None → X (o argumento pode faltar), Any → sem restrição
+
+Argumentos já ligados por ``functools.partial`` (banco e especialidade da
+clínica) e o ``**_kw`` dos handlers ficam de fora; os sem valor padrão
+entram em ``required``; padrões diferentes de ``None``/``""`` aparecem em
+``default``. A descrição vem do catálogo da clínica ou, na falta dele, do
+primeiro parágrafo da docstring.
+
+As anotações chegam como string (``from __future__ import annotations``)
+e são resolvidas uma a uma, separando as uniões ``A | B`` do nível de
+fora: ``typing.get_type_hints`` avaliaria ``int | str`` e falharia no
+Python 3.9.
+"""
+
+from __future__ import annotations
+
+import inspect
+import types
+import typing
+from functools import partial
+from typing import Any, Callable, Optional, Union
+
+# ``X | Y`` em tempo de execução só existe a partir do 3.10.
+_UNION_TYPES = tuple(t for t in (typing.Union, getattr(types, "UnionType", None)) if t)
+
+_JSON_TYPES: dict[Any, str] = {
+    str: "string", int: "integer", float: "number", bool: "boolean",
+    list: "array", tuple: "array", dict: "object",
+}
+
+
+def json_schema(annotation: Any) -> dict[str, Any]:
+    """JSON Schema de uma anotação de tipo (já resolvida)."""
+    if annotation is Any or annotation is inspect.Parameter.empty:
+        return {}
+    origin = typing.get_origin(annotation)
+    if origin in _UNION_TYPES:
+        options = [a for a in typing.get_args(annotation) if a is not type(None)]
+        schemas = [json_schema(a) for a in options]
+        if len(schemas) == 1:
+            return schemas[0]
+        if not all(set(s) == {"type"} for s in schemas):
+            return {"anyOf": schemas}
+        return {"type": [s["type"] for s in schemas]}
+    kind = _JSON_TYPES.get(origin or annotation)
+    if kind is None:
+        return {}
+    schema: dict[str, Any] = {"type": kind}
+    args = typing.get_args(annotation)
+    if kind == "array" and args:
+        items = json_schema(args[0])
+        if items:
+            schema["items"] = items
+    return schema
+
+
+def _split_union(annotation: str) -> list[str]:
+    """Partes de ``A | B[C | D]`` separadas só nos ``|`` de fora dos colchetes."""
+    parts, depth, start = [], 0, 0
+    for i, ch in enumerate(annotation):
+        if ch == "[":
+            depth += 1
+        elif ch == "]":
+            depth -= 1
+        elif ch == "|" and depth == 0:
+            parts.append(annotation[start:i].strip())
+            start = i + 1
+    parts.append(annotation[start:].strip())
+    return parts
+
+
+def _resolve(annotation: Any, namespace: dict[str, Any]) -> Any:
+    """Anotação em string avaliada em ``namespace``; ``A | B`` vira ``Union[A, B]``."""
+    if annotation is inspect.Parameter.empty or not isinstance(annotation, str):
+        return annotation
+    options = tuple(eval(part, namespace) for part in _split_union(annotation))  # noqa: S307
+    return options[0] if len(options) == 1 else Union[options]
+
+
+def input_schema(handler: Callable[..., Any]) -> dict[str, Any]:
+    """``inputSchema`` dos argumentos nomeados que ``handler`` aceita."""
+    func = handler.func if isinstance(handler, partial) else handler
+    namespace = getattr(inspect.unwrap(func), "__globals__", {})
+    properties: dict[str, Any] = {}
+    required: list[str] = []
+    for name, param in inspect.signature(handler).parameters.items():
+        if param.kind in (inspect.Parameter.VAR_POSITIONAL, inspect.Parameter.VAR_KEYWORD):
+            continue
+        prop = json_schema(_resolve(param.annotation, namespace))
+        if param.default is inspect.Parameter.empty:
+            required.append(name)
+        elif param.default not in (None, ""):
+            prop["default"] = param.default
+        properties[name] = prop
+    schema: dict[str, Any] = {"type": "object", "properties": properties}
+    if required:
+        schema["required"] = required
+    return schema
+
+
+def describe_tool(name: str, handler: Callable[..., Any], description: Optional[str] = None,
+                  read_only: bool = False) -> dict[str, Any]:
+    """Entrada de ``tools/list`` para a ferramenta ``name``."""
+    if description is None:
+        func = handler.func if isinstance(handler, partial) else handler
+        description = (inspect.getdoc(func) or name).split("\n\n")[0].replace("\n", " ")
+    return {
+        "name": name,
+        "description": description,
+        "inputSchema": input_schema(handler),
+        "annotations": {"readOnlyHint": read_only},
+    }
@@ -0,0 +1,217 @@
+"""
+Codificação das mensagens MCP na rede
+=====================================
+Negociação de conteúdo entre o Router e os endpoints ``/mcp`` das
+clínicas, pelos cabeçalhos HTTP de sempre.
+
+Corpo da resposta (``Accept``):
+
+    application/json     — padrão, sempre disponível
+    application/msgpack  — MessagePack, com o pacote ``msgpack`` instalado
+    application/cbor     — CBOR, com o pacote ``cbor2`` instalado
+
+Compressão (``Accept-Encoding``):
+
+    zstd — com o pacote ``zstandard`` instalado
+    gzip — ``zlib`` da biblioteca padrão
+
+Respostas menores que ``CLINIC_COMPRESS_MIN_BYTES`` bytes (padrão 1024)
+vão sem compressão: abaixo disso o cabeçalho gzip e a CPU custam mais do
+que economizam. Os pesos ``q`` do cliente são respeitados; em empate vale
+a ordem acima. O que o servidor não tem instalado simplesmente não é
+oferecido — quem pede MessagePack a um servidor sem ``msgpack`` recebe
+JSON, com o ``Content-Type`` dizendo isso.
+
+As requisições continuam em JSON (são pequenas); só as respostas mudam.
+
+O JSON é (de)codificado pelo ``orjson``, se instalado, ou pelo
+``pydantic_core`` (que já vem com o pydantic) — a mesma saída do
+``json`` da biblioteca padrão, compacta e em UTF-8, em bem menos CPU.
+"""
+
+from __future__ import annotations
+
+import os
+import zlib
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+import pydantic_core
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover — dependência opcional
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover — dependência opcional
+    msgpack = None  # type: ignore[assignment]
+
+try:
+    import cbor2
+except ImportError:  # pragma: no cover — dependência opcional
+    cbor2 = None  # type: ignore[assignment]
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover — dependência opcional
+    zstandard = None  # type: ignore[assignment]
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+CBOR = "application/cbor"
+
+COMPRESS_MIN_BYTES = int(os.getenv("CLINIC_COMPRESS_MIN_BYTES", "1024"))
+# gzip 3: nas listagens de horários, do tamanho do nível 6 (padrão do zlib)
+# com um quarto da CPU (tests/bench_wire.py).
+GZIP_LEVEL = 3
+ZSTD_LEVEL = 3
+
+# Nomes curtos aceitos pelo Router (``CLINIC_WIRE_ENCODING``).
+MEDIA_TYPES = {"json": JSON, "msgpack": MSGPACK, "cbor": CBOR}
+
+if orjson is not None:
+    dumps_json: Callable[[Any], bytes] = orjson.dumps
+    loads_json: Callable[[bytes], Any] = orjson.loads
+else:
+    dumps_json = pydantic_core.to_json
+    loads_json = pydantic_core.from_json
+
+
+# ------------------------------------------------------------------
+# Codificações do corpo e compressões disponíveis neste processo
+# ------------------------------------------------------------------
+
+Codec = tuple[Callable[[Any], bytes], Callable[[bytes], Any]]
+
+ENCODINGS: dict[str, Codec] = {JSON: (dumps_json, loads_json)}
+if msgpack is not None:
+    ENCODINGS[MSGPACK] = (msgpack.packb, msgpack.unpackb)
+if cbor2 is not None:
+    ENCODINGS[CBOR] = (cbor2.dumps, cbor2.loads)
+
+
+def _gzip(data: bytes) -> bytes:
+    # zlib.compress só aceita ``wbits`` a partir do 3.11.
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _gunzip(data: bytes) -> bytes:
+    return zlib.decompress(data, wbits=31)
+
+
+def _gzip_stream() -> Callable[[bytes], bytes]:
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    return lambda chunk: (compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+                          if chunk else compressor.flush())
+
+
+COMPRESSIONS: dict[str, Codec] = {}
+_STREAMS: dict[str, Callable[[], Callable[[bytes], bytes]]] = {}
+if zstandard is not None:
+    # Os (de)compressores do zstandard não são thread-safe: um por chamada.
+    COMPRESSIONS["zstd"] = (
+        lambda data: zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompressobj().decompress(data),
+    )
+
+    def _zstd_stream() -> Callable[[bytes], bytes]:
+        compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        return lambda chunk: (
+            compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            if chunk else compressor.flush())
+
+    _STREAMS["zstd"] = _zstd_stream
+COMPRESSIONS["gzip"] = (_gzip, _gunzip)
+_STREAMS["gzip"] = _gzip_stream
+
+
+# ------------------------------------------------------------------
+# Negociação
+# ------------------------------------------------------------------
+
+def negotiate(header: Optional[str], offers: Iterable[str]) -> Optional[str]:
+    """
+    A oferta preferida pelo cabeçalho ``Accept``/``Accept-Encoding``
+    (pesos ``q``; em empate, a ordem de ``offers``), ou None se nenhuma
+    serve. Curingas (``*``, ``*/*``, ``tipo/*``) casam qualquer oferta.
+    """
+    if not header:
+        return None
+    weights: dict[str, float] = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for offer in offers:
+        for name in (offer, offer.split("/")[0] + "/*", "*/*", "*"):
+            if name in weights:
+                if weights[name] > best_q:
+                    best, best_q = offer, weights[name]
+                break
+    return best
+
+
+def media_type(accept: Optional[str]) -> str:
+    """Codificação do corpo da resposta para o ``Accept`` do cliente (padrão JSON)."""
+    return negotiate(accept, ENCODINGS) or JSON
+
+
+def content_coding(accept_encoding: Optional[str], size: Optional[int] = None) -> Optional[str]:
+    """Compressão para ``Accept-Encoding``; None abaixo do limite ou sem acordo."""
+    if size is not None and size < COMPRESS_MIN_BYTES:
+        return None
+    return negotiate(accept_encoding, COMPRESSIONS)
+
+
+# ------------------------------------------------------------------
+# Codificação
+# ------------------------------------------------------------------
+
+def render(obj: Any, accept: Optional[str], accept_encoding: Optional[str]
+           ) -> tuple[bytes, dict[str, str]]:
+    """Corpo e cabeçalhos da resposta ``obj`` já negociados."""
+    media = media_type(accept)
+    return finish(ENCODINGS[media][0](obj), media, accept_encoding)
+
+
+def finish(body: bytes, media: str, accept_encoding: Optional[str]
+           ) -> tuple[bytes, dict[str, str]]:
+    """Corpo já codificado em ``media``, comprimido se negociado, e cabeçalhos."""
+    headers = {"Content-Type": media, "Vary": "Accept, Accept-Encoding"}
+    coding = content_coding(accept_encoding, len(body))
+    if coding is not None:
+        body = COMPRESSIONS[coding][0](body)
+        headers["Content-Encoding"] = coding
+    return body, headers
+
+
+def decode(body: bytes, content_type: Optional[str]) -> Any:
+    """Corpo (já descomprimido) de uma resposta, pelo seu ``Content-Type``."""
+    media = (content_type or JSON).split(";")[0].strip().lower()
+    codec = ENCODINGS.get(media)
+    if codec is None:
+        raise ValueError(f"Codificação de resposta não suportada: '{media}'")
+    return codec[1](body)
+
+
+def compress_chunks(chunks: Iterable[bytes], coding: str) -> Iterator[bytes]:
+    """
+    Comprime um fluxo pedaço a pedaço, esvaziando o compressor a cada
+    pedaço — o cliente descomprime cada página assim que ela chega.
+    """
+    step = _STREAMS[coding]()
+    for chunk in chunks:
+        if chunk:
+            yield step(chunk)
+    yield step(b"")
@@ -0,0 +1,185 @@
+"""
+Benchmark: polling listings with and without conditional reads
+===============================================================
+Starts a real clinic MCP server (``python -m shared.clinic_app``) over a
+synthetic clinic and polls the same read many times, the way an agent
+re-checks the schedule while it plans:
+
+  full        — ``Router(cache_size=0)``: every poll moves the whole result
+  conditional — ``Router()``: after the first poll the Router sends
+                ``if_none_match`` and gets back ``not_modified`` (the
+                cached response is returned), until the data changes
+
+Polled reads: ``list_available_slots`` (one page of 500) and
+``list_patients`` (every patient).  Reports mean latency per poll, bytes
+on the wire per poll (response body) and the server's CPU time per poll
+(``utime + stime`` from /proc, so Linux only).  A last run books one slot
+every 10 polls to show the revalidation cost when the data does change.
+
+Each run uses a temporary copy of the data, so the real clinic data is
+never touched.
+
+Usage:
+    python3 tests/bench_conditional.py [--patients 20000] [--slots 20000] [--polls 200]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import requests
+
+# ---------------------------------------------------------------------------
+# Ensure project root is importable
+# ---------------------------------------------------------------------------
+_project_root = Path(__file__).resolve().parents[1]
+if str(_project_root) not in sys.path:
+    sys.path.insert(0, str(_project_root))
+
+from orchestrator_host.router import Router  # noqa: E402
+from shared.patient_store import write_ndjson  # noqa: E402
+
+PORT = 8119
+URL = f"http://127.0.0.1:{PORT}/mcp"
+CPF = "123.456.789-00"
+
+
+def _write_clinic(root: Path, patients: int, slots: int) -> Path:
+    times = [f"{h:02d}:{m:02d}" for h in range(8, 16) for m in (0, 30)]
+    schedule = []
+    day = 0
+    while len(schedule) < slots:
+        date = f"{2030 + day // 336}-{1 + day // 28 % 12:02d}-{1 + day % 28:02d}"
+        schedule += [{"doctor": f"Dr. Bench {d}", "specialty": "Cardiology", "date": date,
+                      "time": t, "available": True, "patient_name": None, "cpf": None}
+                     for d in range(10) for t in times]
+        day += 1
+    (root / "db.json").write_text(json.dumps({"slots": schedule[:slots]}), encoding="utf-8")
+    write_ndjson(root / "patients.ndjson", (
+        {"patient_id": f"CARD-{i:06d}", "name": f"Paciente {i}", "age": 20 + i % 70,
+         "condition": "Hypertension" if i % 3 else "Arrhythmia"}
+        for i in range(patients)))
+    config = root / "clinics.json"
+    config.write_text(json.dumps({"clinics": [{
+        "id": "bench", "specialty": "Cardiology",
+        "db": "db.json", "patients": "patients.ndjson",
+    }]}), encoding="utf-8")
+    return config
+
+
+def _start(config: Path) -> subprocess.Popen:
+    env = dict(os.environ, CLINIC_DB_BACKEND="memory", PYTHONPATH=str(_project_root))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "shared.clinic_app", "--config", str(config),
+         "--clinic", "bench", "--host", "127.0.0.1", "--port", str(PORT)],
+        cwd=str(_project_root), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            if s.connect_ex(("127.0.0.1", PORT)) == 0:
+                return proc
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("clinic server did not start")
+
+
+def _cpu_seconds(proc: subprocess.Popen) -> float:
+    fields = Path(f"/proc/{proc.pid}/stat").read_text().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _post(action: str, arguments: dict[str, Any], **kwargs: Any) -> requests.Response:
+    body = {"jsonrpc": "2.0", "id": "b", "method": "tools/call",
+            "params": {"name": action, "arguments": arguments}}
+    return requests.post(URL, json=body, timeout=30, **kwargs)
+
+
+def _wire_bytes(action: str, parameters: dict[str, Any], etag: str = "") -> int:
+    """Size of one response body, straight from the server."""
+    arguments = {**parameters, **({"if_none_match": etag} if etag else {})}
+    response = _post(action, arguments, stream=True)
+    return len(response.raw.read(decode_content=False))  # comprimido, como trafegou
+
+
+def _poll(proc: subprocess.Popen, router: Router, step: dict[str, Any], polls: int,
+          between: Callable[[int], None] = lambda i: None) -> tuple[float, float]:
+    router.dispatch(step)  # primeira leitura: enche o cache (quando houver)
+    cpu0 = _cpu_seconds(proc)
+    t0 = time.perf_counter()
+    for i in range(polls):
+        between(i)
+        router.dispatch(step)
+    elapsed = time.perf_counter() - t0
+    return elapsed / polls * 1000, (_cpu_seconds(proc) - cpu0) / polls * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--patients", type=int, default=20_000)
+    parser.add_argument("--slots", type=int, default=20_000)
+    parser.add_argument("--polls", type=int, default=200)
+    args = parser.parse_args()
+
+    slots_step = {"clinic": "bench", "action": "list_available_slots",
+                  "parameters": {"limit": 500}}
+    patients_step = {"clinic": "bench", "action": "list_patients", "parameters": {}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = _write_clinic(Path(tmp), args.patients, args.slots)
+        proc = _start(config)
+        try:
+            registry = {"bench": URL}
+            print("=" * 78)
+            print(f"  BENCH: polling with conditional reads ({args.patients} patients, "
+                  f"{args.slots} slots, {args.polls} polls)")
+            print("=" * 78)
+            print(f"  {'read':<30} {'mode':<12} {'ms/poll':>8} {'bytes/poll':>11} "
+                  f"{'server CPU ms':>14}")
+            for label, step in (("list_available_slots (500)", slots_step),
+                                ("list_patients", patients_step)):
+                full, cond = Router(registry, cache_size=0), Router(registry)
+                # O Router não repassa o etag: lido direto do servidor.
+                etag = _post(step["action"], step["parameters"]).json()["result"]["etag"]
+                sizes = {"full": _wire_bytes(step["action"], step["parameters"]),
+                         "conditional": _wire_bytes(step["action"], step["parameters"], etag)}
+                for mode, router in (("full", full), ("conditional", cond)):
+                    ms, cpu = _poll(proc, router, step, args.polls)
+                    print(f"  {label:<30} {mode:<12} {ms:>8.2f} {sizes[mode]:>11} {cpu:>14.2f}")
+
+            # A agenda muda a cada 10 leituras: só essas buscam a listagem de novo.
+            free = Router(registry, cache_size=0).dispatch(
+                {**slots_step, "parameters": {"limit": args.polls}}).result["available_slots"]
+
+            def book_every_10(i: int) -> None:
+                if i % 10 == 0:
+                    s = free[i // 10]
+                    requests.post(URL, timeout=30, json={
+                        "jsonrpc": "2.0", "id": "w", "method": "tools/call",
+                        "params": {"name": "book_appointment", "arguments": {
+                            "doctor": s["doctor"], "date": s["date"], "time": s["time"],
+                            "patient_name": "Bench", "cpf": CPF}}})
+
+            cond = Router(registry)
+            ms, cpu = _poll(proc, cond, slots_step, args.polls, book_every_10)
+            print(f"  {'slots, 1 booking / 10 polls':<30} {'conditional':<12} {ms:>8.2f} "
+                  f"{'-':>11} {cpu:>14.2f}   "
+                  f"(hits {cond.cache_stats['hits']}, refetches {cond.cache_stats['misses']})")
+            print("=" * 78)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Benchmark: MCP envelope handling vs handler cost per request
+=============================================================
+Measures, in-process, the CPU one Router → clinic → Router hop spends on
+the JSON-RPC envelope, next to the handler that does the actual work:
+
+  pydantic — the former path: ``MCPRequest(...).model_dump()`` on the
+             Router, FastAPI's ``response_model`` validation + JSON
+             serialization on the clinic, ``MCPResponse(**resp.json())``
+             back on the Router
+  lean     — ``shared/mcp_types.py`` codec: ``request_to_dict``, the
+             endpoint's own encoding (``shared/wire.py``) and
+             ``parse_response`` over the decoded body
+
+HTTP and the request body parsing (identical in both) are left out.
+Reads: ``list_available_slots`` at several page sizes over a synthetic
+schedule and ``list_patients`` over a synthetic patient file.  Times are
+process CPU time per request, best of ``--repeat`` runs.
+
+Usage:
+    python3 tests/bench_envelope.py [--patients 10000] [--repeat 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+# ---------------------------------------------------------------------------
+# Ensure project root is importable
+# ---------------------------------------------------------------------------
+_project_root = Path(__file__).resolve().parents[1]
+if str(_project_root) not in sys.path:
+    sys.path.insert(0, str(_project_root))
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+
+from shared import db, wire  # noqa: E402
+from shared.clinic_app import Clinic, ClinicConfig, MCPReply, _render  # noqa: E402
+from shared.mcp_types import (  # noqa: E402
+    MCPRequest,
+    MCPResponse,
+    parse_response,
+    request_to_dict,
+)
+from shared.patient_store import write_ndjson  # noqa: E402
+
+
+def _write_clinic(root: Path, patients: int) -> ClinicConfig:
+    times = [f"{h:02d}:{m:02d}" for h in range(8, 16) for m in (0, 30)]
+    schedule = [{"doctor": f"Dr. Bench {d}", "specialty": "Cardiology",
+                 "date": f"2030-{1 + day // 28:02d}-{1 + day % 28:02d}", "time": t,
+                 "available": True, "patient_name": None, "cpf": None}
+                for day in range(56) for d in range(10) for t in times]
+    (root / "db.json").write_text(json.dumps({"slots": schedule}), encoding="utf-8")
+    write_ndjson(root / "patients.ndjson", (
+        {"patient_id": f"CARD-{i:06d}", "name": f"Paciente {i}", "age": 20 + i % 70,
+         "condition": "Hypertension" if i % 3 else "Arrhythmia"}
+        for i in range(patients)))
+    return ClinicConfig({"id": "bench", "specialty": "Cardiology",
+                         "db": "db.json", "patients": "patients.ndjson"}, root)
+
+
+def _best(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.process_time()
+        fn()
+        best = min(best, time.process_time() - t0)
+    return best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--patients", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    # O campo de resposta que o FastAPI usava: response_model=MCPReply.
+    app = FastAPI()
+
+    @app.post("/mcp", response_model=MCPReply)
+    async def endpoint() -> None: ...
+
+    response_field = next(r for r in app.routes if getattr(r, "path", "") == "/mcp").response_field
+    loop = asyncio.new_event_loop()
+
+    os.environ["CLINIC_DB_BACKEND"] = "memory"
+    with tempfile.TemporaryDirectory() as tmp:
+        clinic = Clinic(_write_clinic(Path(tmp), args.patients))
+        reads = [(f"list_available_slots ({n})", "list_available_slots", {"limit": n})
+                 for n in (10, 100, 500)]
+        reads.append((f"list_patients ({args.patients})", "list_patients", {}))
+
+        print("=" * 78)
+        print("  BENCH: envelope CPU per request (ms), pydantic vs lean codec")
+        print("=" * 78)
+        print(f"  {'read':<28} {'handler':>8} {'pydantic':>9} {'lean':>8} "
+              f"{'pydantic %':>11} {'lean %':>7}")
+        try:
+            for label, tool, arguments in reads:
+                step = {"name": tool, "arguments": arguments}
+                reply = clinic.call(MCPRequest(id="b", method="tools/call", params=step))
+                body = wire.dumps_json(reply.model_dump())
+
+                handler = _best(lambda: clinic.call(
+                    MCPRequest(id="b", method="tools/call", params=step)), args.repeat)
+
+                def pydantic() -> None:
+                    MCPRequest(id="b", method="tools/call", params=step).model_dump()
+                    loop.run_until_complete(serialize_response(
+                        field=response_field, response_content=reply, dump_json=True))
+                    MCPResponse(**json.loads(body))
+
+                def lean() -> None:
+                    request_to_dict(MCPRequest(id="b", method="tools/call", params=step))
+                    _render(reply, None, None)
+                    parse_response(wire.decode(body, wire.JSON))
+
+                old, new = _best(pydantic, args.repeat), _best(lean, args.repeat)
+                print(f"  {label:<28} {handler:>8.2f} {old:>9.2f} {new:>8.2f} "
+                      f"{old / (old + handler):>10.0%} {new / (new + handler):>7.0%}")
+        finally:
+            db.close_stores()
+            loop.close()
+    print("=" * 78)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Benchmark: read latency while writes run concurrently
+======================================================
+Starts a real clinic MCP server (``python -m shared.clinic_app``) over a
+synthetic schedule and measures ``list_available_slots`` latency from
+reader threads while writer threads keep booking slots, in two modes:
+
+  inline — ``CLINIC_HANDLER_THREADS=0``: handlers run on the event loop,
+           so every blocking write stalls all other requests
+  pool   — handlers run in the bounded thread pool (default 16 threads)
+
+Writes use a durable backend (``group`` by default: each booking waits
+for its snapshot fsync; ``json`` rewrites the whole db.json), which is
+exactly the blocking work that used to run on the event loop.
+
+Each run uses a temporary copy of the data, so the real clinic data is
+never touched.
+
+Usage:
+    python3 tests/bench_event_loop.py [--backend group] [--slots 20000]
+                                      [--readers 8] [--writers 4] [--seconds 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+# ---------------------------------------------------------------------------
+# Ensure project root is importable
+# ---------------------------------------------------------------------------
+_project_root = Path(__file__).resolve().parents[1]
+if str(_project_root) not in sys.path:
+    sys.path.insert(0, str(_project_root))
+
+PORT = 8117
+MODES = {"inline": "0", "pool": "16"}
+
+
+def _synthetic_slots(count: int) -> list[dict]:
+    """``count`` free slots: 10 doctors x days x 16 times a day."""
+    slots = []
+    times = [f"{h:02d}:{m:02d}" for h in range(8, 16) for m in (0, 30)]
+    day = 0
+    while len(slots) < count:
+        date = f"{2026 + day // 336}-{1 + day // 28 % 12:02d}-{1 + day % 28:02d}"
+        for doc in range(10):
+            for t in times:
+                slots.append({
+                    "doctor": f"Dr. Bench {doc}", "specialty": "Cardiology",
+                    "date": date, "time": t, "available": True,
+                    "patient_name": None, "cpf": None,
+                })
+        day += 1
+    return slots[:count]
+
+
+def _write_clinic(root: Path, slots: list[dict]) -> Path:
+    (root / "db.json").write_text(json.dumps({"slots": slots}), encoding="utf-8")
+    (root / "patients.ndjson").write_text("", encoding="utf-8")
+    config = root / "clinics.json"
+    config.write_text(json.dumps({"clinics": [{
+        "id": "bench", "specialty": "Cardiology",
+        "db": "db.json", "patients": "patients.ndjson",
+    }]}), encoding="utf-8")
+    return config
+
+
+def _start(config: Path, backend: str, threads: str) -> subprocess.Popen:
+    env = dict(os.environ, CLINIC_DB_BACKEND=backend, CLINIC_HANDLER_THREADS=threads,
+               PYTHONPATH=str(_project_root))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "shared.clinic_app", "--config", str(config),
+         "--clinic", "bench", "--host", "127.0.0.1", "--port", str(PORT)],
+        cwd=str(_project_root), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            if s.connect_ex(("127.0.0.1", PORT)) == 0:
+                return proc
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("clinic server did not start")
+
+
+def _call(session: requests.Session, tool: str, **arguments) -> dict:
+    body = {"jsonrpc": "2.0", "id": "b", "method": "tools/call",
+            "params": {"name": tool, "arguments": arguments}}
+    return session.post(f"http://127.0.0.1:{PORT}/mcp", json=body, timeout=60).json()
+
+
+def _run(slots: list[dict], args: argparse.Namespace, threads: str) -> dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        proc = _start(_write_clinic(Path(tmp), slots), args.backend, threads)
+        try:
+            stop = threading.Event()
+            latencies: list[float] = []
+            writes = [0]
+            lock = threading.Lock()
+
+            def reader() -> None:
+                session = requests.Session()
+                while not stop.is_set():
+                    t0 = time.perf_counter()
+                    _call(session, "list_available_slots", limit=10)
+                    elapsed = time.perf_counter() - t0
+                    with lock:
+                        latencies.append(elapsed)
+
+            def writer(offset: int) -> None:
+                session = requests.Session()
+                i = offset
+                while not stop.is_set() and i < len(slots):
+                    s = slots[i]
+                    _call(session, "book_appointment", doctor=s["doctor"], date=s["date"],
+                          time=s["time"], patient_name="Bench", cpf="000.000.000-00")
+                    with lock:
+                        writes[0] += 1
+                    i += args.writers
+
+            workers = ([threading.Thread(target=reader) for _ in range(args.readers)]
+                       + [threading.Thread(target=writer, args=(w,)) for w in range(args.writers)])
+            for w in workers:
+                w.start()
+            time.sleep(args.seconds)
+            stop.set()
+            for w in workers:
+                w.join()
+        finally:
+            proc.terminate()
+            proc.wait(timeout=10)
+
+    latencies.sort()
+    return {
+        "reads": len(latencies),
+        "writes": writes[0],
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "max": latencies[-1] * 1000,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--backend", default="group")
+    parser.add_argument("--slots", type=int, default=20_000)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    slots = _synthetic_slots(args.slots)
+    print("=" * 65)
+    print(f"  BENCH: read latency under writes ({args.backend}, {args.slots} slots, "
+          f"{args.readers}R/{args.writers}W)")
+    print("=" * 65)
+    print(f"  {'mode':<8} {'reads':>7} {'writes':>7} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for mode, threads in MODES.items():
+        r = _run(slots, args, threads)
+        print(f"  {mode:<8} {r['reads']:>7} {r['writes']:>7} {r['p50']:>9.1f} "
+              f"{r['p99']:>9.1f} {r['max']:>9.1f}")
+    print("=" * 65)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Benchmark: durable bookings per second under concurrency
+=========================================================
+Measures booking throughput with 1, 8 and 64 concurrent clients for the
+backends that acknowledge a booking only after it reached disk:
+
+  json    — read-modify-write of the whole db.json under one lock
+  journal — one fsync'd journal append per booking
+  group   — group commit: one snapshot write (temp + fsync + rename)
+            acknowledges every booking that arrived in the batch window
+
+Each run uses a synthetic db.json in a temporary directory, so the real
+clinic data is never touched.  No servers are started.
+
+Usage:
+    python3 tests/bench_group_commit.py [--slots 2000] [--bookings 256]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# ---------------------------------------------------------------------------
+# Ensure project root is importable
+# ---------------------------------------------------------------------------
+_project_root = Path(__file__).resolve().parents[1]
+if str(_project_root) not in sys.path:
+    sys.path.insert(0, str(_project_root))
+
+from shared.slot_store import (  # noqa: E402
+    GroupCommitSlotStore,
+    JournalSlotStore,
+    JsonSlotStore,
+    SlotStore,
+)
+
+BACKENDS = {
+    "json": JsonSlotStore,
+    "journal": JournalSlotStore,
+    "group": GroupCommitSlotStore,
+}
+CLIENTS = [1, 8, 64]
+
+
+def _synthetic_slots(count: int) -> list[dict]:
+    """Generate ``count`` free slots: 10 doctors x days x 16 times a day."""
+    slots = []
+    times = [f"{h:02d}:{m:02d}" for h in range(8, 16) for m in (0, 30)]
+    day = 0
+    while len(slots) < count:
+        date = f"2026-{1 + day // 28:02d}-{1 + day % 28:02d}"
+        for doc in range(10):
+            for t in times:
+                slots.append({
+                    "doctor": f"Dr. Medico {doc:02d}", "specialty": "Bench",
+                    "date": date, "time": t, "available": True,
+                    "patient_name": None, "cpf": None,
+                })
+        day += 1
+    return slots[:count]
+
+
+def _run(store: SlotStore, targets: list[dict], clients: int) -> float:
+    """Book every target slot using ``clients`` threads; return bookings/s."""
+    chunks = [targets[i::clients] for i in range(clients)]
+    start = threading.Barrier(clients + 1)
+
+    def worker(chunk: list[dict]) -> None:
+        start.wait()
+        for s in chunk:
+            assert store.book(s["doctor"], s["date"], s["time"],
+                              "Paciente Bench", "000.000.000-00")
+
+    threads = [threading.Thread(target=worker, args=(c,)) for c in chunks]
+    for t in threads:
+        t.start()
+    t0 = time.perf_counter()
+    start.wait()
+    for t in threads:
+        t.join()
+    return len(targets) / (time.perf_counter() - t0)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--slots", type=int, default=2000)
+    parser.add_argument("--bookings", type=int, default=256)
+    args = parser.parse_args()
+
+    slots = _synthetic_slots(args.slots)
+    targets = slots[:: max(1, len(slots) // args.bookings)][: args.bookings]
+
+    print("=" * 65)
+    print(f"  BENCH: durable bookings/s ({args.slots} slots, "
+          f"{len(targets)} bookings per run)")
+    print("=" * 65)
+    print(f"  {'backend':<10}" + "".join(f"{c:>10} cli" for c in CLIENTS))
+
+    for name, factory in BACKENDS.items():
+        row = []
+        for clients in CLIENTS:
+            with tempfile.TemporaryDirectory() as tmp:
+                db_path = Path(tmp) / "db.json"
+                db_path.write_text(json.dumps({"slots": slots}), encoding="utf-8")
+                store = factory(db_path)
+                try:
+                    row.append(_run(store, targets, clients))
+                finally:
+                    store.close()
+        print(f"  {name:<10}" + "".join(f"{r:>14.0f}" for r in row))
+    print("=" * 65)
+
+
+if __name__ == "__main__":
+    main()
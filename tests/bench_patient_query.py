@@ -0,0 +1,158 @@
+"""
+Benchmark: patient silo startup, lookup and free-text query
+============================================================
+Builds a synthetic clinic (100k patients by default, NDJSON) and measures:
+
+  startup  — ``Clinic(config)`` on a fresh file (one scan to build the
+             offset index) and on the next start (index read from
+             ``patients.ndjson.idx``), plus the memory a start holds
+  lookup   — ``get_patient`` on a cold id (one line read from disk) and
+             on a hot one (LRU cache)
+  query    — the ``query`` tool two ways:
+               scan  — the former handler, ``query.lower() in str(p).lower()``
+                       over every record, per query
+               index — ``shared.patient_index.PatientIndex`` (accent-folded
+                       terms, prefix match), built on the first query
+
+Also reports the cost of picking up a one-record edit to the patient
+file.  Each run uses a temporary patient file; no clinic data is touched.
+
+Usage:
+    python3 tests/bench_patient_query.py [--patients 100000] [--repeat 20]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# ---------------------------------------------------------------------------
+# Ensure project root is importable
+# ---------------------------------------------------------------------------
+_project_root = Path(__file__).resolve().parents[1]
+if str(_project_root) not in sys.path:
+    sys.path.insert(0, str(_project_root))
+
+from shared.clinic_app import Clinic, ClinicConfig  # noqa: E402
+from shared.patient_store import write_ndjson  # noqa: E402
+
+FIRST = ["Maria", "João", "Ana", "José", "Lúcia", "Antônio", "Cecília", "Sérgio",
+         "Fernanda", "Paulo", "Beatriz", "Márcio", "Helena", "Tomás", "Inês", "Caio"]
+LAST = ["Silva", "Pereira", "Costa", "Araújo", "Gonçalves", "Sousa", "Lima", "Barbosa",
+        "Ribeiro", "Conceição", "Fernandes", "Azevedo", "Magalhães", "Brandão"]
+CONDITIONS = ["Hypertension", "Arrhythmia", "Heart Failure — NYHA Class II",
+              "Coronary artery disease", "Atrial fibrillation", "Mitral valve prolapse",
+              "Cardiomyopathy", "Angina pectoris", "Pericarditis", "Endocarditis"]
+
+# From selective to broad.
+QUERIES = ["CARD-004217", "magalhaes", "pericard", "joao pereira", "hypertension", "a"]
+
+
+def _synthetic_patients(count: int) -> list[dict]:
+    rng = random.Random(42)
+    return [
+        {
+            "patient_id": f"CARD-{i:06d}",
+            "name": f"{rng.choice(FIRST)} {rng.choice(LAST)} {rng.choice(LAST)}",
+            "age": rng.randint(18, 95),
+            "condition": rng.choice(CONDITIONS),
+            "last_bp": f"{rng.randint(100, 180)}/{rng.randint(60, 110)} mmHg",
+            "next_appointment": f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        }
+        for i in range(count)
+    ]
+
+
+def _scan(patients: list[dict], query: str) -> list[dict]:
+    query_lower = query.lower()
+    return [
+        {"patient_id": p["patient_id"], "condition": p["condition"]}
+        for p in patients
+        if query_lower in str(p).lower()
+    ]
+
+
+def _start(config: ClinicConfig) -> tuple[Clinic, float]:
+    t0 = time.perf_counter()
+    clinic = Clinic(config)
+    return clinic, time.perf_counter() - t0
+
+
+def _held_by_start(config: ClinicConfig) -> int:
+    """Bytes still allocated by one clinic start (``tracemalloc``; slower, not timed)."""
+    tracemalloc.start()
+    clinic = Clinic(config)  # noqa: F841 — kept alive while measuring
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return held
+
+
+def _timed(fn, repeat: int) -> tuple[float, object]:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - t0) / repeat * 1000, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--patients", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    patients = _synthetic_patients(args.patients)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "patients.ndjson"
+        write_ndjson(path, patients)
+        config = ClinicConfig({"id": "bench", "specialty": "Cardiology",
+                               "db": "db.json", "patients": "patients.ndjson"}, Path(tmp))
+
+        print("=" * 65)
+        print(f"  BENCH: patient silo ({args.patients} patients)")
+        print("=" * 65)
+        _, cold_s = _start(config)
+        clinic, warm_s = _start(config)
+        print(f"  start, new file (scan + write offset index): {cold_s * 1000:>7.0f} ms")
+        print(f"  start, offset index reused:                  {warm_s * 1000:>7.0f} ms "
+              f"({_held_by_start(config) / 2**20:.0f} MiB held)")
+
+        get = clinic.tools["get_patient"]
+        ids = [p["patient_id"] for p in random.Random(7).sample(patients, 200)]
+        t0 = time.perf_counter()
+        for pid in ids:
+            get(patient_id=pid)
+        cold_us = (time.perf_counter() - t0) / len(ids) * 1e6
+        hot_us, _ = _timed(lambda: [get(patient_id=pid) for pid in ids], args.repeat)
+        print(f"  get_patient: cold {cold_us:.0f} us, cached {hot_us * 1000 / len(ids):.0f} us")
+
+        query = clinic.tools["query"]
+        t0 = time.perf_counter()
+        query(query="warmup")
+        print(f"  first query (builds the search index):       {time.perf_counter() - t0:>7.2f} s")
+        print()
+        print(f"  {'query':<16} {'matches':>8} {'scan ms':>10} {'index ms':>10} {'speedup':>9}")
+        for q in QUERIES:
+            scan_ms, _ = _timed(lambda: _scan(patients, q), max(1, args.repeat // 10))
+            index_ms, result = _timed(lambda: query(query=q), args.repeat)
+            print(f"  {q!r:<16} {len(result['matches']):>8} {scan_ms:>10.2f} "
+                  f"{index_ms:>10.3f} {scan_ms / index_ms:>8.0f}x")
+
+        # Edit one record: the next query rereads the file and reindexes only it.
+        patients[0]["condition"] = "Kawasaki disease"
+        write_ndjson(path, patients)
+        t0 = time.perf_counter()
+        found = query(query="kawasaki")["matches"]
+        reload_ms = (time.perf_counter() - t0) * 1000
+        print()
+        print(f"  one-record edit picked up on next query: {reload_ms:.0f} ms "
+              f"(rescan + diff; {len(found)} match)")
+        print("=" * 65)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Benchmark: in-memory footprint of the slot store layouts
+=========================================================
+Compares the memory held by the two in-memory layouts for the same
+synthetic schedule:
+
+  dicts   — one 7-key dict per slot, plus the hash index
+            (lower(doctor), date, time) -> slot and the list sorted by
+            (date, time, doctor) that the memory store used before
+  compact — ``shared.slot_table.SlotTable``: interned doctor/specialty
+            ids, epoch-minute timestamps, ``array('B')`` availability,
+            integer-keyed hash index and an ``array('I')`` sorted index
+
+Memory is measured with ``tracemalloc`` (bytes still allocated after the
+structure is built), so the numbers exclude the interpreter itself.  No
+files are read or written.
+
+Usage:
+    python3 tests/bench_slot_memory.py [--sizes 100000 1000000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+# ---------------------------------------------------------------------------
+# Ensure project root is importable
+# ---------------------------------------------------------------------------
+_project_root = Path(__file__).resolve().parents[1]
+if str(_project_root) not in sys.path:
+    sys.path.insert(0, str(_project_root))
+
+from shared.slot_store import sort_key  # noqa: E402
+from shared.slot_table import SlotTable  # noqa: E402
+
+DOCTORS = 50
+TIMES = [f"{h:02d}:{m:02d}" for h in range(8, 18) for m in (0, 30)]
+
+
+def _synthetic_slots(count: int) -> list[dict]:
+    """``count`` slots over 50 doctors, 20 times a day; 1 in 4 is booked."""
+    slots: list[dict] = []
+    day = 0
+    while len(slots) < count:
+        date = f"{2026 + day // 336}-{1 + day // 28 % 12:02d}-{1 + day % 28:02d}"
+        for doc in range(DOCTORS):
+            for t in TIMES:
+                booked = len(slots) % 4 == 0
+                slots.append({
+                    "doctor": f"Dr. Medico {doc:02d}",
+                    "specialty": f"Especialidade {doc % 5}",
+                    "date": date, "time": t, "available": not booked,
+                    "patient_name": f"Paciente {len(slots)}" if booked else None,
+                    "cpf": f"{len(slots):011d}" if booked else None,
+                })
+        day += 1
+    return slots[:count]
+
+
+def _build_dicts(raw: list[dict]) -> Any:
+    slots = [dict(s) for s in raw]
+    index = {}
+    for s in slots:
+        index.setdefault((s["doctor"].lower(), s["date"], s["time"]), s)
+    ordered = sorted(index.values(), key=sort_key)
+    return slots, index, [sort_key(s) for s in ordered], ordered
+
+
+def _build_compact(raw: list[dict]) -> Any:
+    return SlotTable.from_slots(raw)
+
+
+def _measure(build: Callable[[list[dict]], Any], raw: list[dict]) -> tuple[int, float]:
+    """Return (bytes held by the built structure, build seconds)."""
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    built = build(raw)
+    elapsed = time.perf_counter() - t0
+    gc.collect()
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del built
+    return size, elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print("=" * 65)
+    print("  BENCH: in-memory slot layouts (tracemalloc)")
+    print("=" * 65)
+    print(f"  {'slots':>10} {'layout':<8} {'MiB':>10} {'bytes/slot':>12} {'build s':>9}")
+
+    for size in args.sizes:
+        raw = _synthetic_slots(size)
+        results = {}
+        for name, build in (("dicts", _build_dicts), ("compact", _build_compact)):
+            used, elapsed = _measure(build, raw)
+            results[name] = used
+            print(f"  {size:>10} {name:<8} {used / 2**20:>10.1f} "
+                  f"{used / size:>12.0f} {elapsed:>9.2f}")
+        print(f"  {'':>10} ratio    {results['dicts'] / results['compact']:>10.1f}x")
+        del raw
+    print("=" * 65)
+
+
+if __name__ == "__main__":
+    main()
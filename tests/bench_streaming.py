@@ -0,0 +1,188 @@
+"""
+Benchmark: plain vs streamed (NDJSON) listings of a large clinic
+=================================================================
+Starts a real clinic MCP server (``python -m shared.clinic_app``) over a
+synthetic clinic and lists every patient and every free slot two ways:
+
+  plain   — ``Router.dispatch``: one JSON envelope with the whole list
+            (slots come in pages of at most 500, so the full schedule
+            takes one request per page, following ``next_cursor``)
+  stream  — ``Router.dispatch_stream``: one request, items consumed as
+            they arrive and dropped (``Accept: application/x-ndjson``)
+
+Reports time to the first item, total time, the client's peak Python
+memory (``tracemalloc``) and the server's peak RSS growth while serving
+(``VmHWM`` from /proc, fresh server per measurement, so Linux only).
+
+Each run uses a temporary copy of the data, so the real clinic data is
+never touched.
+
+Usage:
+    python3 tests/bench_streaming.py [--patients 200000] [--slots 100000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+# ---------------------------------------------------------------------------
+# Ensure project root is importable
+# ---------------------------------------------------------------------------
+_project_root = Path(__file__).resolve().parents[1]
+if str(_project_root) not in sys.path:
+    sys.path.insert(0, str(_project_root))
+
+from orchestrator_host.router import Router  # noqa: E402
+from shared.patient_store import write_ndjson  # noqa: E402
+
+PORT = 8118
+
+
+def _write_clinic(root: Path, patients: int, slots: int) -> Path:
+    times = [f"{h:02d}:{m:02d}" for h in range(8, 16) for m in (0, 30)]
+    schedule = []
+    day = 0
+    while len(schedule) < slots:
+        date = f"{2030 + day // 336}-{1 + day // 28 % 12:02d}-{1 + day % 28:02d}"
+        schedule += [{"doctor": f"Dr. Bench {d}", "specialty": "Cardiology", "date": date,
+                      "time": t, "available": True, "patient_name": None, "cpf": None}
+                     for d in range(10) for t in times]
+        day += 1
+    (root / "db.json").write_text(json.dumps({"slots": schedule[:slots]}), encoding="utf-8")
+    write_ndjson(root / "patients.ndjson", (
+        {"patient_id": f"CARD-{i:06d}", "name": f"Paciente {i}", "age": 20 + i % 70,
+         "condition": "Hypertension" if i % 3 else "Arrhythmia"}
+        for i in range(patients)))
+    config = root / "clinics.json"
+    config.write_text(json.dumps({"clinics": [{
+        "id": "bench", "specialty": "Cardiology",
+        "db": "db.json", "patients": "patients.ndjson",
+    }]}), encoding="utf-8")
+    return config
+
+
+def _start(config: Path) -> subprocess.Popen:
+    env = dict(os.environ, CLINIC_DB_BACKEND="memory", PYTHONPATH=str(_project_root))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "shared.clinic_app", "--config", str(config),
+         "--clinic", "bench", "--host", "127.0.0.1", "--port", str(PORT)],
+        cwd=str(_project_root), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            if s.connect_ex(("127.0.0.1", PORT)) == 0:
+                return proc
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("clinic server did not start")
+
+
+def _kib(proc: subprocess.Popen, field: str) -> int:
+    for line in Path(f"/proc/{proc.pid}/status").read_text().splitlines():
+        if line.startswith(field + ":"):
+            return int(line.split()[1])
+    return 0
+
+
+def _plain_patients(router: Router, mark: Callable[[], None]) -> int:
+    response = router.dispatch({"clinic": "bench", "action": "list_patients"})
+    mark()
+    return len(response.result["patients"])
+
+
+def _stream_patients(router: Router, mark: Callable[[], None]) -> int:
+    count = 0
+    for _ in router.dispatch_stream({"clinic": "bench", "action": "list_patients"}):
+        if not count:
+            mark()
+        count += 1
+    return count
+
+
+def _plain_slots(router: Router, mark: Callable[[], None]) -> int:
+    count, cursor = 0, ""
+    while True:
+        params = {"limit": 500, **({"cursor": cursor} if cursor else {})}
+        result = router.dispatch({"clinic": "bench", "action": "list_available_slots",
+                                  "parameters": params}).result
+        if not count:
+            mark()
+        count += len(result["available_slots"])
+        cursor = result.get("next_cursor", "")
+        if not cursor:
+            return count
+
+
+def _stream_slots(router: Router, mark: Callable[[], None]) -> int:
+    count = 0
+    for _ in router.dispatch_stream({"clinic": "bench", "action": "list_available_slots"}):
+        if not count:
+            mark()
+        count += 1
+    return count
+
+
+def _measure(config: Path, run: Callable[[Router, Callable[[], None]], int]) -> dict[str, float]:
+    proc = _start(config)
+    try:
+        router = Router({"bench": f"http://127.0.0.1:{PORT}/mcp"})
+        # Aquece (store aberto, índices carregados) antes de medir o pico.
+        router.dispatch({"clinic": "bench", "action": "list_available_slots",
+                         "parameters": {"limit": 1}})
+        router.dispatch({"clinic": "bench", "action": "get_patient",
+                         "parameters": {"patient_id": "CARD-000000"}})
+        server_before = _kib(proc, "VmRSS")
+
+        first: list[float] = []
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        count = run(router, lambda: first.append(time.perf_counter() - t0))
+        total = time.perf_counter() - t0
+        client_peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        server_peak = _kib(proc, "VmHWM") - server_before
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+    return {"count": count, "first": first[0] * 1000, "total": total * 1000,
+            "client": client_peak / 2**20, "server": max(server_peak, 0) / 1024}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--patients", type=int, default=200_000)
+    parser.add_argument("--slots", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = _write_clinic(Path(tmp), args.patients, args.slots)
+        print("=" * 78)
+        print(f"  BENCH: plain vs streamed listings ({args.patients} patients, "
+              f"{args.slots} slots)")
+        print("=" * 78)
+        print(f"  {'listing':<22} {'items':>7} {'first ms':>9} {'total ms':>9} "
+              f"{'client MiB':>11} {'server MiB':>11}")
+        for label, run in (("list_patients plain", _plain_patients),
+                           ("list_patients stream", _stream_patients),
+                           ("slots plain (paged)", _plain_slots),
+                           ("slots stream", _stream_slots)):
+            r = _measure(config, run)
+            print(f"  {label:<22} {r['count']:>7} {r['first']:>9.1f} {r['total']:>9.0f} "
+                  f"{r['client']:>11.2f} {r['server']:>11.1f}")
+        print("=" * 78)
+
+
+if __name__ == "__main__":
+    main()
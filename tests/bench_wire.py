@@ -0,0 +1,104 @@
+"""
+Benchmark: wire codecs for MCP responses
+========================================
+Encodes a ``list_available_slots`` response (the JSON-RPC envelope with N
+free slots, as ``shared/db.py`` returns them) with every body encoding and
+compression that ``shared/wire.py`` offers, and reports for each:
+
+  bytes   — size on the wire (body after compression)
+  enc ms  — server side: body encoding + compression (``wire.render``)
+  dec ms  — client side: decompression + decoding back to Python objects
+
+Encode/decode times are process CPU time, best of ``--repeat`` runs.
+Codecs whose package is not installed (``msgpack``, ``cbor2``,
+``zstandard``) are listed as such.  No server is started: this isolates
+the codec cost from HTTP and the handlers.
+
+Usage:
+    python3 tests/bench_wire.py [--sizes 100,10000,100000] [--repeat 5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+# ---------------------------------------------------------------------------
+# Ensure project root is importable
+# ---------------------------------------------------------------------------
+_project_root = Path(__file__).resolve().parents[1]
+if str(_project_root) not in sys.path:
+    sys.path.insert(0, str(_project_root))
+
+from shared import wire  # noqa: E402
+
+ALL_MEDIA = [wire.JSON, wire.MSGPACK, wire.CBOR]
+ALL_CODINGS = ["identity", "gzip", "zstd"]
+
+
+def _response(slots: int) -> dict[str, Any]:
+    times = [f"{h:02d}:{m:02d}" for h in range(8, 18) for m in (0, 30)]
+    items = []
+    for i in range(slots):
+        day, rest = divmod(i, 10 * len(times))
+        items.append({
+            "doctor": f"Dr. Bench {rest % 10}", "specialty": "Cardiology",
+            "date": f"{2030 + day // 336}-{1 + day // 28 % 12:02d}-{1 + day % 28:02d}",
+            "time": times[rest // 10], "available": True, "version": i % 7,
+        })
+    return {"jsonrpc": "2.0", "id": "0f8fad5b-d9cb-469f-a165-70867728950e", "error": None,
+            "result": {"specialty": "Cardiology", "available_slots": items,
+                       "next_cursor": "", "etag": "5d41402abc4b2a76"}}
+
+
+def _best(fn: Callable[[], Any], repeat: int) -> tuple[float, Any]:
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.process_time()
+        result = fn()
+        best = min(best, time.process_time() - t0)
+    return best * 1000, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--sizes", default="100,10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print("=" * 72)
+    print("  BENCH: wire codecs for a list_available_slots response")
+    print("=" * 72)
+    for size in (int(s) for s in args.sizes.split(",")):
+        response = _response(size)
+        print(f"\n  {size} slots")
+        print(f"  {'body':<22} {'compression':<12} {'bytes':>11} {'enc ms':>9} {'dec ms':>9}")
+        for media in ALL_MEDIA:
+            for coding in ALL_CODINGS:
+                label = media.split("/")[1]
+                if media not in wire.ENCODINGS or (
+                        coding != "identity" and coding not in wire.COMPRESSIONS):
+                    print(f"  {label:<22} {coding:<12} {'(not installed)':>31}")
+                    continue
+                encoding = None if coding == "identity" else coding
+                # Sem limite mínimo aqui: mede a compressão mesmo nas respostas pequenas.
+                wire.COMPRESS_MIN_BYTES = 0
+                enc_ms, (body, headers) = _best(
+                    lambda: wire.render(response, media, encoding), args.repeat)
+
+                def decode() -> Any:
+                    raw = body if encoding is None else wire.COMPRESSIONS[encoding][1](body)
+                    return wire.decode(raw, headers["Content-Type"])
+
+                dec_ms, decoded = _best(decode, args.repeat)
+                assert decoded == response
+                print(f"  {label:<22} {coding:<12} {len(body):>11} {enc_ms:>9.2f} {dec_ms:>9.2f}")
+    print()
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
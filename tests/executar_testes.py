@@ -47,8 +47,8 @@ def main() -> None:
     print("=" * 65)
 
     client, deployment = build_azure_client()
-    planner = Planner(azure_client=client, deployment=deployment)
     router = Router()
+    planner = Planner(azure_client=client, deployment=deployment, router=router)
     verifier = Verifier(azure_client=client, deployment=deployment)
 
     # Carrega os casos de teste
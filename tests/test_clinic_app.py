@@ -0,0 +1,821 @@
+"""
+Test: clinic server factory
+============================
+Checks the config-driven clinic factory (``shared/clinic_app.py``):
+
+  - every clinic in ``clinic_agents/clinics.json`` builds with the same
+    tool set and sees only its own patient file;
+  - the config refuses two clinics sharing a data file;
+  - patients are read lazily from NDJSON through ``PatientStore``: the
+    offset index is reused across restarts, the LRU cache stays bounded
+    and file edits are seen;
+  - ``query`` goes through the inverted patient index: accent-folded,
+    prefix matching on values only, and edits to the patient file are
+    picked up by reindexing just the changed records;
+  - 120 clinics hosted by one app stay isolated from each other
+    (booking in one never changes another's schedule);
+  - the lean envelope codec checks only the envelope and hands ``result``
+    through untouched; endpoints answer already encoded, without FastAPI
+    re-serializing the reply;
+  - a JSON-RPC batch answers in request order and applies its mutations
+    in order (a read after a booking sees it); a malformed element gets
+    its own -32600 while the rest of the batch runs;
+  - with ``Accept: application/x-ndjson`` the listings stream page by page
+    (header line, one item per line, final envelope) and carry the same
+    items as the plain response;
+  - responses follow ``Accept``/``Accept-Encoding``: gzip above the size
+    threshold (streams compressed page by page), every installed body
+    encoding round-trips, and unknown ones fall back to JSON;
+  - read-only tools answer with an ``etag``; sending it back as
+    ``if_none_match`` gets a bare ``not_modified`` until a booking, a hold
+    or a patient file edit changes what the read would return;
+  - ``tools/list`` describes every tool with a JSON Schema taken from the
+    handler's signature, answered from the precomputed buffer, and the
+    planner's tool catalogue is built from it;
+  - a slow handler runs in the handler thread pool and does not hold up
+    other requests on the event loop;
+  - ``python -m shared.clinic_app --all`` serves ``/clinics/{id}/mcp``
+    over HTTP and the Router reaches it through ``gateway_registry``, also
+    with one batch per clinic through ``dispatch_batch``, as a stream
+    through ``dispatch_stream``, with repeated reads answered from the
+    Router's conditional cache and with capabilities cached per clinic
+    until their TTL runs out.
+
+The scale check works on temporary copies of clinic_a's data, and the
+HTTP check only reads, so the real clinic data is never changed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Optional, Union
+
+from pydantic import TypeAdapter
+
+# ---------------------------------------------------------------------------
+# Ensure project root is importable
+# ---------------------------------------------------------------------------
+_project_root = Path(__file__).resolve().parents[1]
+if str(_project_root) not in sys.path:
+    sys.path.insert(0, str(_project_root))
+
+from orchestrator_host.planner import Planner, tool_catalogue  # noqa: E402
+from orchestrator_host.router import Router, gateway_registry  # noqa: E402
+from shared import db, tool_schema, wire  # noqa: E402
+from shared.clinic_app import (  # noqa: E402
+    READ_ONLY_TOOLS,
+    Clinic,
+    ClinicConfig,
+    MCPBody,
+    create_clinic_app,
+    create_multi_clinic_app,
+    load_config,
+)
+from shared.mcp_types import (  # noqa: E402
+    EnvelopeError,
+    MCPRequest,
+    MCPResponse,
+    parse_response,
+    request_to_dict,
+    response_to_dict,
+)
+from shared.patient_index import PatientIndex  # noqa: E402
+from shared.patient_store import PatientStore, write_ndjson  # noqa: E402
+
+CLINIC_DIR = _project_root / "clinic_agents"
+GATEWAY_PORT = 8107
+SCALE = 120
+PATIENT = {"patient_name": "Carlos Teste", "cpf": "123.456.789-00"}
+
+
+def _decode(response):
+    """Envelope(s) of an endpoint's encoded reply, through the lean codec."""
+    body = wire.decode(response.body, response.headers["content-type"])
+    return [parse_response(r) for r in body] if isinstance(body, list) else parse_response(body)
+
+
+def _call(app, clinic_id: str, tool: str, **arguments):
+    """Invoke ``/clinics/{clinic_id}/mcp`` in-process (no HTTP)."""
+    route = next(r for r in app.routes if getattr(r, "path", "") == "/clinics/{clinic_id}/mcp")
+    request = MCPRequest(id="t", method="tools/call",
+                         params={"name": tool, "arguments": arguments})
+    return _decode(asyncio.run(route.endpoint(clinic_id=clinic_id, request=request)))
+
+
+def _read_ndjson(path: Path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines() if line]
+
+
+def _check_config() -> list[tuple[str, bool]]:
+    checks: list[tuple[str, bool]] = []
+    configs = load_config()
+    clinics = [Clinic(c) for c in configs]
+    checks.append((
+        "all six clinics build with the same tool set",
+        [c.id for c in configs] == [f"clinic_{x}" for x in "abcdef"]
+        and len({tuple(c.tools) for c in clinics}) == 1
+        and "changes_since" in clinics[0].tools,
+    ))
+
+    own = True
+    for clinic in clinics:
+        expected = _read_ndjson(clinic.config.patients_path)
+        listed = clinic.tools["list_patients"]()["patients"]
+        own &= [p["patient_id"] for p in listed] == [p["patient_id"] for p in expected]
+    other_id = clinics[1].tools["list_patients"]()["patients"][0]["patient_id"]
+    checks.append((
+        "each clinic sees only its own patients",
+        own and "error" in clinics[0].tools["get_patient"](patient_id=other_id),
+    ))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "clinics.json"
+        entry = {"specialty": "Cardiology", "db": "db.json", "patients": "p.ndjson"}
+        path.write_text(json.dumps({"clinics": [{"id": "x", **entry}, {"id": "y", **entry}]}))
+        try:
+            load_config(path)
+            refused = False
+        except ValueError:
+            refused = True
+    checks.append(("config refuses clinics sharing a data file", refused))
+    return checks
+
+
+def _check_patient_store() -> list[tuple[str, bool]]:
+    checks: list[tuple[str, bool]] = []
+    records = [{"patient_id": f"P-{i:04d}", "name": f"Paciente {i}", "condition": "Asma"}
+               for i in range(1000)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "patients.ndjson"
+        write_ndjson(path, records)
+        first = PatientStore(path, cache_size=2)
+        again = PatientStore(path, cache_size=2)
+        checks.append((
+            "offset index is built once and reused by the next open",
+            first.stats["scans"] == 1 and again.stats["scans"] == 0
+            and len(again) == 1000 and again.get("P-0777") == records[777]
+            and again.get("nope") is None,
+        ))
+
+        for pid in ("P-0001", "P-0002", "P-0001", "P-0003", "P-0001", "P-0002"):
+            again.get(pid)
+        checks.append((
+            "LRU keeps the hot records and evicts the cold ones",
+            again.stats["hits"] == 2 and again.stats["misses"] == 6,
+        ))
+        many = again.get_many(["P-0900", "P-0001", "nobody", "P-0010"])
+        checks.append((
+            "get_many keeps the requested order, skips unknown ids, fills the LRU",
+            [p["patient_id"] for p in many] == ["P-0900", "P-0001", "P-0010"]
+            and again.get("P-0900") is many[0],
+        ))
+
+        records[1]["condition"] = "Bronquite"
+        write_ndjson(path, records[:500])
+        checks.append((
+            "edits to the NDJSON file are picked up",
+            again.get("P-0001")["condition"] == "Bronquite"
+            and again.get("P-0777") is None and len(again) == 500,
+        ))
+    return checks
+
+
+def _check_patient_search() -> list[tuple[str, bool]]:
+    checks: list[tuple[str, bool]] = []
+    records = _read_ndjson(CLINIC_DIR / "clinic_a" / "patients.ndjson")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "patients.ndjson"
+        write_ndjson(path, records)
+        clinic = Clinic(ClinicConfig(
+            {"id": "x", "specialty": "Cardiology", "db": "db.json", "patients": "patients.ndjson"},
+            Path(tmp)))
+
+        def ids(query: str) -> list[str]:
+            return [m["patient_id"] for m in clinic.tools["query"](query=query)["matches"]]
+
+        checks.append((
+            "query folds accents and case, matches term prefixes",
+            ids("joao") == ["CARD-002"] and ids("JOÃO pe") == ["CARD-002"]
+            and ids("hyperten") == ["CARD-001"] and ids("atrial fib") == ["CARD-002"],
+        ))
+        reads = dict(clinic._patients.stats)
+        everyone = ids("")
+        checks.append((
+            "query results are read through the patient store's LRU cache",
+            clinic._patients.stats["hits"] + clinic._patients.stats["misses"]
+            == reads["hits"] + reads["misses"] + len(everyone),
+        ))
+        checks.append((
+            "query ignores field names; empty query lists everyone in file order",
+            ids("condition") == [] and ids("ejection") == []
+            and ids("") == [p["patient_id"] for p in records],
+        ))
+
+        records[0]["condition"] = "Cardiomiopatia"
+        records.append({"patient_id": "CARD-900", "name": "Zé Nova",
+                        "condition": "Hypertension"})
+        write_ndjson(path, records)
+        checks.append((
+            "edits to the patient file are reindexed on the next query",
+            ids("hyperten") == ["CARD-900"] and ids("cardiomiopatia") == ["CARD-001"]
+            and ids("ze") == ["CARD-900"],
+        ))
+
+    index = PatientIndex(records)
+    changed = [dict(p) for p in records]
+    changed[1]["name"] = "João Souza"
+    reindexed = index.sync(changed[:-1])
+    index.remove("CARD-003")
+    checks.append((
+        "sync reindexes only changed records; remove drops terms",
+        reindexed == 2
+        and index.search("souza") == ["CARD-002"]
+        and index.search("pereira") == [] and index.search("costa") == [],
+    ))
+    checks.append((
+        "the index keeps ids and terms, never the records",
+        all(isinstance(terms, frozenset) for terms in index._indexed.values())
+        and "CARD-002" in index and "CARD-003" not in index,
+    ))
+    return checks
+
+
+def _check_many_clinics() -> list[tuple[str, bool]]:
+    checks: list[tuple[str, bool]] = []
+    os.environ["CLINIC_DB_BACKEND"] = "memory"
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        entries = []
+        for i in range(SCALE):
+            folder = root / f"c{i:03d}"
+            folder.mkdir()
+            shutil.copy(CLINIC_DIR / "clinic_a" / "db.json", folder / "db.json")
+            shutil.copy(CLINIC_DIR / "clinic_a" / "patients.ndjson", folder / "patients.ndjson")
+            entries.append({"id": f"c{i:03d}", "specialty": "Cardiology",
+                            "db": f"c{i:03d}/db.json", "patients": f"c{i:03d}/patients.ndjson"})
+        (root / "clinics.json").write_text(json.dumps({"clinics": entries}))
+        try:
+            app = create_multi_clinic_app(load_config(root / "clinics.json"))
+            free = [_call(app, e["id"], "list_available_slots").result["available_slots"]
+                    for e in entries]
+            target = free[0][0]
+            booked = _call(app, "c000", "book_appointment", doctor=target["doctor"],
+                           date=target["date"], time=target["time"], **PATIENT).result
+            after = [_call(app, e["id"], "list_available_slots").result["available_slots"]
+                     for e in entries[:3]]
+            checks.append((
+                f"{SCALE} clinics in one app answer on their own endpoints",
+                len(free) == SCALE and all(f == free[0] for f in free),
+            ))
+            checks.append((
+                "a booking in one clinic leaves the others untouched",
+                booked.get("status") == "confirmed"
+                and len(after[0]) == len(free[0]) - 1
+                and after[1] == free[1] and after[2] == free[2],
+            ))
+            unknown = _call(app, "nope", "list_available_slots")
+            checks.append(("unknown clinic id is a JSON-RPC error", unknown.error is not None))
+        finally:
+            db.close_stores()
+    return checks
+
+
+def _check_envelope() -> list[tuple[str, bool]]:
+    checks: list[tuple[str, bool]] = []
+    result = {"available_slots": [{"doctor": "Dr. A", "time": "09:00"}] * 3}
+    parsed = parse_response({"jsonrpc": "2.0", "id": "r", "result": result})
+    request = MCPRequest(id="q", method="tools/call", params={"name": "query"})
+    checks.append((
+        "envelopes round-trip and pass result through without copying",
+        parsed.result is result and parsed.error is None
+        and response_to_dict(parsed)["result"] is result
+        and response_to_dict(parsed) == MCPResponse(id="r", result=result).model_dump()
+        and request_to_dict(request) == request.model_dump(),
+    ))
+
+    rejected = 0
+    for bad in ([], {"result": 1}, {"id": 7}, {"id": "x", "error": "boom"}):
+        try:
+            parse_response(bad)
+        except EnvelopeError:
+            rejected += 1
+    checks.append(("malformed envelopes are rejected", rejected == 4))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        shutil.copy(CLINIC_DIR / "clinic_a" / "db.json", root / "db.json")
+        shutil.copy(CLINIC_DIR / "clinic_a" / "patients.ndjson", root / "patients.ndjson")
+        app = create_clinic_app(ClinicConfig(
+            {"id": "a", "specialty": "Cardiology", "db": "db.json",
+             "patients": "patients.ndjson"}, root))
+        route = next(r for r in app.routes if getattr(r, "path", "") == "/mcp")
+        reply = asyncio.run(route.endpoint(request=request))
+        checks.append((
+            "plain requests get JSON encoded by the endpoint itself",
+            reply.headers["content-type"] == wire.JSON
+            and "content-encoding" not in reply.headers
+            and _decode(reply).result["specialty"] == "Cardiology",
+        ))
+    return checks
+
+
+def _check_batch() -> list[tuple[str, bool]]:
+    checks: list[tuple[str, bool]] = []
+    os.environ["CLINIC_DB_BACKEND"] = "memory"
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        shutil.copy(CLINIC_DIR / "clinic_a" / "db.json", root / "db.json")
+        shutil.copy(CLINIC_DIR / "clinic_a" / "patients.ndjson", root / "patients.ndjson")
+        (root / "clinics.json").write_text(json.dumps({"clinics": [
+            {"id": "a", "specialty": "Cardiology", "db": "db.json", "patients": "patients.ndjson"},
+        ]}))
+        try:
+            app = create_multi_clinic_app(load_config(root / "clinics.json"))
+            route = next(r for r in app.routes
+                         if getattr(r, "path", "") == "/clinics/{clinic_id}/mcp")
+
+            def batch(*calls: tuple[str, dict]):
+                body = [MCPRequest(id=str(i), method="tools/call",
+                                   params={"name": name, "arguments": args})
+                        for i, (name, args) in enumerate(calls)]
+                return _decode(asyncio.run(route.endpoint(clinic_id="a", request=body)))
+
+            free = _call(app, "a", "list_available_slots").result["available_slots"]
+            target = free[0]
+            slot = {k: target[k] for k in ("doctor", "date", "time")}
+            replies = batch(
+                ("list_available_slots", {}),
+                ("book_appointment", {**slot, **PATIENT}),
+                ("list_my_appointments", {"cpf": PATIENT["cpf"]}),
+                ("list_available_slots", {}),
+                ("query", {"query": "heart"}),
+            )
+            checks.append((
+                "batch answers every request, in order",
+                [r.id for r in replies] == ["0", "1", "2", "3", "4"]
+                and all(r.error is None for r in replies),
+            ))
+            mine = replies[2].result["appointments"]
+            checks.append((
+                "reads after a mutation in the batch see it",
+                len(replies[0].result["available_slots"]) == len(free)
+                and replies[1].result.get("status") == "confirmed"
+                and [(a["doctor"], a["date"], a["time"]) for a in mine]
+                == [(slot["doctor"], slot["date"], slot["time"])]
+                and len(replies[3].result["available_slots"]) == len(free) - 1,
+            ))
+            raw = [
+                {"jsonrpc": "2.0", "id": "ok", "method": "tools/call",
+                 "params": {"name": "list_my_appointments", "arguments": {"cpf": PATIENT["cpf"]}}},
+                {"jsonrpc": "2.0", "id": 7, "params": {"name": "list_available_slots"}},
+                {"jsonrpc": "2.0", "id": "ok2", "method": "tools/call",
+                 "params": {"name": "list_available_slots", "arguments": {}}},
+            ]
+            body = TypeAdapter(MCPBody).validate_python(raw)  # what FastAPI accepts
+            mixed = _decode(asyncio.run(route.endpoint(clinic_id="a", request=body)))
+            checks.append((
+                "a malformed batch element gets -32600; its siblings still run",
+                [r.id for r in mixed] == ["ok", "7", "ok2"]
+                and mixed[1].error["code"] == -32600
+                and mixed[0].error is None and len(mixed[0].result["appointments"]) == 1
+                and mixed[2].error is None and "available_slots" in mixed[2].result,
+            ))
+            empty = _decode(asyncio.run(route.endpoint(clinic_id="a", request=[])))
+            checks.append(("empty batch is an invalid request",
+                           empty.error is not None and empty.error["code"] == -32600))
+        finally:
+            db.close_stores()
+    return checks
+
+
+def _check_streaming() -> list[tuple[str, bool]]:
+    checks: list[tuple[str, bool]] = []
+    os.environ["CLINIC_DB_BACKEND"] = "memory"
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        shutil.copy(CLINIC_DIR / "clinic_a" / "db.json", root / "db.json")
+        write_ndjson(root / "patients.ndjson",
+                     [{"patient_id": f"P-{i:04d}", "condition": "Asma"} for i in range(1200)])
+        clinic = Clinic(ClinicConfig(
+            {"id": "a", "specialty": "Cardiology", "db": "db.json", "patients": "patients.ndjson"},
+            root))
+
+        def stream(tool: str, **arguments) -> list[bytes]:
+            return list(clinic.stream(MCPRequest(
+                id="s", method="tools/call", params={"name": tool, "arguments": arguments})))
+
+        def lines(chunks: list[bytes]) -> list[dict]:
+            return [json.loads(line) for line in b"".join(chunks).splitlines()]
+
+        try:
+            full = clinic.tools["list_available_slots"](limit=db.MAX_SLOT_LIMIT)
+            streamed = lines(stream("list_available_slots"))
+            pages = list(db.iter_available_slots(root / "db.json", "Cardiology", page_size=2))
+            checks.append((
+                "slot stream: header, every free slot, then the envelope",
+                streamed[0] == {"jsonrpc": "2.0", "id": "s", "stream": "available_slots"}
+                and streamed[1:-1] == full["available_slots"]
+                and streamed[-1]["result"] == {"count": len(full["available_slots"])}
+                and len(pages) > 1 and [s for page in pages for s in page] == streamed[1:-1],
+            ))
+
+            chunks = stream("list_patients")
+            checks.append((
+                "patient stream is produced in pages, not as one list",
+                len(chunks) == 2 + 3 and len(lines(chunks)) == 1200 + 2,
+            ))
+
+            bad = lines(stream("list_available_slots", date_from="amanhã"))
+            plain = lines(stream("query", query="x"))
+            checks.append((
+                "invalid filter ends the stream with an error; other tools answer one envelope",
+                len(bad) == 2 and "error" in bad[-1]["result"]
+                and len(plain) == 1 and plain[0]["result"]["matches"] == [],
+            ))
+        finally:
+            db.close_stores()
+    return checks
+
+
+def _check_negotiation() -> list[tuple[str, bool]]:
+    checks: list[tuple[str, bool]] = []
+    os.environ["CLINIC_DB_BACKEND"] = "memory"
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        shutil.copy(CLINIC_DIR / "clinic_a" / "db.json", root / "db.json")
+        write_ndjson(root / "patients.ndjson",
+                     [{"patient_id": f"P-{i:04d}", "condition": "Asma"} for i in range(1200)])
+        (root / "clinics.json").write_text(json.dumps({"clinics": [
+            {"id": "a", "specialty": "Cardiology", "db": "db.json", "patients": "patients.ndjson"},
+        ]}))
+        try:
+            app = create_multi_clinic_app(load_config(root / "clinics.json"))
+            route = next(r for r in app.routes
+                         if getattr(r, "path", "") == "/clinics/{clinic_id}/mcp")
+
+            def post(tool: str, arguments: dict, **headers):
+                request = MCPRequest(id="n", method="tools/call",
+                                     params={"name": tool, "arguments": arguments})
+                return asyncio.run(route.endpoint(clinic_id="a", request=request, **headers))
+
+            async def drain(response) -> bytes:
+                return b"".join([chunk async for chunk in response.body_iterator])
+
+            plain = json.loads(post("list_patients", {}).body)
+            big = post("list_patients", {}, accept_encoding="gzip, deflate")
+            small = post("get_patient", {"patient_id": "P-0001"}, accept_encoding="gzip")
+            checks.append((
+                "gzip above the size threshold, plain below it",
+                big.headers.get("content-encoding") == "gzip"
+                and json.loads(zlib.decompress(big.body, wbits=31)) == plain
+                and len(big.body) < len(json.dumps(plain)) // 5
+                and "content-encoding" not in small.headers
+                and json.loads(small.body)["result"]["patient"]["patient_id"] == "P-0001",
+            ))
+
+            decoded = {}
+            for media in wire.ENCODINGS:
+                reply = post("list_patients", {}, accept=media, accept_encoding="identity")
+                decoded[media] = (reply.headers["content-type"],
+                                  wire.decode(reply.body, reply.headers["content-type"]))
+            unknown = post("list_patients", {}, accept="application/x-nope",
+                           accept_encoding="identity")
+            checks.append((
+                "every installed body encoding round-trips; unknown ones fall back to JSON",
+                all(ctype == media and obj == plain for media, (ctype, obj) in decoded.items())
+                and unknown.headers["content-type"] == wire.JSON
+                and json.loads(unknown.body) == plain,
+            ))
+
+            streamed = post("list_patients", {}, accept="application/x-ndjson",
+                            accept_encoding="gzip")
+            body = asyncio.run(drain(streamed))
+            lines = [json.loads(line) for line in zlib.decompress(body, wbits=31).splitlines()]
+            checks.append((
+                "streams are compressed page by page",
+                streamed.headers.get("content-encoding") == "gzip"
+                and len(lines) == 1200 + 2 and lines[1:-1] == plain["result"]["patients"],
+            ))
+            checks.append((
+                "Accept-Encoding weights are honoured",
+                wire.negotiate("gzip;q=0, identity", wire.COMPRESSIONS) is None
+                and wire.negotiate("br, gzip;q=0.5", wire.COMPRESSIONS) == "gzip"
+                and wire.negotiate("*/*", wire.ENCODINGS) == wire.JSON,
+            ))
+        finally:
+            db.close_stores()
+    return checks
+
+
+def _check_conditional() -> list[tuple[str, bool]]:
+    checks: list[tuple[str, bool]] = []
+    os.environ["CLINIC_DB_BACKEND"] = "memory"
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        shutil.copy(CLINIC_DIR / "clinic_a" / "db.json", root / "db.json")
+        shutil.copy(CLINIC_DIR / "clinic_a" / "patients.ndjson", root / "patients.ndjson")
+        clinic = Clinic(ClinicConfig(
+            {"id": "a", "specialty": "Cardiology", "db": "db.json",
+             "patients": "patients.ndjson"}, root))
+
+        def call(tool: str, **arguments):
+            return clinic.call(MCPRequest(id="c", method="tools/call",
+                                          params={"name": tool, "arguments": arguments})).result
+
+        try:
+            slots = call("list_available_slots")
+            tag = slots["etag"]
+            again = call("list_available_slots", if_none_match=tag)
+            checks.append((
+                "a read carries an etag; sending it back gets not_modified",
+                call("list_available_slots")["etag"] == tag
+                and again == {"not_modified": True, "etag": tag},
+            ))
+            checks.append((
+                "the etag depends on the arguments; mutations carry none",
+                call("list_available_slots", doctor="x")["etag"] != tag
+                and "etag" not in call("cancel_appointment", cpf="nobody"),
+            ))
+
+            first = slots["available_slots"][0]
+            where = {k: first[k] for k in ("doctor", "date", "time")}
+            held = call("hold_slot", **where, **PATIENT)
+            after_hold = call("list_available_slots", if_none_match=tag)
+            call("release_hold", hold_token=held["hold_token"])
+            after_release = call("list_available_slots", if_none_match=after_hold["etag"])
+            call("book_appointment", **where, **PATIENT)
+            after_book = call("list_available_slots", if_none_match=after_release["etag"])
+            checks.append((
+                "holds, releases and bookings each change the etag",
+                len(after_hold["available_slots"]) == len(slots["available_slots"]) - 1
+                and len(after_release["available_slots"]) == len(slots["available_slots"])
+                and len(after_book["available_slots"]) == len(slots["available_slots"]) - 1
+                and len({tag, after_hold["etag"], after_release["etag"], after_book["etag"]}) == 4,
+            ))
+
+            patients = call("list_patients")
+            unchanged = call("list_patients", if_none_match=patients["etag"])
+            records = _read_ndjson(root / "patients.ndjson")
+            records[0]["condition"] = "Kawasaki disease"
+            write_ndjson(root / "patients.ndjson", records)
+            edited = call("list_patients", if_none_match=patients["etag"])
+            checks.append((
+                "patient reads revalidate against the patient file",
+                unchanged.get("not_modified") is True
+                and edited["patients"][0]["condition"] == "Kawasaki disease",
+            ))
+        finally:
+            db.close_stores()
+    return checks
+
+
+def _check_tool_list() -> list[tuple[str, bool]]:
+    checks: list[tuple[str, bool]] = []
+    config = load_config()[0]
+    app = create_clinic_app(config)
+    clinic = app.state.clinic
+    route = next(r for r in app.routes if getattr(r, "path", "") == "/mcp")
+
+    def endpoint(request, **headers):
+        return asyncio.run(route.endpoint(request=request, **headers))
+
+    listed = clinic.call(MCPRequest(id="l", method="tools/list")).result
+    tools = {t["name"]: t for t in listed["tools"]}
+    slots = tools["list_available_slots"]["inputSchema"]
+    bulk = tools["book_appointments_bulk"]["inputSchema"]["properties"]["appointments"]
+    checks.append((
+        "tools/list describes every tool, read-only ones flagged",
+        list(tools) == list(clinic.tools) and listed["clinic"]["id"] == config.id
+        and all(t["description"] and t["inputSchema"]["type"] == "object"
+                and t["annotations"]["readOnlyHint"] == (name in READ_ONLY_TOOLS)
+                for name, t in tools.items()),
+    ))
+    checks.append((
+        "schemas follow the handler signatures (bound and **kwargs left out)",
+        list(slots["properties"]) == ["doctor", "date_from", "date_to", "time_from",
+                                      "time_to", "limit", "cursor"]
+        and slots["properties"]["limit"] == {"type": ["integer", "string"]}
+        and bulk == {"type": "array", "items": {"type": "object"}}
+        and tools["changes_since"]["inputSchema"]["properties"]["seq"]["default"] == 0
+        and "required" not in slots
+        and tools["get_patient"]["inputSchema"]["properties"] == {"patient_id": {"type": "string"}},
+    ))
+    checks.append((
+        "string annotations resolve without evaluating `A | B` (Python 3.9)",
+        tool_schema._resolve("int | str | None", {}) == Optional[Union[int, str]]
+        and tool_schema._resolve("dict[str, Any] | None", {"Any": Any}) == Optional[dict[str, Any]]
+        and tool_schema._split_union("list[int | str] | None") == ["list[int | str]", "None"],
+    ))
+
+    request = MCPRequest(id="spliced", method="tools/list")
+    plain = endpoint(request)
+    gzipped = endpoint(request, accept_encoding="gzip")
+    batch = _decode(endpoint([request, MCPRequest(id="x", method="tools/call",
+                                                  params={"name": "list_patients"})]))
+    checks.append((
+        "the endpoint answers tools/list from the prebuilt bytes, also in batches",
+        clinic.tool_list_json in plain.body
+        and _decode(plain).model_dump() == {"jsonrpc": "2.0", "id": "spliced",
+                                            "result": listed, "error": None}
+        and gzipped.headers["content-encoding"] == "gzip"
+        and json.loads(zlib.decompress(gzipped.body, wbits=31))["result"] == listed
+        and batch[0].result == listed and "patients" in batch[1].result,
+    ))
+    other = clinic.call(MCPRequest(id="p", method="prompts/list"))
+    checks.append((
+        "other methods are still refused with -32601",
+        other.error is not None and other.error["code"] == -32601,
+    ))
+
+    catalogue = tool_catalogue({c.id: Clinic(c).tool_list for c in load_config()})
+    checks.append((
+        "the planner catalogue lists each clinic once and the shared tools once",
+        all(catalogue.count(f"  - {c.id}  →") == 1 for c in load_config())
+        and all(catalogue.count(f"  - {name}(") == 1 for name in tools if name != "changes_since")
+        and "changes_since" not in catalogue and "cpf" not in catalogue
+        and "{ferramentas}" not in Planner(None, "x").system_prompt(),
+    ))
+    return checks
+
+
+def _check_thread_pool() -> list[tuple[str, bool]]:
+    checks: list[tuple[str, bool]] = []
+    clinic = Clinic(load_config()[0])
+    finished: list[str] = []
+
+    def slow(**_kw):
+        time.sleep(0.5)
+        finished.append("slow")
+        return {}
+
+    clinic.tools["slow"] = slow
+
+    async def scenario() -> None:
+        def request(tool: str) -> MCPRequest:
+            return MCPRequest(id=tool, method="tools/call", params={"name": tool})
+
+        async def fast() -> None:
+            await asyncio.sleep(0.05)
+            await clinic.call_async(request("list_patients"))
+            finished.append("fast")
+
+        await asyncio.gather(clinic.call_async(request("slow")), fast())
+
+    asyncio.run(scenario())
+    checks.append(("a blocking handler does not stall the event loop",
+                   finished == ["fast", "slow"]))
+    return checks
+
+
+def _check_gateway() -> list[tuple[str, bool]]:
+    checks: list[tuple[str, bool]] = []
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "shared.clinic_app", "--all",
+         "--host", "127.0.0.1", "--port", str(GATEWAY_PORT)],
+        cwd=str(_project_root), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    try:
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+                if s.connect_ex(("127.0.0.1", GATEWAY_PORT)) == 0:
+                    break
+            time.sleep(0.3)
+        router = Router(gateway_registry(f"http://127.0.0.1:{GATEWAY_PORT}"))
+        a = router.dispatch({"clinic": "clinic_a", "action": "query", "parameters": {}})
+        b = router.dispatch({"clinic": "clinic_b", "action": "query", "parameters": {}})
+        slots = router.dispatch({"clinic": "clinic_c", "action": "list_available_slots",
+                                 "parameters": {}})
+        checks.append((
+            "one process serves every clinic under /clinics/{id}/mcp",
+            a.result["specialty"] == "Cardiology" and b.result["specialty"] == "Dermatology"
+            and {m["patient_id"][:4] for m in a.result["matches"]} == {"CARD"}
+            and len(slots.result["available_slots"]) > 0,
+        ))
+        batched = router.dispatch_batch([
+            {"clinic": "clinic_a", "action": "query", "parameters": {}},
+            {"clinic": "clinic_c", "action": "list_available_slots", "parameters": {}},
+            {"clinic": "clinic_b", "action": "query", "parameters": {}},
+            {"clinic": "clinic_a", "action": "list_patients", "parameters": {}},
+            {"clinic": "nope", "action": "query", "parameters": {}},
+        ])
+        stream = router.dispatch_stream(
+            {"clinic": "clinic_c", "action": "list_available_slots", "parameters": {}})
+        first = next(iter(stream))
+        streamed = router.dispatch_stream(
+            {"clinic": "clinic_c", "action": "list_available_slots", "parameters": {}}).collect()
+        patients = router.dispatch_stream(
+            {"clinic": "clinic_a", "action": "list_patients", "parameters": {}}).collect()
+        checks.append((
+            "dispatch_stream yields items lazily and collects to the plain result",
+            first == slots.result["available_slots"][0]
+            and streamed.result["available_slots"][:len(slots.result["available_slots"])]
+            == slots.result["available_slots"]
+            and streamed.result["count"] == len(streamed.result["available_slots"])
+            and patients.result["patients"]
+            == router.dispatch({"clinic": "clinic_a", "action": "list_patients",
+                                "parameters": {}}).result["patients"],
+        ))
+        polls = [router.dispatch({"clinic": "clinic_c", "action": "list_available_slots",
+                                  "parameters": {}}) for _ in range(3)]
+        uncached = Router(router.registry, cache_size=0).dispatch(
+            {"clinic": "clinic_c", "action": "list_available_slots", "parameters": {}})
+        checks.append((
+            "repeated reads are served from the Router's conditional cache",
+            router.cache_stats["hits"] >= 3
+            and all(p.result == slots.result and p.id != slots.id for p in polls),
+        ))
+        checks.append((
+            "the etag stays in the Router; callers and the planner never see it",
+            all("etag" not in r.result for r in (slots, uncached, *polls))
+            and uncached.result == slots.result,
+        ))
+        gateway = gateway_registry(f"http://127.0.0.1:{GATEWAY_PORT}")
+        cached = Router(gateway)
+        expiring = Router({**gateway, "down": "http://127.0.0.1:9/mcp"}, capability_ttl=0)
+        catalogue = cached.catalogue()
+        again = cached.catalogue()
+        expiring.catalogue()
+        expiring.catalogue()
+        prompt = Planner(None, "x", router=cached).system_prompt(cot=True)
+        checks.append((
+            "capabilities are cached per clinic until the TTL runs out",
+            list(catalogue) == list(gateway)
+            and all(again[c] is catalogue[c] for c in gateway)
+            and cached.capability_stats == {"hits": 2 * len(gateway), "fetches": len(gateway)}
+            and expiring.capability_stats == {"hits": 0, "fetches": 2 * len(gateway)}
+            and expiring.capabilities("down") is None
+            and catalogue["clinic_b"]["clinic"]["specialty"] == "Dermatology"
+            and "  - clinic_f  →  Dermatologia" in prompt and "hold_slot(" in prompt,
+        ))
+        down = Router({"down": "http://127.0.0.1:9/mcp"})
+        missing = [down.capabilities("down") for _ in range(3)]
+        checks.append((
+            "a clinic that failed tools/list is not asked again until the back-off ends",
+            missing == [None, None, None] and down.catalogue() == {}
+            and down.capability_stats == {"hits": 3, "fetches": 0},
+        ))
+        checks.append((
+            "dispatch_batch returns one response per step, in plan order",
+            [r.result for r in batched[:3]] == [a.result, slots.result, b.result]
+            and len(batched[3].result["patients"]) == len(a.result["matches"])
+            and batched[4].error is not None,
+        ))
+    finally:
+        proc.terminate()
+        proc.wait(timeout=5)
+    return checks
+
+
+# ======================================================================== #
+#  TEST
+# ======================================================================== #
+
+def main() -> None:
+    print("=" * 65)
+    print("  TEST: clinic server factory")
+    print("=" * 65)
+
+    sections = [
+        ("config", _check_config),
+        ("patient store", _check_patient_store),
+        ("patient search", _check_patient_search),
+        ("many clinics, one process", _check_many_clinics),
+        ("envelope codec", _check_envelope),
+        ("JSON-RPC batch", _check_batch),
+        ("streaming", _check_streaming),
+        ("content negotiation", _check_negotiation),
+        ("conditional reads", _check_conditional),
+        ("tool discovery", _check_tool_list),
+        ("handler thread pool", _check_thread_pool),
+        ("HTTP gateway", _check_gateway),
+    ]
+
+    passed = total = 0
+    for title, run in sections:
+        print(f"\n[{title}]")
+        for name, ok in run():
+            total += 1
+            passed += ok
+            print(f"  {name}: {'PASS' if ok else 'FAIL'}")
+
+    print()
+    print("=" * 65)
+    print(f"  RESULT: {passed}/{total} checks passed", end="")
+    print("  ALL PASSED" if passed == total else "  SOME FAILED")
+    print("=" * 65)
+    sys.exit(0 if passed == total else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1039 @@
+"""
+Test: slot storage backends
+============================
+Runs the same book → reschedule → cancel sequence against every backend
+registered in ``shared.db.BACKENDS`` and checks that the handlers return
+identical response shapes regardless of the storage engine.
+
+Each backend works on a temporary copy of clinic_a's ``db.json`` so the
+real clinic data is never touched.  No servers are started.
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+
+# ---------------------------------------------------------------------------
+# Ensure project root is importable
+# ---------------------------------------------------------------------------
+_project_root = Path(__file__).resolve().parents[1]
+if str(_project_root) not in sys.path:
+    sys.path.insert(0, str(_project_root))
+
+from shared import db, slot_store  # noqa: E402
+from shared.change_feed import ChangeFeed  # noqa: E402
+from shared.holds import HoldManager, SlotHeld  # noqa: E402
+from shared.locks import FileLock  # noqa: E402
+from shared.slot_store import (  # noqa: E402
+    JournalSlotStore,
+    MemorySlotStore,
+    parse_cache_stats,
+    sort_key,
+)
+from shared.slot_table import SlotTable  # noqa: E402
+
+SOURCE_DB = _project_root / "clinic_agents" / "clinic_a" / "db.json"
+SPECIALTY = "Cardiology"
+PATIENT = {"patient_name": "Carlos Teste", "cpf": "123.456.789-00"}
+
+
+def _copy_db(tmp_dir: Path) -> Path:
+    target = tmp_dir / "db.json"
+    shutil.copy(SOURCE_DB, target)
+    return target
+
+
+def _run_backend(backend: str) -> list[tuple[str, bool]]:
+    """Run the scenario against one backend and return (check, ok) pairs."""
+    checks: list[tuple[str, bool]] = []
+    os.environ["CLINIC_DB_BACKEND"] = backend
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = _copy_db(Path(tmp))
+        try:
+            listed = db.handle_list_available_slots(db_path, SPECIALTY)
+            free = listed["available_slots"]
+            checks.append(("list returns available slots", len(free) > 0))
+            version = db.get_store(db_path).data_version()
+
+            pages, cursor = [], ""
+            while True:
+                page = db.handle_list_available_slots(
+                    db_path, SPECIALTY, limit=2, cursor=cursor)
+                pages.extend(page["available_slots"])
+                cursor = page.get("next_cursor", "")
+                if not cursor:
+                    break
+            checks.append((
+                "cursor pagination walks every slot in (date, time) order",
+                pages == sorted(free, key=lambda s: (s["date"], s["time"]))
+                and len(pages) == len(free),
+            ))
+
+            first_date = min(s["date"] for s in free)
+            window = db.handle_list_available_slots(
+                db_path, SPECIALTY, date_from=first_date, date_to=first_date,
+                time_from="00:00", time_to="12:00")
+            checks.append((
+                "date/time window filters the listing",
+                window["available_slots"] == [
+                    s for s in pages
+                    if s["date"] == first_date and s["time"] <= "12:00"
+                ],
+            ))
+
+            malformed = [
+                db.handle_list_available_slots(db_path, SPECIALTY, **kw)
+                for kw in ({"date_from": "2025/01/01"}, {"time_from": "9h00"},
+                           {"date_to": "2025-02-30"}, {"time_to": "24:00"})
+            ]
+            forged = [
+                db.handle_list_available_slots(
+                    db_path, SPECIALTY,
+                    cursor=base64.urlsafe_b64encode(json.dumps(raw).encode()).decode())
+                for raw in (["x", "y", "z"], ["2025-07-21", 930, "dr"], [1, 2])
+            ]
+            malformed += forged
+            unpadded = db.handle_list_available_slots(
+                db_path, SPECIALTY, date_from=first_date, date_to=first_date,
+                time_from="0:00", time_to="12:00")
+            checks.append((
+                "malformed date/time filters and forged cursors are an error",
+                all("error" in r and "available_slots" not in r for r in malformed)
+                and unpadded == window,
+            ))
+
+            target = free[0]
+            stale = db.handle_book_appointment(
+                db_path, SPECIALTY, doctor=target["doctor"],
+                date=target["date"], time=target["time"],
+                expected_version=target["version"] + 1, **PATIENT,
+            )
+            checks.append((
+                "stale expected_version is reported as a conflict",
+                stale.get("conflict", {}).get("current_version") == target["version"],
+            ))
+
+            unchanged = db.get_store(db_path).data_version() == version
+            booked = db.handle_book_appointment(
+                db_path, SPECIALTY, doctor=target["doctor"].upper(),
+                date=target["date"], time=target["time"],
+                expected_version=target["version"], **PATIENT,
+            )
+            checks.append((
+                "data_version holds across reads and conflicts, moves on a write",
+                unchanged and db.get_store(db_path).data_version() != version,
+            ))
+            checks.append((
+                "book confirms (case-insensitive doctor) and bumps the version",
+                booked.get("status") == "confirmed"
+                and booked["appointment"]["doctor"] == target["doctor"]
+                and booked["appointment"]["version"] == target["version"] + 1,
+            ))
+
+            again = db.handle_book_appointment(
+                db_path, SPECIALTY, doctor=target["doctor"],
+                date=target["date"], time=target["time"], **PATIENT,
+            )
+            checks.append(("double booking is rejected", "error" in again))
+
+            after = db.handle_list_available_slots(db_path, SPECIALTY)
+            checks.append((
+                "booked slot leaves the listing",
+                len(after["available_slots"]) == len(free) - 1,
+            ))
+
+            # Closing flushes pending writes; a fresh store must see them.
+            db.close_stores()
+            reopened = db.handle_list_available_slots(db_path, SPECIALTY)
+            checks.append((
+                "booking survives closing and reopening the store",
+                reopened["available_slots"] == after["available_slots"],
+            ))
+
+            other = next(
+                s for s in after["available_slots"]
+                if s["doctor"] == target["doctor"]
+            )
+            moved = db.handle_reschedule_appointment(
+                db_path, SPECIALTY, doctor=target["doctor"],
+                original_date=target["date"], original_time=target["time"],
+                new_date=other["date"], new_time=other["time"], **PATIENT,
+            )
+            checks.append((
+                "reschedule moves the appointment",
+                moved.get("status") == "rescheduled"
+                and moved["new_appointment"]["date"] == other["date"],
+            ))
+
+            missing = db.handle_reschedule_appointment(
+                db_path, SPECIALTY, doctor=target["doctor"],
+                original_date=target["date"], original_time=target["time"],
+                new_date=other["date"], new_time=other["time"], **PATIENT,
+            )
+            checks.append((
+                "reschedule of a freed slot is rejected",
+                "Consulta original" in missing.get("error", ""),
+            ))
+
+            mine = db.handle_list_my_appointments(db_path, SPECIALTY, cpf=PATIENT["cpf"])
+            checks.append((
+                "list_my_appointments finds the rescheduled booking by CPF",
+                [(a["date"], a["time"]) for a in mine["appointments"]]
+                == [(other["date"], other["time"])],
+            ))
+
+            cancelled = db.handle_cancel_appointment(
+                db_path, SPECIALTY, doctor=target["doctor"],
+                date=other["date"], time=other["time"], **PATIENT,
+            )
+            checks.append((
+                "cancel frees the slot and drops it from the CPF index",
+                cancelled.get("status") == "cancelled"
+                and not db.handle_list_my_appointments(
+                    db_path, SPECIALTY, cpf=PATIENT["cpf"])["appointments"],
+            ))
+
+            final = db.handle_list_available_slots(db_path, SPECIALTY)
+            checks.append((
+                "listing is back to the original size",
+                len(final["available_slots"]) == len(free),
+            ))
+
+            contested = final["available_slots"][-1]
+            outcomes: list[dict] = []
+
+            def race() -> None:
+                outcomes.append(db.handle_book_appointment(
+                    db_path, SPECIALTY, doctor=contested["doctor"],
+                    date=contested["date"], time=contested["time"],
+                    expected_version=contested["version"], **PATIENT,
+                ))
+
+            threads = [threading.Thread(target=race) for _ in range(8)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            checks.append((
+                "concurrent CAS bookings: one wins, the rest get a conflict",
+                sum(o.get("status") == "confirmed" for o in outcomes) == 1
+                and sum("conflict" in o for o in outcomes) == 7,
+            ))
+
+            # Bulk: two free slots plus the slot just taken by the race.
+            free_now = db.handle_list_available_slots(db_path, SPECIALTY)["available_slots"]
+            pair = [{"doctor": x["doctor"], "date": x["date"], "time": x["time"],
+                     "expected_version": x["version"], **PATIENT} for x in free_now[:2]]
+            taken = {"doctor": contested["doctor"], "date": contested["date"],
+                     "time": contested["time"], **PATIENT}
+            rejected = db.handle_book_appointments_bulk(
+                db_path, SPECIALTY, appointments=pair + [taken, pair[0]])
+            checks.append((
+                "bulk booking is all-or-nothing with per-item status",
+                rejected["status"] == "rejected"
+                and [r["status"] for r in rejected["results"]]
+                == ["not_applied", "not_applied", "unavailable", "duplicate"]
+                and len(db.handle_list_available_slots(
+                    db_path, SPECIALTY)["available_slots"]) == len(free_now),
+            ))
+
+            bulk = db.handle_book_appointments_bulk(db_path, SPECIALTY, appointments=pair)
+            checks.append((
+                "bulk booking confirms every item",
+                bulk["status"] == "confirmed"
+                and all(r["status"] == "confirmed" for r in bulk["results"])
+                and len(db.handle_list_available_slots(
+                    db_path, SPECIALTY)["available_slots"]) == len(free_now) - 2,
+            ))
+        finally:
+            db.close_stores()
+    return checks
+
+
+def _check_journal_recovery() -> list[tuple[str, bool]]:
+    """Simulate a crash between journal append and compaction."""
+    checks: list[tuple[str, bool]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = _copy_db(Path(tmp))
+        store = JournalSlotStore(db_path, flush_interval=3600)
+        target = store.list_available()[0]
+        store.book(target["doctor"], target["date"], target["time"],
+                   PATIENT["patient_name"], PATIENT["cpf"])
+        # "Crash": drop the store without compacting and leave a torn line.
+        store._closed.set()
+        store._journal.close()
+        store._owner.release()
+        with open(store.journal_path, "a", encoding="utf-8") as f:
+            f.write('{"op": "book", "chan')
+
+        checks.append((
+            "snapshot untouched before compaction",
+            db_path.read_text(encoding="utf-8") == SOURCE_DB.read_text(encoding="utf-8"),
+        ))
+
+        recovered = JournalSlotStore(db_path, flush_interval=3600)
+        free = recovered.list_available()
+        checks.append((
+            "journal replay restores the booking (torn line ignored)",
+            all(
+                (s["doctor"], s["date"], s["time"])
+                != (target["doctor"], target["date"], target["time"])
+                for s in free
+            ),
+        ))
+
+        recovered.close()
+        reopened = JournalSlotStore(db_path, flush_interval=3600)
+        checks.append((
+            "compaction folds the journal into db.json",
+            recovered.journal_path.stat().st_size == 0
+            and len(reopened.list_available()) == len(free),
+        ))
+        reopened.close()
+    return checks
+
+
+@contextmanager
+def _failing_snapshots(failures: int):
+    """Make the next ``failures`` snapshot writes raise, as a full disk would."""
+    real = slot_store._write_snapshot
+    left = [failures]
+    logged: list[logging.LogRecord] = []
+
+    def write(*args, **kwargs):
+        if left[0] > 0:
+            left[0] -= 1
+            raise OSError(28, "No space left on device")
+        return real(*args, **kwargs)
+
+    handler = logging.Handler()
+    handler.emit = logged.append  # type: ignore[method-assign]
+    slot_store.logger.addHandler(handler)
+    slot_store.logger.propagate = False
+    slot_store._write_snapshot = write
+    try:
+        yield logged
+    finally:
+        slot_store._write_snapshot = real
+        slot_store.logger.removeHandler(handler)
+        slot_store.logger.propagate = True
+
+
+def _wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def _booked_on_disk(db_path: Path, slot: dict) -> bool:
+    slots = json.loads(db_path.read_text(encoding="utf-8"))["slots"]
+    return any((s["doctor"], s["date"], s["time"]) == (slot["doctor"], slot["date"], slot["time"])
+               and not s["available"] for s in slots)
+
+
+def _check_write_failures() -> list[tuple[str, bool]]:
+    """Snapshot writes that fail (disk full) must not lose later writes."""
+    checks: list[tuple[str, bool]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = _copy_db(Path(tmp))
+        store = MemorySlotStore(db_path, flush_interval=0.05)
+        try:
+            target = store.list_available()[0]
+            with _failing_snapshots(2) as logged:
+                store.book(target["doctor"], target["date"], target["time"],
+                           PATIENT["patient_name"], PATIENT["cpf"])
+                persisted = _wait_for(lambda: _booked_on_disk(db_path, target))
+            checks.append((
+                "memory: the write-back thread logs a failed flush and retries",
+                persisted and store._flusher.is_alive() and len(logged) == 2,
+            ))
+        finally:
+            store.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = _copy_db(Path(tmp))
+        store = JournalSlotStore(db_path, flush_interval=3600)
+        first, second = store.list_available()[:2]
+        with _failing_snapshots(2):
+            for slot in (first, second):
+                store.book(slot["doctor"], slot["date"], slot["time"],
+                           PATIENT["patient_name"], PATIENT["cpf"])
+                failed = _raises_os_error(store.flush)
+        # "Crash" after two failed compactions.
+        store._closed.set()
+        store._journal.close()
+        store._owner.release()
+        recovered = JournalSlotStore(db_path, flush_interval=3600)
+        free = {sort_key(s) for s in recovered.list_available()}
+        checks.append((
+            "journal: a failed compaction keeps its records for the next one",
+            failed and sort_key(first) not in free and sort_key(second) not in free,
+        ))
+        recovered.close()
+        checks.append((
+            "journal: the leftover .compacting is removed once db.json has it",
+            _booked_on_disk(db_path, first) and _booked_on_disk(db_path, second)
+            and not recovered._compacting_path.exists(),
+        ))
+
+    os.environ["CLINIC_DB_BACKEND"] = "journal"
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = _copy_db(Path(tmp))
+        try:
+            store = db.get_store(db_path)
+            first, second = store.list_available()[:2]
+            journal = store._journal
+            store._journal = _TornJournal(journal)
+            refused = db.handle_book_appointment(
+                db_path, SPECIALTY, doctor=first["doctor"], date=first["date"],
+                time=first["time"], **PATIENT)
+            store._journal = journal
+            free = {sort_key(s) for s in store.list_available()}
+            booked = db.handle_book_appointment(
+                db_path, SPECIALTY, doctor=second["doctor"], date=second["date"],
+                time=second["time"], **PATIENT)
+            checks.append((
+                "journal: a failed append is an error and is undone in memory",
+                "error" in refused and sort_key(first) in free
+                and booked.get("status") == "confirmed",
+            ))
+            records, valid = slot_store._read_journal(store.journal_path)
+            size = store.journal_path.stat().st_size
+            db.close_stores()
+            reopened = {sort_key(s) for s in db.get_store(db_path).list_available()}
+            checks.append((
+                "journal: the torn line is cut before the next append",
+                sort_key(first) in reopened and sort_key(second) not in reopened
+                and valid == size
+                and [r["op"] for r in records] == ["book"],
+            ))
+        finally:
+            db.close_stores()
+
+    os.environ["CLINIC_DB_BACKEND"] = "group"
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = _copy_db(Path(tmp))
+        try:
+            target = db.get_store(db_path).list_available()[0]
+            args = dict(doctor=target["doctor"], date=target["date"],
+                        time=target["time"], **PATIENT)
+            with _failing_snapshots(1) as logged:
+                refused = db.handle_book_appointment(db_path, SPECIALTY, **args)
+            free = {sort_key(s) for s in db.get_store(db_path).list_available()}
+            checks.append((
+                "group: a failed batch write is reported as an error, not raised",
+                "error" in refused and "status" not in refused and len(logged) <= 1,
+            ))
+            checks.append((
+                "group: the refused booking is rolled back in memory",
+                sort_key(target) in free and not _booked_on_disk(db_path, target),
+            ))
+            db.get_store(db_path).flush()
+            retried = db.handle_book_appointment(db_path, SPECIALTY, **args)
+            checks.append((
+                "group: the slot can be booked once the disk recovers",
+                retried.get("status") == "confirmed" and _booked_on_disk(db_path, target),
+            ))
+        finally:
+            db.close_stores()
+
+    os.environ["CLINIC_DB_BACKEND"] = "memory"
+    real_archive, keep_months = db.archive_past, db.ARCHIVE_KEEP_MONTHS
+    calls: list[int] = []
+
+    def archive(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError(28, "No space left on device")
+        return real_archive(*args, **kwargs)
+
+    logged: list[logging.LogRecord] = []
+    handler = logging.Handler()
+    handler.emit = logged.append  # type: ignore[method-assign]
+    db.logger.addHandler(handler)
+    db.logger.propagate = False
+    db.archive_past, db.ARCHIVE_KEEP_MONTHS = archive, 1
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = _copy_db(Path(tmp))
+        try:
+            listed = db.handle_list_available_slots(db_path, SPECIALTY)
+            checks.append((
+                "archive: a failed automatic archive is logged, the read still works",
+                len(listed.get("available_slots", [])) > 0
+                and len(calls) == 1 and len(logged) == 1,
+            ))
+            db.handle_list_available_slots(db_path, SPECIALTY)
+            db.handle_list_available_slots(db_path, SPECIALTY)
+            checks.append((
+                "archive: the day is marked only once an archive succeeds",
+                len(calls) == 2 and db._archived_on.get(db_path.resolve()) == date.today(),
+            ))
+        finally:
+            db.archive_past, db.ARCHIVE_KEEP_MONTHS = real_archive, keep_months
+            db.logger.removeHandler(handler)
+            db.logger.propagate = True
+            db._archived_on.clear()
+            db.close_stores()
+    return checks
+
+
+def _check_file_lock() -> list[tuple[str, bool]]:
+    """Readers of one FileLock share it; a writer excludes them."""
+    checks: list[tuple[str, bool]] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        lock = FileLock(Path(tmp) / "db.json.lock")
+        inside = threading.Barrier(2, timeout=2)
+
+        def read(out: list) -> None:
+            with lock.shared():
+                try:
+                    inside.wait()
+                    out.append(True)
+                except threading.BrokenBarrierError:
+                    out.append(False)
+
+        together: list[bool] = []
+        readers = [threading.Thread(target=read, args=(together,)) for _ in range(2)]
+        for t in readers:
+            t.start()
+        for t in readers:
+            t.join()
+        checks.append(("two threads hold the shared lock at once",
+                       together == [True, True]))
+
+        events: list[str] = []
+
+        def write() -> None:
+            with lock.exclusive():
+                events.append("write")
+
+        with lock.shared():
+            writer = threading.Thread(target=write)
+            writer.start()
+            time.sleep(0.1)
+            events.append("read done")
+        writer.join(2)
+        checks.append(("a writer waits for the readers to leave",
+                       events == ["read done", "write"]))
+        lock.release()
+    return checks
+
+
+class _TornJournal:
+    """Journal file whose appends stop halfway, as on a full disk."""
+
+    def __init__(self, f) -> None:
+        self._f = f
+
+    def write(self, data: bytes) -> int:
+        self._f.write(data[:len(data) // 2])
+        raise OSError(28, "No space left on device")
+
+    def __getattr__(self, name: str):
+        return getattr(self._f, name)
+
+
+def _raises_os_error(call) -> bool:
+    try:
+        call()
+    except OSError:
+        return True
+    return False
+
+
+def _book_in_child(backend: str, db_path: str, slot: dict, out) -> None:
+    """Child process: try to book ``slot`` and report the outcome."""
+    os.environ["CLINIC_DB_BACKEND"] = backend
+    try:
+        result = db.handle_book_appointment(
+            Path(db_path), SPECIALTY, doctor=slot["doctor"],
+            date=slot["date"], time=slot["time"], **PATIENT,
+        )
+        out.put("confirmed" if result.get("status") == "confirmed" else "rejected")
+    except RuntimeError:
+        out.put("refused")
+    finally:
+        db.close_stores()
+
+
+def _check_multiprocess() -> list[tuple[str, bool]]:
+    """Several worker processes race for the same slot."""
+    checks: list[tuple[str, bool]] = []
+    for backend, expected in (("json", "confirmed"), ("sqlite", "confirmed"),
+                              ("memory", "refused")):
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = _copy_db(Path(tmp))
+            os.environ["CLINIC_DB_BACKEND"] = backend
+            slot = db.get_store(db_path).list_available()[0]
+            if backend != "memory":
+                db.close_stores()  # keep the parent as an owner only for memory
+            out = multiprocessing.Queue()
+            procs = [
+                multiprocessing.Process(
+                    target=_book_in_child, args=(backend, str(db_path), slot, out))
+                for _ in range(4)
+            ]
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+            outcomes = sorted(out.get() for _ in procs)
+            db.close_stores()
+        if expected == "confirmed":
+            ok = outcomes.count("confirmed") == 1
+            name = f"{backend}: exactly one of 4 processes books the slot"
+        else:
+            ok = outcomes == ["refused"] * 4
+            name = f"{backend}: other processes refuse to open an owned db.json"
+        checks.append((name, ok))
+    return checks
+
+
+def _check_parse_cache() -> list[tuple[str, bool]]:
+    """The json backend must not re-parse an unchanged db.json."""
+    checks: list[tuple[str, bool]] = []
+    os.environ["CLINIC_DB_BACKEND"] = "json"
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = _copy_db(Path(tmp))
+        try:
+            store = db.get_store(db_path)
+            store.list_available()
+            before = parse_cache_stats()
+            for _ in range(5):
+                listed = store.list_available()
+            after = parse_cache_stats()
+            checks.append((
+                "unchanged file is served from the cache",
+                after["hits"] - before["hits"] == 5
+                and after["misses"] == before["misses"],
+            ))
+
+            try:
+                listed[0]["available"] = False
+                mutable = True
+            except TypeError:
+                mutable = False
+            checks.append(("cached slots are read-only views", not mutable))
+
+            # An external rewrite (new size/mtime) must invalidate the entry.
+            data = db_path.read_text(encoding="utf-8")
+            db_path.write_text(data.replace('"available": true', '"available": false', 1),
+                               encoding="utf-8")
+            changed = store.list_available()
+            checks.append((
+                "external change invalidates the cache",
+                len(changed) == len(listed) - 1
+                and parse_cache_stats()["misses"] == after["misses"] + 1,
+            ))
+        finally:
+            db.close_stores()
+    return checks
+
+
+TEMPLATE_DB = {
+    "templates": [{
+        "doctor": "Dr. Modelo", "specialty": SPECIALTY,
+        "weekdays": ["mon", "wed"], "start": "09:00", "end": "12:00",
+        "every": 30, "from": "2026-01-05", "until": "2026-12-30",
+        "exceptions": ["2026-01-07"],
+    }],
+    "slots": [{
+        "doctor": "Dr. Modelo", "specialty": SPECIALTY, "date": "2026-01-05",
+        "time": "09:00", "available": False, "patient_name": "Ana", "cpf": "1",
+    }],
+}
+
+
+def _check_templates(backend: str) -> list[tuple[str, bool]]:
+    """Recurring templates: slots generated per window, only bookings stored."""
+    checks: list[tuple[str, bool]] = []
+    os.environ["CLINIC_DB_BACKEND"] = backend
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "db.json"
+        db_path.write_text(json.dumps(TEMPLATE_DB), encoding="utf-8")
+        try:
+            week = db.handle_list_available_slots(
+                db_path, SPECIALTY, date_from="2026-01-05", date_to="2026-01-11")
+            times = [(s["date"], s["time"]) for s in week["available_slots"]]
+            checks.append((
+                f"{backend}: window expands the template (booked slot and exception skipped)",
+                len(times) == 5 and times[0] == ("2026-01-05", "09:30")
+                and all(d == "2026-01-05" for d, _ in times),
+            ))
+
+            pages, cursor = [], ""
+            for _ in range(3):
+                page = db.handle_list_available_slots(
+                    db_path, SPECIALTY, limit=4, cursor=cursor)
+                pages.extend((s["date"], s["time"]) for s in page["available_slots"])
+                cursor = page["next_cursor"]
+            checks.append((
+                f"{backend}: cursor pages through generated slots in order",
+                pages == sorted(set(pages)) and len(pages) == 12,
+            ))
+
+            booked = db.handle_book_appointment(
+                db_path, SPECIALTY, doctor="dr. modelo", date="2026-03-04",
+                time="11:30", expected_version=0, **PATIENT)
+            missing = db.handle_book_appointment(
+                db_path, SPECIALTY, doctor="Dr. Modelo", date="2026-03-04",
+                time="12:00", **PATIENT)
+            db.close_stores()
+            if backend == "sqlite":
+                conn = sqlite3.connect(str(db_path.with_suffix(".sqlite")))
+                stored = conn.execute("SELECT COUNT(*) FROM slots").fetchone()[0]
+                conn.close()
+            else:
+                data = json.loads(db_path.read_text(encoding="utf-8"))
+                stored = len(data["slots"]) if data["templates"] == TEMPLATE_DB["templates"] else -1
+            checks.append((
+                f"{backend}: booking a generated slot stores only that slot",
+                booked.get("status") == "confirmed" and "error" in missing
+                and stored == 2,
+            ))
+            after = db.handle_list_available_slots(
+                db_path, SPECIALTY, date_from="2026-03-04", date_to="2026-03-04")
+            checks.append((
+                f"{backend}: the booked generated slot leaves the listing",
+                ("2026-03-04", "11:30") not in
+                [(s["date"], s["time"]) for s in after["available_slots"]]
+                and len(after["available_slots"]) == 5,
+            ))
+        finally:
+            db.close_stores()
+    return checks
+
+
+def _check_archive(backend: str) -> list[tuple[str, bool]]:
+    """Closed months move to db.archive/ and stay queryable as history."""
+    checks: list[tuple[str, bool]] = []
+    os.environ["CLINIC_DB_BACKEND"] = backend
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = _copy_db(Path(tmp))
+        try:
+            free = db.handle_list_available_slots(db_path, SPECIALTY)["available_slots"]
+            target = free[0]
+            db.handle_book_appointment(
+                db_path, SPECIALTY, doctor=target["doctor"], date=target["date"],
+                time=target["time"], **PATIENT)
+            kept = db.archive_past(db_path, keep_months=1, today=date(2025, 7, 15))
+            moved = db.archive_past(db_path, keep_months=1, today=date(2025, 8, 3))
+            checks.append((
+                f"{backend}: only closed months are archived",
+                kept == 0 and moved == len(free)
+                and db.get_archive(db_path).months() == ["2025-07"],
+            ))
+
+            late = db.handle_book_appointment(
+                db_path, SPECIALTY, doctor=free[1]["doctor"], date=free[1]["date"],
+                time=free[1]["time"], **PATIENT)
+            db.close_stores()
+            checks.append((
+                f"{backend}: archived slots leave the hot store (also after reopening)",
+                "error" in late
+                and db.handle_list_available_slots(db_path, SPECIALTY)["available_slots"] == []
+                and db.handle_list_my_appointments(
+                    db_path, SPECIALTY, cpf=PATIENT["cpf"])["appointments"] == []
+                and db.archive_past(db_path, keep_months=1, today=date(2025, 8, 3)) == 0,
+            ))
+
+            history = db.handle_list_appointment_history(
+                db_path, SPECIALTY, cpf=PATIENT["cpf"])["appointments"]
+            outside = db.handle_list_appointment_history(
+                db_path, SPECIALTY, cpf=PATIENT["cpf"], date_from="2025-08-01")
+            checks.append((
+                f"{backend}: history reads the booking back from the archive",
+                [(a["date"], a["time"]) for a in history]
+                == [(target["date"], target["time"])]
+                and outside["appointments"] == []
+                and db.handle_list_appointment_history(
+                    db_path, SPECIALTY, cpf="999")["appointments"] == [],
+            ))
+        finally:
+            db.close_stores()
+    return checks
+
+
+def _check_change_feed() -> list[tuple[str, bool]]:
+    """changes_since returns only the slot deltas after a sequence."""
+    checks: list[tuple[str, bool]] = []
+    os.environ["CLINIC_DB_BACKEND"] = "memory"
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = _copy_db(Path(tmp))
+        try:
+            start = db.handle_changes_since(db_path, SPECIALTY)
+            free = db.handle_list_available_slots(db_path, SPECIALTY)["available_slots"]
+            a, b, c = free[:3]
+            db.handle_book_appointment(
+                db_path, SPECIALTY, doctor=a["doctor"], date=a["date"], time=a["time"], **PATIENT)
+            db.handle_book_appointment(  # rejected: records no change
+                db_path, SPECIALTY, doctor=a["doctor"], date=a["date"], time=a["time"], **PATIENT)
+            db.handle_reschedule_appointment(
+                db_path, SPECIALTY, doctor=a["doctor"], original_date=a["date"],
+                original_time=a["time"], new_date=b["date"], new_time=b["time"], **PATIENT)
+            feed = db.handle_changes_since(db_path, SPECIALTY, seq=start["seq"],
+                                           epoch=start["epoch"])
+            deltas = [(ch["op"], ch["date"], ch["time"], ch["available"], ch["version"])
+                      for ch in feed["changes"]]
+            checks.append((
+                "book and reschedule produce one delta per touched slot",
+                start["seq"] == 0 and not start["reset"] and deltas == [
+                    ("book", a["date"], a["time"], False, 1),
+                    ("reschedule", a["date"], a["time"], True, 2),
+                    ("reschedule", b["date"], b["time"], False, 1),
+                ] and not any("cpf" in ch or "patient_name" in ch for ch in feed["changes"]),
+            ))
+
+            db.handle_cancel_appointment(
+                db_path, SPECIALTY, doctor=b["doctor"], date=b["date"], time=b["time"], **PATIENT)
+            db.handle_book_appointments_bulk(db_path, SPECIALTY, appointments=[
+                {"doctor": c["doctor"], "date": c["date"], "time": c["time"], **PATIENT}])
+            first = db.handle_changes_since(db_path, SPECIALTY, seq=feed["seq"], limit=1)
+            rest = db.handle_changes_since(db_path, SPECIALTY, seq=first["seq"])
+            checks.append((
+                "pages of changes resume from the returned seq",
+                [ch["op"] for ch in first["changes"]] == ["cancel"] and first["has_more"]
+                and [ch["op"] for ch in rest["changes"]] == ["book"] and not rest["has_more"]
+                and db.handle_changes_since(
+                    db_path, SPECIALTY, seq=rest["seq"])["changes"] == [],
+            ))
+
+            stale = db.handle_changes_since(db_path, SPECIALTY, seq=0, epoch="outro-processo")
+            checks.append((
+                "another epoch asks the consumer to re-list",
+                stale["reset"] and stale["changes"] == [] and stale["seq"] == rest["seq"],
+            ))
+        finally:
+            db.close_stores()
+
+    small = ChangeFeed(capacity=2)
+    slot = {"doctor": "Dr. A", "date": "2026-01-01", "time": "09:00", "available": False}
+    for _ in range(3):
+        small.record("book", [slot])
+    checks.append((
+        "a seq older than the buffer resets instead of skipping changes",
+        small.since(0, 10) == ([], True) and [ch["seq"] for ch in small.since(1, 10)[0]] == [2, 3],
+    ))
+    return checks
+
+
+def _check_holds() -> list[tuple[str, bool]]:
+    """hold_slot / release_hold and hold tokens on book_appointment."""
+    checks: list[tuple[str, bool]] = []
+    os.environ["CLINIC_DB_BACKEND"] = "memory"
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = _copy_db(Path(tmp))
+        try:
+            free = db.handle_list_available_slots(db_path, SPECIALTY)["available_slots"]
+            target = free[0]
+            where = {"doctor": target["doctor"], "date": target["date"], "time": target["time"]}
+            held = db.handle_hold_slot(db_path, SPECIALTY, **where, **PATIENT)
+            listed = db.handle_list_available_slots(db_path, SPECIALTY)["available_slots"]
+            checks.append((
+                "held slot leaves the listing",
+                held.get("status") == "held" and len(listed) == len(free) - 1
+                and all(s["time"] != target["time"] or s["date"] != target["date"]
+                        or s["doctor"] != target["doctor"] for s in listed),
+            ))
+
+            other = db.handle_book_appointment(
+                db_path, SPECIALTY, **where, patient_name="Outra", cpf="999")
+            rival = db.handle_hold_slot(
+                db_path, SPECIALTY, **where, patient_name="Outra", cpf="999")
+            checks.append((
+                "other sessions can neither book nor hold it",
+                "held_until" in other and "held_until" in rival,
+            ))
+
+            booked = db.handle_book_appointment(
+                db_path, SPECIALTY, hold_token=held["hold_token"], **PATIENT)
+            reused = db.handle_book_appointment(
+                db_path, SPECIALTY, hold_token=held["hold_token"], **PATIENT)
+            checks.append((
+                "book consumes the hold token",
+                booked.get("status") == "confirmed"
+                and booked["appointment"]["time"] == target["time"]
+                and "error" in reused,
+            ))
+
+            second = dict(free[1])
+            where = {"doctor": second["doctor"], "date": second["date"], "time": second["time"]}
+            token = db.handle_hold_slot(db_path, SPECIALTY, **where, **PATIENT)["hold_token"]
+            released = db.handle_release_hold(db_path, SPECIALTY, hold_token=token)
+            checks.append((
+                "release_hold returns the slot to the listing",
+                released.get("status") == "released"
+                and len(db.handle_list_available_slots(
+                    db_path, SPECIALTY)["available_slots"]) == len(free) - 1,
+            ))
+
+            # A booking in flight (inside its claim) when a hold arrives.
+            third = free[2]
+            where = {"doctor": third["doctor"], "date": third["date"], "time": third["time"]}
+            late: list[dict] = []
+            holder = threading.Thread(target=lambda: late.append(
+                db.handle_hold_slot(db_path, SPECIALTY, **where, patient_name="Outra", cpf="999")))
+            with db.get_holds(db_path).claim(sort_key(third)):
+                holder.start()
+                time.sleep(0.1)
+                waited = not late
+                db.get_store(db_path).book(third["doctor"], third["date"], third["time"],
+                                           PATIENT["patient_name"], PATIENT["cpf"])
+            holder.join(2)
+            checks.append((
+                "hold_slot waits for an in-flight booking and then refuses",
+                waited and "error" in late[0] and "held_until" not in late[0]
+                and len(db.get_holds(db_path)) == 0,
+            ))
+        finally:
+            db.close_stores()
+
+    # Holds live in this process only: shared backends must refuse them.
+    refusals = []
+    for backend in ("json", "sqlite"):
+        os.environ["CLINIC_DB_BACKEND"] = backend
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = _copy_db(Path(tmp))
+            try:
+                target = db.handle_list_available_slots(db_path, SPECIALTY)["available_slots"][0]
+                refused = db.handle_hold_slot(
+                    db_path, SPECIALTY, doctor=target["doctor"], date=target["date"],
+                    time=target["time"], **PATIENT)
+                refusals.append("error" in refused and "hold_token" not in refused
+                                and len(db.get_holds(db_path)) == 0)
+            finally:
+                db.close_stores()
+    os.environ["CLINIC_DB_BACKEND"] = "memory"
+    checks.append(("hold_slot is refused on json and sqlite", refusals == [True, True]))
+
+    holds = HoldManager()
+    rival_hold = holds.hold(("2026-01-01", "10:00", "dr. a"), "Dr. A", ttl=60, cpf="1")
+    refused = _raises_slot_held(lambda: holds.claim(rival_hold.key).__enter__())
+    with holds.claim(rival_hold.key, rival_hold.token):
+        own_ok = True
+    checks.append((
+        "a claim is refused over another session's hold, granted to its owner",
+        refused and own_ok,
+    ))
+
+    now = [0.0]
+    holds = HoldManager(clock=lambda: now[0])
+    first = holds.hold(("2026-01-01", "09:00", "dr. a"), "Dr. A", ttl=10, cpf="1")
+    holds.hold(("2026-01-01", "09:30", "dr. a"), "Dr. A", ttl=30, cpf="1")
+    generation = holds.generation
+    renewed = holds.hold(("2026-01-01", "09:00", "dr. a"), "Dr. A", ttl=60, cpf="1")
+    renewal_kept = holds.generation == generation
+    now[0] = 45.0
+    checks.append((
+        "expired holds are reclaimed; renewal keeps the token",
+        renewed.token == first.token and len(holds) == 1
+        and holds.get(first.token) is not None,
+    ))
+    checks.append((
+        "generation moves on new and expired holds, not on renewal",
+        generation == 2 and renewal_kept and holds.generation == 3,
+    ))
+    now[0] = 61.0
+    checks.append(("renewed hold expires at its new deadline", len(holds) == 0))
+    return checks
+
+
+def _raises_slot_held(call) -> bool:
+    try:
+        call()
+    except SlotHeld:
+        return True
+    return False
+
+
+def _check_slot_table() -> list[tuple[str, bool]]:
+    """The compact table must round-trip every clinic's db.json."""
+    checks: list[tuple[str, bool]] = []
+    clinics = sorted((_project_root / "clinic_agents").glob("clinic_*/db.json"))
+    round_trip = True
+    for path in clinics:
+        slots = json.loads(path.read_text(encoding="utf-8"))["slots"]
+        table = SlotTable.from_slots(slots)
+        # Horas sem zero à esquerda ("9:00") são normalizadas para "09:00".
+        expected = [dict(s, time=s["time"].zfill(5), version=0) for s in slots]
+        round_trip &= table.to_slots() == expected
+        free = [table.row(r) for r in table.scan()]
+        round_trip &= free == sorted((s for s in expected if s["available"]), key=sort_key)
+    checks.append(("every db.json round-trips through SlotTable", round_trip))
+
+    table = SlotTable.from_slots(json.loads(SOURCE_DB.read_text(encoding="utf-8"))["slots"])
+    checks.append((
+        "malformed filters raise ValueError",
+        all(_raises(lambda kw=kw: list(table.scan(**kw)))
+            for kw in ({"date_from": "2025-7-1"}, {"time_to": "25:00"})),
+    ))
+    return checks
+
+
+def _raises(call) -> bool:
+    try:
+        call()
+    except ValueError:
+        return True
+    return False
+
+
+# ======================================================================== #
+#  TEST
+# ======================================================================== #
+
+def main() -> None:
+    print("=" * 65)
+    print("  TEST: slot storage backends")
+    print("=" * 65)
+
+    sections = [(backend, lambda b=backend: _run_backend(b)) for backend in db.BACKENDS]
+    sections += [
+        ("slot table", _check_slot_table),
+        ("slot holds", _check_holds),
+        ("change feed", _check_change_feed),
+        ("recurring templates",
+         lambda: [c for b in db.BACKENDS for c in _check_templates(b)]),
+        ("monthly archive",
+         lambda: [c for b in db.BACKENDS for c in _check_archive(b)]),
+        ("parse cache", _check_parse_cache),
+        ("multiple processes", _check_multiprocess),
+        ("journal recovery", _check_journal_recovery),
+        ("write failures", _check_write_failures),
+        ("file lock", _check_file_lock),
+    ]
+
+    passed = total = 0
+    for title, run in sections:
+        print(f"\n[{title}]")
+        for name, ok in run():
+            total += 1
+            passed += ok
+            print(f"  {name}: {'PASS' if ok else 'FAIL'}")
+
+    print()
+    print("=" * 65)
+    print(f"  RESULT: {passed}/{total} checks passed", end="")
+    print("  ALL PASSED" if passed == total else "  SOME FAILED")
+    print("=" * 65)
+    sys.exit(0 if passed == total else 1)
+
+
+if __name__ == "__main__":
+    main()